@@ -0,0 +1,112 @@
+"""Quadros PNG para o modo "Animação" da página Mapas Interativos.
+
+Cada quadro (imagem sub-diária do IMERG/GSMaP ou acumulado diário) é renderizado
+no servidor do EE (`aquagee.miniaturas`) sobre o domínio dos mapas e guardado num
+cache LRU em memória, limitado em bytes. O `Reprodutor` busca, no pool de
+`ee_async`, os próximos quadros à frente do cursor de reprodução, de modo que a
+exibição só espera quando a rede não acompanha a taxa de quadros pedida.
+"""
+import json
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import ee
+
+from aquagee import ee_async
+from aquagee.miniaturas import renderizar_png
+
+# Memória máxima dos PNGs em cache (bytes)
+MAX_BYTES_CACHE = 64 * 2**20
+# Quadros buscados à frente do cursor de reprodução
+QUADROS_ADIANTE = 8
+
+TIPO_INSTANTANEO = 'instantaneo'
+TIPO_DIARIO = 'diario'
+
+
+class CacheLRU:
+    """Dicionário LRU limitado pelo total de bytes dos valores."""
+
+    def __init__(self, max_bytes=MAX_BYTES_CACHE):
+        self.max_bytes = max_bytes
+        self._itens = OrderedDict()
+        self._bytes = 0
+        self._trava = threading.Lock()
+        self.acertos = self.falhas = 0
+
+    def obter(self, chave):
+        with self._trava:
+            valor = self._itens.get(chave)
+            if valor is None:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._trava:
+            if chave in self._itens:
+                self._bytes -= len(self._itens.pop(chave))
+            self._itens[chave] = valor
+            self._bytes += len(valor)
+            while self._bytes > self.max_bytes and len(self._itens) > 1:
+                _, antigo = self._itens.popitem(last=False)
+                self._bytes -= len(antigo)
+
+    def __contains__(self, chave):
+        with self._trava:
+            return chave in self._itens
+
+
+_cache = CacheLRU()
+
+
+def _imagem(info, tipo, quadro, vis):
+    colecao = ee.ImageCollection(info['id']).select(info['band'])
+    if tipo == TIPO_INSTANTANEO:
+        imagem = colecao.filter(ee.Filter.eq('system:time_start', int(quadro))).first()
+    else:
+        imagem = colecao.filterDate(quadro.isoformat(), (quadro + timedelta(days=1)).isoformat()).sum()
+    imagem = imagem.multiply(info['multiplier'])
+    return imagem.updateMask(imagem.gt(vis['min']))
+
+
+def _chave(info, tipo, quadro, vis):
+    return info['id'], tipo, str(quadro), json.dumps(vis, sort_keys=True)
+
+
+def renderizar_quadro(info, tipo, quadro, vis):
+    """PNG (bytes) do quadro, do cache ou renderizado pelo EE."""
+    chave = _chave(info, tipo, quadro, vis)
+    png = _cache.obter(chave)
+    if png is not None:
+        return png
+    png = renderizar_png(_imagem(info, tipo, quadro, vis), vis)
+    _cache.guardar(chave, png)
+    return png
+
+
+class Reprodutor:
+    """Sequência de quadros com pré-busca concorrente à frente do cursor."""
+
+    def __init__(self, info, tipo, quadros, vis, adiante=QUADROS_ADIANTE):
+        self.info, self.tipo, self.quadros, self.vis = info, tipo, list(quadros), vis
+        self.adiante = adiante
+        self._pendentes = {}
+
+    def preparar(self, i):
+        """Agenda a busca dos quadros i .. i + adiante que ainda não estão no cache."""
+        for j in range(i, min(i + self.adiante + 1, len(self.quadros))):
+            if j in self._pendentes or _chave(self.info, self.tipo, self.quadros[j], self.vis) in _cache:
+                continue
+            self._pendentes[j] = ee_async.submeter(renderizar_quadro, self.info, self.tipo, self.quadros[j], self.vis)
+
+    def obter(self, i):
+        """PNG do quadro i, esperando a busca se ela ainda estiver em andamento."""
+        self.preparar(i)
+        pendente = self._pendentes.pop(i, None)
+        if pendente is not None:
+            return pendente.result()
+        return renderizar_quadro(self.info, self.tipo, self.quadros[i], self.vis)
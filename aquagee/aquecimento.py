@@ -0,0 +1,247 @@
+"""Aquecimento do cache compartilhado com as consultas mais populares.
+
+Depois de um deploy (cache vazio) ou de uma atualização dos datasets, o
+primeiro usuário pagaria o custo inteiro das consultas mais comuns. Este módulo
+reexecuta uma lista de consultas pelas mesmas funções em cache que as páginas
+usam (`extracao.calcular_series_ee`, `comparacao.miniatura_comparacao`), com os
+mesmos argumentos, de modo que a página encontre o resultado já pronto:
+
+- a lista de `aquecimento.json` (se existir), ou
+- as N consultas mais registradas pelas páginas, mais os mapas do último mês e
+  do último ano completos de cada dataset.
+
+Cada consulta é um objeto JSON (em mapas, "datasets" é opcional; padrão: todos):
+    {"tipo": "serie", "dataset": "CHIRPS", "adm1": "Minas Gerais", "adm2": "", "inicio": 1981, "fim": 2024}
+    {"tipo": "mapa", "modo": "Mensal", "ano": 2024, "mes_idx": 12, "datasets": ["CHIRPS"]}
+
+Ao observar as atualizações, só são recalculadas as consultas (e, nos mapas, os
+datasets) cuja coleção ganhou imagens dentro do período consultado: séries de
+décadas do CHIRPS não são refeitas a cada hora porque o GSMaP ganhou um quadro.
+
+Uso (no deploy e em um serviço que acompanha as atualizações):
+    python -m aquagee.aquecimento
+    python -m aquagee.aquecimento --top 30
+    python -m aquagee.aquecimento --observar --intervalo 3600
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import ee
+
+from aquagee import comparacao, extracao, reducao_tiles, redutores
+from aquagee.cache import DIRETORIO_CACHE
+from aquagee.tabela_zonal import ADM2_ESTADO
+
+ARQUIVO_CONSULTAS = Path(os.environ.get('AQUAGEE_AQUECIMENTO', 'aquecimento.json'))
+
+SERIE = 'serie'
+MAPA = 'mapa'
+
+# Consultas mais registradas reexecutadas quando não há aquecimento.json
+TOP_PADRAO = 20
+# Consultas reexecutadas ao mesmo tempo. Cada série já dispara várias chamadas
+# no pool de `ee_async`, por isso as consultas rodam num pool próprio e pequeno.
+CONSULTAS_SIMULTANEAS = 2
+
+
+# ---------- Registro das consultas das páginas ----------
+@contextmanager
+def _conectar(diretorio=DIRETORIO_CACHE):
+    Path(diretorio).mkdir(parents=True, exist_ok=True)
+    conexao = sqlite3.connect(Path(diretorio) / 'consultas.db', timeout=30, isolation_level=None)
+    try:
+        conexao.execute('PRAGMA journal_mode=WAL')
+        conexao.execute(
+            "CREATE TABLE IF NOT EXISTS consultas ("
+            " consulta TEXT PRIMARY KEY, vezes INTEGER NOT NULL DEFAULT 0, ultima REAL NOT NULL)"
+        )
+        yield conexao
+    finally:
+        conexao.close()
+
+
+def registrar(tipo, **parametros):
+    """Conta mais uma ocorrência da consulta (chamado pelas páginas)."""
+    consulta = json.dumps({'tipo': tipo, **parametros}, sort_keys=True, default=str)
+    with _conectar() as conexao:
+        conexao.execute(
+            "INSERT INTO consultas (consulta, vezes, ultima) VALUES (?, 1, ?)"
+            " ON CONFLICT(consulta) DO UPDATE SET vezes = vezes + 1, ultima = excluded.ultima",
+            (consulta, time.time()),
+        )
+
+
+def mais_frequentes(n=TOP_PADRAO):
+    """As N consultas mais registradas."""
+    with _conectar() as conexao:
+        linhas = conexao.execute("SELECT consulta FROM consultas ORDER BY vezes DESC, ultima DESC LIMIT ?", (n,)).fetchall()
+    return [json.loads(consulta) for consulta, in linhas]
+
+
+def consultas_padrao(hoje=None):
+    """Mapas do último mês e do último ano completos (os padrões da página Comparações)."""
+    hoje = hoje or date.today()
+    mes_passado = hoje.replace(day=1) - timedelta(days=1)
+    return [
+        {'tipo': MAPA, 'modo': 'Mensal', 'ano': mes_passado.year, 'mes_idx': mes_passado.month},
+        {'tipo': MAPA, 'modo': 'Anual', 'ano': hoje.year - 1},
+    ]
+
+
+def carregar_consultas(caminho=ARQUIVO_CONSULTAS, top=TOP_PADRAO):
+    """Consultas do arquivo de configuração ou, na falta dele, as registradas mais os mapas padrão."""
+    if Path(caminho).exists():
+        return json.loads(Path(caminho).read_text())
+    consultas = consultas_padrao()
+    return consultas + [c for c in mais_frequentes(top) if c not in consultas]
+
+
+# ---------- Reexecução ----------
+def _serie(consulta, recalcular):
+    info = extracao.DATASETS[consulta['dataset']]
+    roi = extracao.roi_divisao(consulta['adm1'], consulta.get('adm2', ADM2_ESTADO))
+    estatisticas = redutores.normalizar(consulta.get('estatisticas'))
+    tiles = reducao_tiles.planejar(info['scale'], None, roi, estatisticas)
+    args = (*extracao.argumentos_series(info, roi, consulta['inicio'], consulta['fim']),
+            info['scale'], info['multiplier'], estatisticas, tiles)
+    funcao = extracao.calcular_series_ee.recalcular if recalcular else extracao.calcular_series_ee
+    funcao(*args)
+
+
+def _periodo_mapa(consulta):
+    """(inicio, fim, vis) do mapa, como a página Comparações os calcula."""
+    parametros = {nome: valor for nome, valor in consulta.items() if nome not in ('tipo', 'modo', 'meses', 'datasets')}
+    if 'data_sel' in parametros:
+        parametros['data_sel'] = date.fromisoformat(parametros['data_sel'])
+    inicio, fim, vis, _ = comparacao.periodo_comparacao(consulta['modo'], **parametros)
+    return inicio, fim, vis
+
+
+def _mapa(consulta, recalcular):
+    inicio, fim, vis = _periodo_mapa(consulta)
+    funcao = comparacao.miniatura_comparacao.recalcular if recalcular else comparacao.miniatura_comparacao
+    for nome_dataset in consulta.get('datasets', comparacao.DATASETS_PARA_COMPARAR):
+        funcao(nome_dataset, inicio, fim, vis)
+
+
+def aquecer_consulta(consulta, recalcular=False):
+    """Reexecuta uma consulta pelas funções em cache; `recalcular` substitui o valor já guardado."""
+    if consulta['tipo'] == SERIE:
+        _serie(consulta, recalcular)
+    elif consulta['tipo'] == MAPA:
+        _mapa(consulta, recalcular)
+    else:
+        raise ValueError(f"Tipo de consulta desconhecido: {consulta['tipo']}")
+
+
+def aquecer(consultas, recalcular=False):
+    """Reexecuta as consultas, algumas em paralelo; devolve {índice: erro} das que falharam."""
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONSULTAS_SIMULTANEAS) as executor:
+        futuros = {i: executor.submit(aquecer_consulta, consulta, recalcular) for i, consulta in enumerate(consultas)}
+    erros = {i: futuro.exception() for i, futuro in futuros.items() if futuro.exception() is not None}
+    for i, erro in erros.items():
+        print(f"falhou: {json.dumps(consultas[i], ensure_ascii=False)}: {erro}")
+    print(f"{len(consultas) - len(erros)}/{len(consultas)} consultas aquecidas em {time.perf_counter() - inicio:.1f} s")
+    return erros
+
+
+# ---------- Atualizações dos datasets ----------
+def _colecoes(info):
+    return {info['id'], info.get('id2', info['id'])}
+
+
+def _ms(dia):
+    return int(datetime(dia.year, dia.month, dia.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def dependencias(consulta):
+    """(início, fim) em ms do período consultado (fim exclusivo) e {dataset: coleções} de que ele depende."""
+    if consulta['tipo'] == SERIE:
+        info = extracao.DATASETS[consulta['dataset']]
+        periodo = _ms(date(consulta['inicio'], 1, 1)), _ms(date(consulta['fim'] + 1, 1, 1))
+        return periodo, {consulta['dataset']: _colecoes(info)}
+    inicio, fim, _ = _periodo_mapa(consulta)
+    # Um dia a mais no fim: no modo anual o fim é o próprio 31/12
+    periodo = _ms(date.fromisoformat(inicio)), _ms(date.fromisoformat(fim) + timedelta(days=1))
+    return periodo, {
+        nome: _colecoes(comparacao.DATASETS[nome])
+        for nome in consulta.get('datasets', comparacao.DATASETS_PARA_COMPARAR)
+    }
+
+
+def desatualizados(consulta, anteriores, atuais):
+    """Datasets da consulta cujas coleções ganharam imagens dentro do período consultado."""
+    (inicio, fim), por_dataset = dependencias(consulta)
+    nomes = []
+    for nome, colecoes in por_dataset.items():
+        for colecao_id in colecoes:
+            anterior, atual = anteriores.get(colecao_id), atuais.get(colecao_id)
+            # imagens novas estão em (anterior, atual]
+            if atual is not None and atual != anterior and inicio <= atual and fim > (anterior or 0):
+                nomes.append(nome)
+                break
+    return nomes
+
+
+def ultimas_datas():
+    """Timestamp (ms) da imagem mais recente de cada coleção das páginas, numa única chamada."""
+    ids = sorted(set().union(*(_colecoes(info) for info in (*extracao.DATASETS.values(), *comparacao.DATASETS.values()))))
+    agora = ee.Date(int(time.time() * 1000))
+    datas = ee.Dictionary.fromLists(ids, [
+        ee.ImageCollection(colecao_id).filterDate(agora.advance(-60, 'day'), agora).aggregate_max('system:time_start')
+        for colecao_id in ids
+    ])
+    return datas.getInfo()
+
+
+def observar(consultas, intervalo=3600):
+    """Aquece agora e, a cada `intervalo` segundos, recalcula as consultas afetadas por dados novos."""
+    aquecer(consultas)
+    anteriores = ultimas_datas()
+    while True:
+        time.sleep(intervalo)
+        atuais = ultimas_datas()
+        if atuais == anteriores:
+            continue
+        novos = [colecao_id for colecao_id in atuais if atuais[colecao_id] != anteriores.get(colecao_id)]
+        afetadas = []
+        for consulta in consultas:
+            nomes = desatualizados(consulta, anteriores, atuais)
+            if not nomes:
+                continue
+            afetadas.append(consulta if consulta['tipo'] == SERIE else {**consulta, 'datasets': nomes})
+        print(f"dados novos em {', '.join(novos)}: {len(afetadas)}/{len(consultas)} consultas afetadas")
+        if afetadas:
+            aquecer(afetadas, recalcular=True)
+        anteriores = atuais
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aquecimento do cache compartilhado.")
+    parser.add_argument('--arquivo', type=Path, default=ARQUIVO_CONSULTAS, help="lista de consultas (JSON)")
+    parser.add_argument('--top', type=int, default=TOP_PADRAO, help="consultas registradas mais frequentes")
+    parser.add_argument('--recalcular', action='store_true', help="substitui os valores já em cache")
+    parser.add_argument('--observar', action='store_true', help="continua rodando e reaquece após atualizações")
+    parser.add_argument('--intervalo', type=int, default=3600, help="segundos entre verificações (--observar)")
+    args = parser.parse_args()
+
+    from aquagee.gee import inicializar_fora_do_streamlit
+    inicializar_fora_do_streamlit()
+
+    consultas = carregar_consultas(args.arquivo, args.top)
+    if args.observar:
+        observar(consultas, args.intervalo)
+    else:
+        aquecer(consultas, args.recalcular)
+
+
+if __name__ == '__main__':
+    main()
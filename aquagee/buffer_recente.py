@@ -0,0 +1,251 @@
+"""Buffer circular local dos quadros sub-diários mais recentes (IMERG e GSMaP).
+
+Guarda os últimos N dias de quadros (meia-hora no IMERG, hora no GSMaP) sobre o
+domínio dos mapas em dois arquivos mapeados em memória:
+
+- `quadros.npy`:    float16 (capacidade x linhas x colunas), já em mm;
+- `timestamps.npy`: int64 (capacidade,), `system:time_start` de cada posição (-1 = vazia).
+
+A posição de um quadro é `(timestamp // passo) % capacidade`, então achar um
+horário é O(1) e um quadro novo sobrescreve naturalmente o mais antigo. Um
+coletor em segundo plano acrescenta os quadros novos; os modos "Última imagem"
+e "Selecionar Imagem por Data" da página Mapas Interativos leem localmente.
+
+Há um único coletor por dataset na máquina: ele precisa da trava exclusiva
+`coletor.lock` (`fcntl.flock`), que fica com o primeiro processo a obtê-la até
+ele terminar. Os demais processos do Streamlit só leem os memmaps.
+
+Coleta avulsa (ex.: cron, quando o app não está no ar):
+    python -m aquagee.buffer_recente --dataset IMERG --dataset GSMaP
+"""
+import argparse
+import fcntl
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import ee
+import numpy as np
+
+from aquagee.cubo import BYTES_POR_REQUISICAO, FONTES, Grade
+from aquagee.dominio import DOMINIO
+
+DIRETORIO_BUFFER = Path(os.environ.get('AQUAGEE_BUFFER', 'dados/recente'))
+DIAS_BUFFER = int(os.environ.get('AQUAGEE_BUFFER_DIAS', '7'))
+# Intervalo (s) entre coletas do coletor em segundo plano
+INTERVALO_COLETA = 600
+
+# Intervalo entre quadros de cada coleção sub-diária (ms)
+PASSOS = {'IMERG': 30 * 60 * 1000, 'GSMaP': 60 * 60 * 1000}
+# Atraso máximo (em quadros) do buffer em relação à coleção para ainda ser usado como "mais recente"
+PASSOS_TOLERADOS = 2
+
+# Limites do domínio no formato do folium ([[sul, oeste], [norte, leste]])
+LIMITES_MAPA = [[DOMINIO['lat_min'], DOMINIO['lon_min']], [DOMINIO['lat_max'], DOMINIO['lon_max']]]
+
+MS_DIA = 24 * 60 * 60 * 1000
+
+
+def _ms(dt):
+    return int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class BufferCircular:
+    """Quadros recentes de um dataset em memmaps float16, indexados pelo timestamp."""
+
+    def __init__(self, dataset, dias=DIAS_BUFFER, diretorio=DIRETORIO_BUFFER, somente_leitura=False):
+        self.dataset = dataset
+        self.fonte = FONTES[dataset]
+        self.passo = PASSOS[dataset]
+        self.grade = Grade(self.fonte['resolucao'])
+        self.capacidade = dias * MS_DIA // self.passo
+        self.caminho = Path(diretorio) / dataset
+        self.somente_leitura = somente_leitura
+        self.quadros = self.timestamps = None
+        self._trava = threading.Lock()
+        if not somente_leitura:
+            self.caminho.mkdir(parents=True, exist_ok=True)
+        self._carregar()
+
+    def _carregar(self):
+        """Abre os memmaps; no modo somente leitura, só depois que o coletor os criou."""
+        if self.timestamps is None:
+            quadros = self._abrir('quadros.npy', (self.capacidade,) + self.grade.forma, np.float16, np.nan)
+            timestamps = self._abrir('timestamps.npy', (self.capacidade,), np.int64, -1)
+            if quadros is not None and timestamps is not None:
+                self.quadros, self.timestamps = quadros, timestamps
+        return self.timestamps is not None
+
+    def _abrir(self, nome, forma, dtype, vazio):
+        arquivo = self.caminho / nome
+        if arquivo.exists():
+            array = np.lib.format.open_memmap(arquivo, mode='r' if self.somente_leitura else 'r+')
+            if array.shape == forma:
+                return array
+            del array  # capacidade ou grade mudaram: recria
+        if self.somente_leitura:
+            return None
+        array = np.lib.format.open_memmap(arquivo, mode='w+', dtype=dtype, shape=forma)
+        array[:] = vazio
+        array.flush()
+        return array
+
+    def _posicao(self, timestamp):
+        return (int(timestamp) // self.passo) % self.capacidade
+
+    def gravar(self, timestamp, grade):
+        """Grava um quadro; o timestamp só é publicado depois dos pixels."""
+        i = self._posicao(timestamp)
+        with self._trava:
+            self.timestamps[i] = -1
+            self.quadros[i] = grade
+            self.quadros.flush()
+            self.timestamps[i] = timestamp
+            self.timestamps.flush()
+
+    def quadro(self, timestamp):
+        """Grade float32 do quadro com esse timestamp, ou None se não estiver no buffer."""
+        if not self._carregar():
+            return None
+        i = self._posicao(timestamp)
+        if self.timestamps[i] != timestamp:
+            return None
+        grade = np.array(self.quadros[i], dtype=np.float32)
+        # O coletor (outro processo) pode ter reaproveitado a posição durante a leitura
+        return grade if self.timestamps[i] == timestamp else None
+
+    def ultimo(self):
+        """Timestamp (ms) do quadro mais recente, ou None se o buffer está vazio."""
+        if not self._carregar():
+            return None
+        maximo = int(self.timestamps.max())
+        return maximo if maximo > 0 else None
+
+    def recente(self, referencia, passos=PASSOS_TOLERADOS):
+        """Timestamp do quadro mais novo, se estiver a até `passos` quadros de `referencia` (ms).
+
+        Protege contra um coletor parado ou falhando: o buffer continua cheio, mas
+        com quadros antigos, que não devem ser mostrados como os mais recentes.
+        """
+        ultimo = self.ultimo()
+        if ultimo is None or ultimo < referencia - passos * self.passo:
+            return None
+        return ultimo
+
+    def timestamps_do_dia(self, dia):
+        """Timestamps do dia (UTC) presentes no buffer, do mais recente para o mais antigo."""
+        if not self._carregar():
+            return np.empty(0, dtype=np.int64)
+        inicio = _ms(datetime(dia.year, dia.month, dia.day))
+        candidatos = np.arange(inicio, inicio + MS_DIA, self.passo, dtype=np.int64)
+        presentes = candidatos[self.timestamps[(candidatos // self.passo) % self.capacidade] == candidatos]
+        return presentes[::-1]
+
+    # ---------- Coleta ----------
+    def _faltantes(self, agora):
+        """Timestamps da janela do buffer que existem no EE e ainda não estão gravados."""
+        ultimo = self.ultimo()
+        desde = agora - self.capacidade * self.passo
+        if ultimo is not None:
+            desde = max(desde, ultimo + 1)
+        colecao = ee.ImageCollection(self.fonte['id']).filterDate(desde, agora)
+        disponiveis = colecao.aggregate_array('system:time_start').getInfo() or []
+        return sorted((ts for ts in disponiveis if self.quadro(ts) is None), reverse=True)
+
+    def coletar(self):
+        """Baixa via computePixels os quadros que faltam (mais recentes primeiro). Retorna quantos."""
+        colecao = ee.ImageCollection(self.fonte['id']).select(self.fonte['band'])
+        faltantes = self._faltantes(_ms(datetime.utcnow()))
+        por_requisicao = max(BYTES_POR_REQUISICAO // (self.grade.n_lat * self.grade.n_lon * 4), 1)
+        for k in range(0, len(faltantes), por_requisicao):
+            lote = faltantes[k:k + por_requisicao]
+            nomes = [f"t{ts}" for ts in lote]
+            imagem = ee.Image.cat([
+                colecao.filter(ee.Filter.eq('system:time_start', ts)).first().multiply(self.fonte['multiplier'])
+                for ts in lote
+            ]).rename(nomes)
+            pixels = ee.data.computePixels({
+                'expression': imagem, 'fileFormat': 'NUMPY_NDARRAY', 'grid': self.grade.grid_ee(),
+            })
+            for ts, nome in zip(lote, nomes):
+                self.gravar(ts, pixels[nome])
+        return len(faltantes)
+
+
+def travar_coletor(dataset, diretorio=DIRETORIO_BUFFER):
+    """Trava exclusiva do coletor do dataset: o arquivo aberto, ou None se outro processo a tem.
+
+    Só quem tem a trava grava no buffer; ela é liberada ao fechar o arquivo ou
+    quando o processo termina.
+    """
+    caminho = Path(diretorio) / dataset
+    caminho.mkdir(parents=True, exist_ok=True)
+    arquivo = open(caminho / 'coletor.lock', 'w')
+    try:
+        fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        arquivo.close()
+        return None
+    return arquivo
+
+
+def iniciar_coletor(dataset, intervalo=INTERVALO_COLETA, diretorio=DIRETORIO_BUFFER):
+    """Thread daemon que, ao obter a trava do coletor, chama `coletar()` a cada `intervalo` segundos.
+
+    Em todos os processos a thread tenta a trava a cada intervalo, então se o
+    processo coletor terminar outro assume.
+    """
+    def laco():
+        while travar_coletor(dataset, diretorio) is None:
+            time.sleep(intervalo)
+        # A trava fica aberta (com este processo) enquanto a thread viver
+        buffer = BufferCircular(dataset, diretorio=diretorio)
+        while True:
+            try:
+                novos = buffer.coletar()
+                if novos:
+                    print(f"{buffer.dataset}: {novos} quadros recentes gravados")
+            except Exception as e:
+                print(f"{buffer.dataset}: falha na coleta do buffer recente: {e}")
+            time.sleep(intervalo)
+
+    thread = threading.Thread(target=laco, name=f"buffer-{dataset}", daemon=True)
+    thread.start()
+    return thread
+
+
+# ---------- Visualização ----------
+def colorir(grade, vis_params):
+    """Imagem RGBA uint8 da grade com a paleta de `vis_params`; abaixo de `min` fica transparente."""
+    paleta = np.array([[int(cor[i:i + 2], 16) for i in (0, 2, 4)] for cor in vis_params['palette']], dtype=float)
+    posicoes = np.linspace(0, 1, len(paleta))
+    tabela = np.stack([np.interp(np.linspace(0, 1, 256), posicoes, paleta[:, c]) for c in range(3)], axis=1)
+    normalizado = (grade - vis_params['min']) / (vis_params['max'] - vis_params['min'])
+    indices = (np.clip(np.nan_to_num(normalizado), 0, 1) * 255).astype(np.uint8)
+    rgba = np.empty(grade.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = tabela[indices]
+    rgba[..., 3] = np.where(grade > vis_params['min'], 255, 0)
+    return rgba
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coleta dos quadros recentes para o buffer local.")
+    parser.add_argument('--dataset', choices=list(PASSOS), action='append', help="pode ser repetido; padrão: todos")
+    args = parser.parse_args()
+
+    from aquagee.gee import inicializar_fora_do_streamlit
+    inicializar_fora_do_streamlit()
+
+    for dataset in args.dataset or list(PASSOS):
+        trava = travar_coletor(dataset)
+        if trava is None:
+            print(f"{dataset}: outro processo já está coletando")
+            continue
+        with trava:
+            print(f"{dataset}: {BufferCircular(dataset).coletar()} quadros gravados")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""Cache compartilhado entre processos (SQLite em modo WAL).
+
+`st.cache_data` guarda os resultados na memória de cada processo: com várias
+réplicas do Streamlit na mesma máquina, cada uma refaria no Earth Engine as
+mesmas séries, URLs de tiles, listas de divisões políticas e últimas datas. O
+decorador `cache_compartilhado` guarda o resultado (pickle) num único arquivo
+SQLite, visto por todos os processos, com validade opcional e contagem de
+acertos e falhas por cache. Os valores expirados são apagados periodicamente
+pelas próprias gravações:
+
+    dados/cache/cache.db
+
+Consulta e manutenção:
+    python -m aquagee.cache metricas
+    python -m aquagee.cache limpar [--cache series]
+"""
+import argparse
+import atexit
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+
+import ee
+
+DIRETORIO_CACHE = Path(os.environ.get('AQUAGEE_CACHE', 'dados/cache'))
+
+# Intervalo (s) entre gravações das contagens de acertos/falhas acumuladas no processo
+INTERVALO_METRICAS = 10
+# A cada quantas gravações do processo os valores expirados são apagados do banco
+GRAVACOES_POR_LIMPEZA = 200
+
+_ESQUEMA = (
+    """CREATE TABLE IF NOT EXISTS valores (
+        cache TEXT NOT NULL, chave TEXT NOT NULL, valor BLOB NOT NULL, expira REAL,
+        PRIMARY KEY (cache, chave)
+    )""",
+    """CREATE TABLE IF NOT EXISTS metricas (
+        cache TEXT PRIMARY KEY, acertos INTEGER NOT NULL DEFAULT 0, falhas INTEGER NOT NULL DEFAULT 0
+    )""",
+)
+
+# Contagens ainda não gravadas (acertos e falhas por cache), deste processo
+_pendentes = Counter()
+_ultima_gravacao = time.monotonic()
+_gravacoes = 0
+_trava = threading.Lock()
+
+
+@contextmanager
+def _conectar(diretorio=DIRETORIO_CACHE):
+    Path(diretorio).mkdir(parents=True, exist_ok=True)
+    conexao = sqlite3.connect(Path(diretorio) / 'cache.db', timeout=30, isolation_level=None)
+    try:
+        conexao.execute('PRAGMA journal_mode=WAL')
+        for comando in _ESQUEMA:
+            conexao.execute(comando)
+        yield conexao
+    finally:
+        conexao.close()
+
+
+def _serializar(objeto):
+    """Forma estável (para a chave) de argumentos que o JSON não representa.
+
+    Outros tipos são recusados: o `repr` de um objeto qualquer costuma conter o
+    endereço de memória, o que daria uma chave diferente em cada processo.
+    """
+    if isinstance(objeto, ee.ComputedObject):
+        return objeto.serialize()
+    if isinstance(objeto, (date, datetime)):
+        return objeto.isoformat()
+    if isinstance(objeto, (set, frozenset)):
+        return sorted(objeto, key=repr)
+    raise TypeError(f"argumento sem chave estável para o cache compartilhado: {type(objeto).__name__}")
+
+
+def _chave(func, args, kwargs):
+    texto = json.dumps([func.__qualname__, args, kwargs], default=_serializar, sort_keys=True)
+    return hashlib.sha1(texto.encode()).hexdigest()
+
+
+def _contar(nome, acerto):
+    """Acumula a contagem no processo e a grava no banco a cada INTERVALO_METRICAS segundos."""
+    with _trava:
+        _pendentes[(nome, 'acertos' if acerto else 'falhas')] += 1
+        if time.monotonic() - _ultima_gravacao < INTERVALO_METRICAS:
+            return
+    gravar_metricas()
+
+
+@atexit.register
+def gravar_metricas():
+    """Grava no banco as contagens acumuladas neste processo."""
+    global _ultima_gravacao
+    with _trava:
+        pendentes = dict(_pendentes)
+        _pendentes.clear()
+        _ultima_gravacao = time.monotonic()
+    if not pendentes:
+        return
+    with _conectar() as conexao:
+        for (nome, campo), n in pendentes.items():
+            conexao.execute(
+                f"INSERT INTO metricas (cache, {campo}) VALUES (?, ?)"
+                f" ON CONFLICT(cache) DO UPDATE SET {campo} = {campo} + excluded.{campo}",
+                (nome, n),
+            )
+
+
+def obter(nome, chave):
+    """(True, valor) se a chave está no cache e não expirou, senão (False, None)."""
+    with _conectar() as conexao:
+        linha = conexao.execute(
+            "SELECT valor, expira FROM valores WHERE cache = ? AND chave = ?", (nome, chave)
+        ).fetchone()
+    if linha is None or (linha[1] is not None and linha[1] < time.time()):
+        return False, None
+    return True, pickle.loads(linha[0])
+
+
+def contem(nome, chave):
+    """Se a chave está no cache e não expirou (sem carregar o valor)."""
+    with _conectar() as conexao:
+        linha = conexao.execute(
+            "SELECT 1 FROM valores WHERE cache = ? AND chave = ? AND (expira IS NULL OR expira >= ?)",
+            (nome, chave, time.time()),
+        ).fetchone()
+    return linha is not None
+
+
+def guardar(nome, chave, valor, ttl=None):
+    """Grava o valor (substituindo o anterior); `ttl` em segundos, None para não expirar.
+
+    A cada GRAVACOES_POR_LIMPEZA gravações do processo, apaga também os valores
+    expirados de todos os caches: as chaves de miniaturas, URLs de tiles e
+    séries mudam com cada período, região e visualização, e os valores vencidos
+    nunca seriam lidos de novo.
+    """
+    global _gravacoes
+    dados = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+    expira = time.time() + ttl if ttl is not None else None
+    with _trava:
+        _gravacoes += 1
+        limpar_expirados = _gravacoes % GRAVACOES_POR_LIMPEZA == 0
+    with _conectar() as conexao:
+        conexao.execute(
+            "INSERT OR REPLACE INTO valores (cache, chave, valor, expira) VALUES (?, ?, ?, ?)",
+            (nome, chave, sqlite3.Binary(dados), expira),
+        )
+        if limpar_expirados:
+            conexao.execute("DELETE FROM valores WHERE expira IS NOT NULL AND expira < ?", (time.time(),))
+
+
+def cache_compartilhado(nome, ttl=None):
+    """Decorador: guarda o resultado da função no cache `nome`, indexado pelos argumentos.
+
+    Objetos do EE entram na chave pela sua serialização; argumentos de tipos
+    sem forma estável levantam TypeError. Exceções não são guardadas, e
+    resultados None (falha ou dado ausente) e valores que não podem ser
+    serializados com pickle são apenas devolvidos. `ttl` também pode ser uma
+    função dos mesmos argumentos que devolve a validade (ou None) de cada
+    resultado. A função decorada ganha `em_cache(*args, **kwargs)`, que só
+    consulta, e `recalcular(*args, **kwargs)`, que ignora o valor guardado e o
+    substitui (usado no aquecimento após atualizações dos datasets).
+    """
+    def decorador(func):
+        def calcular(chave, args, kwargs):
+            valor = func(*args, **kwargs)
+            if valor is None:
+                return valor
+            validade = ttl(*args, **kwargs) if callable(ttl) else ttl
+            try:
+                guardar(nome, chave, valor, validade)
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                print(f"cache '{nome}': resultado não guardado ({e})")
+            return valor
+
+        @functools.wraps(func)
+        def envoltorio(*args, **kwargs):
+            chave = _chave(func, args, kwargs)
+            achou, valor = obter(nome, chave)
+            _contar(nome, achou)
+            if achou:
+                return valor
+            return calcular(chave, args, kwargs)
+
+        envoltorio.cache_nome = nome
+        envoltorio.em_cache = lambda *args, **kwargs: contem(nome, _chave(func, args, kwargs))
+        envoltorio.recalcular = lambda *args, **kwargs: calcular(_chave(func, args, kwargs), args, kwargs)
+        return envoltorio
+    return decorador
+
+
+def metricas():
+    """{cache: {'acertos', 'falhas', 'taxa'}} somando todos os processos."""
+    with _trava:
+        pendentes = dict(_pendentes)
+    with _conectar() as conexao:
+        linhas = conexao.execute("SELECT cache, acertos, falhas FROM metricas").fetchall()
+    contagens = {nome: Counter(acertos=acertos, falhas=falhas) for nome, acertos, falhas in linhas}
+    for (nome, campo), n in pendentes.items():
+        contagens.setdefault(nome, Counter())[campo] += n
+    return {
+        nome: {
+            'acertos': c['acertos'], 'falhas': c['falhas'],
+            'taxa': c['acertos'] / (c['acertos'] + c['falhas']) if c['acertos'] + c['falhas'] else None,
+        }
+        for nome, c in sorted(contagens.items())
+    }
+
+
+def limpar(nome=None, apenas_expirados=False):
+    """Remove valores (de um cache ou de todos); devolve quantos foram removidos."""
+    condicoes, parametros = [], []
+    if nome is not None:
+        condicoes.append("cache = ?")
+        parametros.append(nome)
+    if apenas_expirados:
+        condicoes.append("expira IS NOT NULL AND expira < ?")
+        parametros.append(time.time())
+    onde = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    with _conectar() as conexao:
+        return conexao.execute(f"DELETE FROM valores{onde}", parametros).rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache compartilhado entre processos.")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    comandos.add_parser('metricas', help="acertos e falhas por cache")
+    limpeza = comandos.add_parser('limpar', help="remove valores do cache")
+    limpeza.add_argument('--cache', help="só este cache (padrão: todos)")
+    limpeza.add_argument('--expirados', action='store_true', help="só os valores já expirados")
+    args = parser.parse_args()
+
+    if args.comando == 'metricas':
+        for nome, m in metricas().items():
+            taxa = f"{m['taxa']:.0%}" if m['taxa'] is not None else '-'
+            print(f"{nome:<20} {m['acertos']:>8} acertos {m['falhas']:>8} falhas  {taxa:>5}")
+    else:
+        print(f"{limpar(args.cache, args.expirados)} valores removidos")
+
+
+if __name__ == '__main__':
+    main()
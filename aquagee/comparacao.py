@@ -0,0 +1,135 @@
+"""Mapas da página Comparações: soma do período de cada dataset e seus caches.
+
+Fica fora da página para que o aquecimento de cache (`aquagee.aquecimento`)
+chame exatamente as mesmas funções, com as mesmas chaves, que a página usa.
+"""
+from datetime import date, timedelta
+
+import ee
+
+from aquagee.cache import cache_compartilhado
+from aquagee.miniaturas import renderizar_png
+
+# Dias após o fim do período em que ainda chegam dados (o CHIRPS leva cerca de três semanas)
+LATENCIA_DIAS = 30
+# Validade (s) das miniaturas de períodos que ainda recebem dados
+VALIDADE_RECENTE = 6 * 3600
+
+# --- CONFIGURAÇÕES DOS DADOS ---
+PALETA_PRECIPITACAO = ['1621a2', '03ffff', '13ff03', 'efff00', 'ffb103', 'ff2300']
+
+# Dicionário com informações detalhadas de cada fonte de dados
+DATASETS = {
+    'CHIRPS': {
+        'id': 'UCSB-CHG/CHIRPS/DAILY',
+        'id2': 'UCSB-CHG/CHIRPS/PENTAD',
+        'band': 'precipitation',
+        'band2': 'precipitation',
+        'multiplier': 1,      # já vem em mm/dia
+        'multiplier2': 1,     # já vem em mm/pentad
+        'temp': False,
+        'start_year': 1981,
+        'scale': 5566,
+        'name': 'CHIRPS',
+        'type': 'daily',      # etiqueta para ajudar a função
+    },
+    'IMERG': {
+        'id': 'NASA/GPM_L3/IMERG_V07',            # 30 min
+        'id2': 'NASA/GPM_L3/IMERG_MONTHLY_V07',   # mensal
+        'band': 'precipitation',
+        'band2': 'precipitation',
+        'multiplier': 0.5,    # 30 min → mm/24h (48 steps * 0.5 = 24h)
+        'multiplier2': 1,     # 
+        'temp': True,
+        'start_year': 2000,
+        'scale': 11132,
+        'name': 'IMERG',
+        'type': 'subdaily',
+    },
+    'GSMAP': {
+        'id': 'JAXA/GPM_L3/GSMaP/v8/operational', # horário
+        'id2': 'JAXA/GPM_L3/GSMaP/v8/operational',
+        'band': 'hourlyPrecipRate',
+        'band2': 'hourlyPrecipRate',
+        'multiplier': 1,       # já em mm/h
+        'multiplier2': 1,
+        'temp': False,
+        'start_year': 2000,
+        'scale': 11132,
+        'name': 'GSMaP',
+        'type': 'hourly',
+    },
+
+}
+
+# Ordem fixa para exibição dos mapas
+DATASETS_PARA_COMPARAR = ['GSMAP', 'IMERG', 'CHIRPS']
+
+
+def obter_soma_periodo(info, inicio, fim):
+    colecao = ee.ImageCollection(info['id']).filterDate(inicio, fim).select(info['band'])
+
+    # Casos especiais com coleção mensal/pentadal
+    if 'id2' in info and (info['id2'] != info['id']) and (info['type'] in ['monthly', 'pentad']):
+        colecao = ee.ImageCollection(info['id2']).filterDate(inicio, fim).select(info['band2'])
+        return colecao.sum().multiply(info['multiplier2'])
+
+    # IMERG: mm/h → mm/30min → mm/dia
+    if info['name'] == "IMERG":
+        colecao = colecao.map(lambda img: img.multiply(0.5))
+        return colecao.sum()
+
+    # GSMaP: já em mm/h → precisa multiplicar por 1h
+    if info['name'] == "GSMaP":
+        colecao = colecao.map(lambda img: img.multiply(1))
+        return colecao.sum()
+
+    # CHIRPS diário: já vem pronto em mm/dia
+    if info['name'] == "CHIRPS":
+        return colecao.sum()
+
+    # fallback
+    return colecao.sum().multiply(info['multiplier'])
+
+
+def periodo_comparacao(modo, **kwargs):
+    """(inicio, fim, vis, legenda) do período escolhido, com as datas em texto ISO."""
+    if modo == "Diário":
+        data_sel = kwargs['data_sel']
+        inicio = data_sel.strftime("%Y-%m-%d")
+        fim = (data_sel + timedelta(days=1)).strftime("%Y-%m-%d")
+        return inicio, fim, {'min': 1, 'max': 50, 'palette': PALETA_PRECIPITACAO}, "Precipitação [mm/dia]"
+
+    if modo == "Mensal":
+        ano, mes_idx = kwargs['ano'], kwargs['mes_idx']
+        inicio = date(ano, mes_idx, 1)
+        fim = (inicio + timedelta(days=32)).replace(day=1)
+        return inicio.isoformat(), fim.isoformat(), {'min': 50, 'max': 600, 'palette': PALETA_PRECIPITACAO}, "Precipitação [mm/mês]"
+
+    if modo == "Anual":
+        ano = kwargs['ano']
+        return f"{ano}-01-01", f"{ano}-12-31", {'min': 200, 'max': 3000, 'palette': PALETA_PRECIPITACAO}, "Precipitação [mm/ano]"
+
+    raise ValueError(modo)
+
+
+def _validade_periodo(nome_dataset, inicio, fim, vis_params):
+    """Sem validade para períodos já consolidados; VALIDADE_RECENTE enquanto o período ainda recebe dados."""
+    if date.fromisoformat(fim) + timedelta(days=LATENCIA_DIAS) < date.today():
+        return None
+    return VALIDADE_RECENTE
+
+
+@cache_compartilhado('miniaturas', ttl=_validade_periodo)
+def miniatura_comparacao(nome_dataset, inicio, fim, vis_params):
+    """PNG estático da soma do período (getThumbURL), em cache por (dataset, período, vis)."""
+    img = obter_soma_periodo(DATASETS[nome_dataset], inicio, fim)
+    return renderizar_png(img.updateMask(img.gt(vis_params['min'])), vis_params)
+
+
+@cache_compartilhado('url_tiles', ttl=6 * 3600)
+def url_tiles_comparacao(nome_dataset, inicio, fim, vis_params):
+    """Modelo de URL dos tiles da soma do período: um único getMapId por (dataset, período, vis)."""
+    img = obter_soma_periodo(DATASETS[nome_dataset], inicio, fim)
+    mapa_id = img.updateMask(img.gt(vis_params['min'])).getMapId(vis_params)
+    return mapa_id['tile_fetcher'].url_format
@@ -0,0 +1,72 @@
+"""Transporte HTTP persistente para o cliente do Earth Engine.
+
+`ee.Initialize` não recebe uma `requests.Session`, só um `http_transport` com a
+interface `request()` do httplib2. Aqui esse transporte é o do próprio cliente
+do EE (`_cloud_api_utils._Http`), apenas entregue a uma sessão configurada: pool
+keep-alive limitado à concorrência de `ee_async` e novas tentativas em falhas de
+conexão. A mesma sessão é usada para baixar miniaturas e rasters, que assim
+reaproveitam as conexões TLS já abertas com o Earth Engine.
+"""
+import requests
+from ee._cloud_api_utils import _Http
+from requests.adapters import HTTPAdapter
+
+from aquagee.ee_async import MAX_CONCORRENCIA
+
+# Tempo limite (s) de cada requisição ao Earth Engine
+TIMEOUT_PADRAO = 120
+
+
+def contar_conexoes(sessao):
+    """(requisições, conexões abertas) somadas dos pools do urllib3 da sessão."""
+    requisicoes = novas = 0
+    for adaptador in set(sessao.adapters.values()):
+        pools = adaptador.poolmanager.pools
+        for chave in list(pools.keys()):
+            pool = pools.get(chave)
+            if pool is not None:
+                requisicoes += pool.num_requests
+                novas += pool.num_connections
+    return requisicoes, novas
+
+
+class TransportePersistente(_Http):
+    """Transporte do cliente do EE sobre uma `requests.Session` com pool keep-alive dimensionado."""
+
+    def __init__(self, tamanho=MAX_CONCORRENCIA, timeout=TIMEOUT_PADRAO):
+        adaptador = HTTPAdapter(
+            pool_connections=4,      # hosts distintos (earthengine, oauth2, storage...)
+            pool_maxsize=tamanho,    # conexões por host = threads do pool do EE
+            pool_block=True,         # nunca abre mais conexões que o tamanho do pool
+            max_retries=2,           # apenas falhas de conexão; o cliente do EE trata 429/5xx
+        )
+        self.sessao = requests.Session()
+        self.sessao.mount('https://', adaptador)
+        self.sessao.mount('http://', adaptador)
+        super().__init__(self.sessao, timeout)
+
+    def estatisticas(self):
+        """Requisições feitas e conexões abertas/reaproveitadas pela sessão."""
+        requisicoes, novas = contar_conexoes(self.sessao)
+        return {
+            'requisicoes': requisicoes,
+            'conexoes_novas': novas,
+            'conexoes_reutilizadas': max(requisicoes - novas, 0),
+        }
+
+    def taxa_reutilizacao(self):
+        """Fração das requisições que reaproveitaram uma conexão já aberta."""
+        estatisticas = self.estatisticas()
+        total = estatisticas['requisicoes']
+        return estatisticas['conexoes_reutilizadas'] / total if total else 0.0
+
+
+_transporte = None
+
+
+def obter_transporte():
+    """Retorna o transporte compartilhado pelo processo (criado na primeira chamada)."""
+    global _transporte
+    if _transporte is None:
+        _transporte = TransportePersistente()
+    return _transporte
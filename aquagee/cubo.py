@@ -0,0 +1,238 @@
+"""Cubo local de precipitação diária sobre o Brasil (Zarr).
+
+Espelha os totais diários de CHIRPS, IMERG e GSMaP numa grade regular cobrindo
+o domínio dos mapas (centrados em [-15, -55]). Cada dataset tem o array `serie`,
+fragmentado no tempo (365 dias x 32 x 32 pixels) para ler a série de uma região
+com poucos fragmentos, e o array `preenchido`, que marca os dias já ingeridos.
+
+Quando o cubo cobre o período pedido, as séries da página Séries Temporais são
+respondidas com leituras locais, sem nenhuma chamada ao Earth Engine.
+
+Ingestão (linha de comando):
+    python -m aquagee.cubo --dataset CHIRPS --inicio 2020-01-01 --fim 2020-12-31
+    python -m aquagee.cubo --dataset IMERG --inicio 2024-01-01 --fim 2024-01-31 --arquivos exportados/
+"""
+import argparse
+import math
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+import ee
+import numpy as np
+
+from aquagee import zonal
+from aquagee.dominio import DOMINIO, dentro_do_dominio
+from aquagee.series import serie_compacta
+
+DIRETORIO_CUBO = Path(os.environ.get('AQUAGEE_CUBO', 'dados/cubo'))
+
+# Coleções espelhadas: id diário, banda, multiplicador para mm e ano inicial do eixo de tempo
+FONTES = {
+    'CHIRPS': {'id': 'UCSB-CHG/CHIRPS/DAILY', 'band': 'precipitation', 'multiplier': 1, 'start_year': 1981, 'resolucao': 0.05},
+    'IMERG': {'id': 'NASA/GPM_L3/IMERG_V07', 'band': 'precipitation', 'multiplier': 0.5, 'start_year': 2000, 'resolucao': 0.1},
+    'GSMaP': {'id': 'JAXA/GPM_L3/GSMaP/v8/operational', 'band': 'hourlyPrecipRate', 'multiplier': 1, 'start_year': 2000, 'resolucao': 0.1},
+}
+
+CHUNKS_SERIE = (365, 32, 32)
+# Limite de bytes por requisição computePixels (o EE aceita até ~48 MB)
+BYTES_POR_REQUISICAO = 32 * 2**20
+
+
+class Grade:
+    """Grade regular lat/lon do dataset sobre o domínio (linhas de norte para sul)."""
+
+    def __init__(self, resolucao):
+        self.resolucao = resolucao
+        self.n_lon = int(round((DOMINIO['lon_max'] - DOMINIO['lon_min']) / resolucao))
+        self.n_lat = int(round((DOMINIO['lat_max'] - DOMINIO['lat_min']) / resolucao))
+        self.lons = DOMINIO['lon_min'] + (np.arange(self.n_lon) + 0.5) * resolucao
+        self.lats = DOMINIO['lat_max'] - (np.arange(self.n_lat) + 0.5) * resolucao
+
+    @property
+    def forma(self):
+        return self.n_lat, self.n_lon
+
+    def janela(self, lon_min, lat_min, lon_max, lat_max):
+        """Índices (linha0, linha1, coluna0, coluna1) dos pixels que tocam o retângulo."""
+        x0 = max(int(math.floor((lon_min - DOMINIO['lon_min']) / self.resolucao)), 0)
+        x1 = min(int(math.ceil((lon_max - DOMINIO['lon_min']) / self.resolucao)), self.n_lon)
+        y0 = max(int(math.floor((DOMINIO['lat_max'] - lat_max) / self.resolucao)), 0)
+        y1 = min(int(math.ceil((DOMINIO['lat_max'] - lat_min) / self.resolucao)), self.n_lat)
+        return y0, max(y1, y0 + 1), x0, max(x1, x0 + 1)
+
+    def grid_ee(self):
+        """Parâmetro `grid` do ee.data.computePixels para esta grade."""
+        return {
+            'dimensions': {'width': self.n_lon, 'height': self.n_lat},
+            'affineTransform': {
+                'scaleX': self.resolucao, 'shearX': 0, 'translateX': DOMINIO['lon_min'],
+                'shearY': 0, 'scaleY': -self.resolucao, 'translateY': DOMINIO['lat_max'],
+            },
+            'crsCode': 'EPSG:4326',
+        }
+
+
+# ---------- Geometrias locais ----------
+def retangulo_geojson(lon_min, lat_min, lon_max, lat_max):
+    return {'type': 'Polygon', 'coordinates': [[
+        [lon_min, lat_min], [lon_max, lat_min], [lon_max, lat_max], [lon_min, lat_max], [lon_min, lat_min]
+    ]]}
+
+
+def circulo_geojson(lon, lat, raio_m, n_vertices=64):
+    """Polígono aproximando `ee.Geometry.Point(...).buffer(raio_m)`."""
+    angulos = np.linspace(0, 2 * np.pi, n_vertices + 1)
+    dlat = np.degrees(raio_m / 6371008.8)
+    dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    anel = np.column_stack((lon + dlon * np.cos(angulos), lat + dlat * np.sin(angulos)))
+    return {'type': 'Polygon', 'coordinates': [anel.tolist()]}
+
+
+# ---------- Armazenamento ----------
+class Cubo:
+    """Arrays Zarr de um dataset: `serie` e `preenchido` (dias já ingeridos)."""
+
+    def __init__(self, dataset, diretorio=DIRETORIO_CUBO):
+        self.dataset = dataset
+        self.fonte = FONTES[dataset]
+        self.grade = Grade(self.fonte['resolucao'])
+        self.origem = date(self.fonte['start_year'], 1, 1)
+        self.caminho = Path(diretorio) / dataset
+
+    def existe(self):
+        return (self.caminho / 'preenchido').exists()
+
+    def _abrir(self, nome, n_dias, chunks, dtype, fill_value, modo):
+        import zarr  # só quando o cubo é lido ou gravado: as páginas importam este módulo de início
+
+        forma = (n_dias,) + (self.grade.forma if len(chunks) == 3 else ())
+        return zarr.open_array(store=str(self.caminho / nome), mode=modo, shape=forma,
+                               chunks=chunks, dtype=dtype, fill_value=fill_value)
+
+    def arrays(self, modo='r', n_dias=None):
+        n_dias = n_dias or (date.today() - self.origem).days + 1
+        serie = self._abrir('serie', n_dias, CHUNKS_SERIE, 'float32', np.nan, modo)
+        preenchido = self._abrir('preenchido', n_dias, (4096,), 'uint8', 0, modo)
+        return serie, preenchido
+
+    def indice(self, dia):
+        return (dia - self.origem).days
+
+    def cobre(self, inicio, fim):
+        """True se todos os dias de [inicio, fim] já estão no cubo."""
+        if not self.existe():
+            return False
+        _, preenchido = self.arrays()
+        i0, i1 = self.indice(inicio), self.indice(fim) + 1
+        if i0 < 0 or i1 > preenchido.shape[0]:
+            return False
+        return bool(np.all(preenchido[i0:i1]))
+
+    def gravar(self, primeiro_dia, grades):
+        """Grava um bloco (dias x linhas x colunas) começando em `primeiro_dia`."""
+        i0 = self.indice(primeiro_dia)
+        i1 = i0 + grades.shape[0]
+        serie, preenchido = self.arrays('a')
+        if i1 > serie.shape[0]:
+            for array in (serie, preenchido):
+                array.resize((i1,) + array.shape[1:])
+        serie[i0:i1] = grades
+        preenchido[i0:i1] = 1
+
+    def serie_regiao(self, geojson, inicio, fim):
+        """Série diária (média ponderada por área) da ROI, lida do array `serie`.
+
+        Lê só a janela que contém a ROI e aplica o vetor esparso de pesos (ver
+        `aquagee.zonal`) num único produto.
+        """
+        (y0, y1, x0, x1), matriz = zonal.matriz_pesos(self.grade, geojson)
+        serie, _ = self.arrays()
+        valores = zonal.medias(matriz, serie[self.indice(inicio):self.indice(fim) + 1, y0:y1, x0:x1])[0]
+        datas = np.datetime64(inicio, 'D') + np.arange(len(valores))
+        return serie_compacta(datas, valores, dataset=self.dataset).dropna(subset=['precip']).reset_index(drop=True)
+
+
+def serie_diaria_local(dataset, geojson, start_year, end_year):
+    """Série diária do cubo, ou None se o cubo não cobrir o período, o dataset ou a ROI.
+
+    ROIs fora do domínio (ex.: Fernando de Noronha, ou coordenadas digitadas
+    fora do Brasil) ficam com o Earth Engine.
+    """
+    if dataset not in FONTES or geojson is None:
+        return None
+    if not dentro_do_dominio(*zonal.limites(geojson)):
+        return None
+    cubo = Cubo(dataset)
+    inicio, fim = date(start_year, 1, 1), min(date(end_year, 12, 31), date.today())
+    if not cubo.cobre(inicio, fim):
+        return None
+    return cubo.serie_regiao(geojson, inicio, fim)
+
+
+# ---------- Ingestão ----------
+def _dias(inicio, fim):
+    return [inicio + timedelta(days=i) for i in range((fim - inicio).days + 1)]
+
+
+def blocos_do_ee(dataset, inicio, fim):
+    """Gera (primeiro_dia, grades) baixando totais diários via ee.data.computePixels."""
+    fonte = FONTES[dataset]
+    grade = Grade(fonte['resolucao'])
+    colecao = ee.ImageCollection(fonte['id']).select(fonte['band'])
+    dias_por_bloco = max(BYTES_POR_REQUISICAO // (grade.n_lat * grade.n_lon * 4), 1)
+    dias = _dias(inicio, fim)
+    for k in range(0, len(dias), dias_por_bloco):
+        bloco = dias[k:k + dias_por_bloco]
+        nomes = [d.strftime('d%Y%m%d') for d in bloco]
+        imagem = ee.Image.cat([
+            colecao.filterDate(str(d), str(d + timedelta(days=1))).sum().multiply(fonte['multiplier'])
+            for d in bloco
+        ]).rename(nomes)
+        pixels = ee.data.computePixels({
+            'expression': imagem, 'fileFormat': 'NUMPY_NDARRAY', 'grid': grade.grid_ee(),
+        })
+        yield bloco[0], np.stack([pixels[nome] for nome in nomes]).astype(np.float32)
+
+
+def blocos_de_arquivos(pasta, inicio, fim):
+    """Gera (dia, grade) a partir de arquivos exportados `AAAA-MM-DD.npy` na grade do cubo."""
+    for dia in _dias(inicio, fim):
+        arquivo = Path(pasta) / f"{dia.isoformat()}.npy"
+        if arquivo.exists():
+            yield dia, np.load(arquivo).astype(np.float32)[np.newaxis]
+
+
+def ingerir(dataset, inicio, fim, blocos=None, diretorio=DIRETORIO_CUBO):
+    """Grava no cubo os blocos gerados pela fonte (padrão: Earth Engine). Retorna dias gravados."""
+    cubo = Cubo(dataset, diretorio)
+    cubo.caminho.mkdir(parents=True, exist_ok=True)
+    gravados = 0
+    for primeiro_dia, grades in (blocos if blocos is not None else blocos_do_ee(dataset, inicio, fim)):
+        if grades.shape[1:] != cubo.grade.forma:
+            raise ValueError(f"Grade {grades.shape[1:]} diferente da grade do cubo {cubo.grade.forma}")
+        cubo.gravar(primeiro_dia, grades)
+        gravados += grades.shape[0]
+        print(f"{dataset}: {primeiro_dia} +{grades.shape[0]} dias gravados")
+    return gravados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestão do cubo local de precipitação diária.")
+    parser.add_argument('--dataset', choices=list(FONTES), required=True)
+    parser.add_argument('--inicio', type=date.fromisoformat, required=True)
+    parser.add_argument('--fim', type=date.fromisoformat, required=True)
+    parser.add_argument('--arquivos', help="pasta com arquivos AAAA-MM-DD.npy exportados (em vez do EE)")
+    args = parser.parse_args()
+
+    if args.arquivos:
+        blocos = blocos_de_arquivos(args.arquivos, args.inicio, args.fim)
+    else:
+        from aquagee.gee import inicializar_fora_do_streamlit
+        inicializar_fora_do_streamlit()
+        blocos = None
+    ingerir(args.dataset, args.inicio, args.fim, blocos)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+"""Domínio geográfico comum aos mapas, ao cubo local e ao buffer recente.
+
+Módulo sem dependências pesadas: as páginas que só precisam dos limites (ex.:
+as miniaturas da página Comparações) não carregam o Zarr nem o SciPy do cubo.
+"""
+
+# Domínio dos mapas (graus): retângulo envolvente do Brasil continental
+DOMINIO = {'lon_min': -75.0, 'lon_max': -33.0, 'lat_min': -34.0, 'lat_max': 6.0}
+
+
+def dentro_do_dominio(lon_min, lat_min, lon_max, lat_max):
+    """True se o retângulo está inteiro no domínio."""
+    return (DOMINIO['lon_min'] <= lon_min and lon_max <= DOMINIO['lon_max']
+            and DOMINIO['lat_min'] <= lat_min and lat_max <= DOMINIO['lat_max'])
@@ -0,0 +1,78 @@
+"""Caminho assíncrono para as computações do Google Earth Engine.
+
+Cada `getInfo()` é uma chamada REST bloqueante (computeValue/computeFeatures).
+Aqui as chamadas são despachadas para um pool limitado de threads e aguardadas
+em conjunto com `asyncio.gather`, de modo que várias computações independentes
+de uma página levem aproximadamente o tempo da chamada mais lenta.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+except ImportError:  # fora do Streamlit (scripts e linha de comando)
+    add_script_run_ctx = None
+    get_script_run_ctx = None
+
+# Número máximo de requisições simultâneas ao Earth Engine por processo
+MAX_CONCORRENCIA = int(os.environ.get('AQUAGEE_EE_CONCORRENCIA', 8))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCORRENCIA, thread_name_prefix='ee')
+
+
+def _com_contexto(ctx, func, *args, **kwargs):
+    """Executa `func` numa thread do pool, repassando o contexto do script Streamlit.
+
+    Sem o contexto, chamadas como `st.warning` feitas dentro das funções de
+    extração seriam descartadas pelo Streamlit. As threads do pool são
+    reaproveitadas, então o contexto anterior da thread é restaurado ao final
+    (senão a próxima tarefa, de outra sessão ou de um script, herdaria este).
+    """
+    if ctx is None:
+        return func(*args, **kwargs)
+    thread = threading.current_thread()
+    anterior = get_script_run_ctx(suppress_warning=True)
+    add_script_run_ctx(thread, ctx)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if anterior is not None:
+            add_script_run_ctx(thread, anterior)
+        else:
+            delattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME)
+
+
+async def executar(func, *args, **kwargs):
+    """Executa uma função bloqueante (que faz `getInfo`) no pool de threads do EE."""
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, functools.partial(_com_contexto, ctx, func, *args, **kwargs)
+    )
+
+
+def submeter(func, *args, **kwargs):
+    """Agenda `func` no pool do EE sem esperar; devolve um `concurrent.futures.Future`.
+
+    Usado para trabalho adiantado (pré-busca) ou em segundo plano, cujo resultado
+    é consultado depois, em outro rerun ou iteração.
+    """
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+    return _executor.submit(_com_contexto, ctx, func, *args, **kwargs)
+
+
+def rodar(tarefas, return_exceptions=False):
+    """Aguarda um dicionário {nome: corrotina} em conjunto e devolve {nome: resultado}.
+
+    Deve ser chamada a partir de código síncrono (script da página), que não
+    possui event loop próprio.
+    """
+    async def _todas():
+        resultados = await asyncio.gather(*tarefas.values(), return_exceptions=return_exceptions)
+        return dict(zip(tarefas.keys(), resultados))
+
+    return asyncio.run(_todas())
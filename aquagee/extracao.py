@@ -0,0 +1,267 @@
+"""Extração das séries de precipitação de uma ROI no Earth Engine.
+
+Usada pela página Séries Temporais e pelos trabalhadores de tarefas em segundo
+plano (`aquagee.tarefas`) e pelo aquecimento de cache (`aquagee.aquecimento`):
+as funções não escrevem na página.
+"""
+from datetime import datetime
+
+import ee
+
+from aquagee import ee_async, reducao_tiles, redutores
+from aquagee.cache import cache_compartilhado
+from aquagee.series import ESQUEMA_DATA, ESQUEMA_MES, colunas_para_df, fc_para_colunas, normalizar_serie
+from aquagee.tabela_zonal import ADM2_ESTADO
+
+# Datasets da página Séries Temporais ('id2' é a coleção usada nas séries agregadas)
+DATASETS = {
+    'CHIRPS': {
+        'id': 'UCSB-CHG/CHIRPS/DAILY',
+        'id2': 'UCSB-CHG/CHIRPS/PENTAD',
+        'band': 'precipitation',
+        'multiplier': 1, # Unidade já é mm/dia
+        'scale': 5566,
+        'start_year': 1981,
+        'name': 'CHIRPS',
+    },
+    'IMERG': {
+        'id': 'NASA/GPM_L3/IMERG_V07',
+        'id2': 'NASA/GPM_L3/IMERG_V07',
+        'band': 'precipitation',
+        'multiplier': 0.5,
+        'scale': 11132,
+        'start_year': 2000,
+        'name': 'IMERG',
+    },
+    'GSMaP': {
+        'id': 'JAXA/GPM_L3/GSMaP/v8/operational',
+        'id2': 'JAXA/GPM_L3/GSMaP/v8/operational',
+        'band': 'hourlyPrecipRate',
+        'multiplier': 1,
+        'scale': 11132,
+        'start_year': 2000,
+        'name': 'GSMaP',
+    },
+}
+
+
+# ---------- Região e coleções ----------
+def roi_divisao(adm1, adm2=ADM2_ESTADO):
+    """Geometria de um estado (adm2 vazio) ou município do GAUL."""
+    if adm2 == ADM2_ESTADO:
+        fc = ee.FeatureCollection('FAO/GAUL/2015/level1').filter(ee.Filter.eq('ADM0_NAME', 'Brazil'))
+        return fc.filter(ee.Filter.eq('ADM1_NAME', adm1)).geometry()
+    fc = ee.FeatureCollection('FAO/GAUL/2015/level2').filter(ee.Filter.eq('ADM0_NAME', 'Brazil'))
+    return fc.filter(ee.Filter.And(ee.Filter.eq('ADM1_NAME', adm1), ee.Filter.eq('ADM2_NAME', adm2))).geometry()
+
+
+def argumentos_series(info, roi, start_year, end_year):
+    """Primeiros argumentos de `calcular_series_ee` (coleções filtradas, ROI, período e banda).
+
+    Página e aquecimento de cache montam os argumentos por aqui, de modo que as
+    mesmas consultas caiam na mesma chave do cache compartilhado.
+    """
+    date_filter = ee.Filter.date(f"{start_year}-01-01", f"{end_year}-12-31")
+    precip_collection_agg = ee.ImageCollection(info['id2']).select(info['band']).filter(date_filter).filterBounds(roi)
+    precip_collection_daily = ee.ImageCollection(info['id']).select(info['band']).filter(date_filter).filterBounds(roi)
+    return precip_collection_agg, precip_collection_daily, roi, start_year, end_year, info['band']
+
+
+# ---------- Helpers robustos ----------
+def _fc_to_df(fc, colunas, dtypes=None):
+    """Converte um ee.FeatureCollection (já calculado) em pandas.DataFrame compacto a partir das colunas pedidas."""
+    return colunas_para_df(fc_para_colunas(fc, colunas, dtypes))
+
+
+def _tamanho_colecao(collection):
+    """Retorna o número de imagens da coleção ou None se não for possível obtê-lo."""
+    try:
+        return collection.size().getInfo()
+    except Exception:
+        return None
+
+
+# ---------- Função diária (robusta e sem getRegion) ----------
+def get_daily_precip(collection, roi, start_year, end_year, band_name, scale, multiplier, estatisticas=redutores.PADRAO, tiles=None):
+    """
+    Calcula série diária reduzindo cada imagem sobre a ROI, com todas as
+    estatísticas pedidas num único redutor combinado (ou por tiles, se `tiles`
+    vier de `reducao_tiles.planejar`).
+    Faz verificação do número de imagens e aborta (lança RuntimeError)
+    se a coleção exceder o limite seguro de getInfo (5000).
+    """
+    start = ee.Date.fromYMD(start_year, 1, 1)
+    end = ee.Date.fromYMD(end_year, 12, 31).advance(1, 'day')
+    daily_coll = collection.filterDate(start, end).filterBounds(roi)
+
+    # Verifica tamanho da coleção para evitar getInfo massivo
+    n_images = daily_coll.size().getInfo()
+    if n_images > 5000:
+        raise RuntimeError(f"too_many_images: coleção diária tem {n_images} imagens (>5000)")
+
+    if tiles:
+        imagens = daily_coll.map(lambda img: img.select([band_name]).multiply(multiplier).set(
+            'date', ee.Date(img.get('system:time_start')).format('YYYY-MM-dd')))
+        colunas = reducao_tiles.serie_em_tiles(imagens, roi, tiles, scale, estatisticas)
+        return normalizar_serie(colunas, ESQUEMA_DATA, extras=redutores.colunas_extras(estatisticas))
+
+    def _per_image(img):
+        img_band = img.select([band_name]).multiply(multiplier)
+        date_str = ee.Date(img.get('system:time_start')).format('YYYY-MM-dd')
+        valores = redutores.reduzir_regiao(img_band, roi, scale, estatisticas)
+        return ee.Feature(None, valores.set('date', date_str))
+
+    daily_fc = daily_coll.map(_per_image)
+    colunas = fc_para_colunas(daily_fc, ['date'] + redutores.colunas(estatisticas))
+    return normalizar_serie(colunas, ESQUEMA_DATA, extras=redutores.colunas_extras(estatisticas))
+
+
+# ---------- Série mensal (YYYY-MM) ----------
+def get_monthly_total_series(collection, roi, start_year, end_year, band_name, scale, multiplier, estatisticas=redutores.PADRAO, tiles=None):
+    import pandas as pd
+    years = list(range(start_year, end_year + 1))
+    features = []
+    images = []
+    for y in years:
+        for m in range(1, 13):
+            start = ee.Date.fromYMD(y, m, 1)
+            end = start.advance(1, 'month')
+            img_sum = collection.filterDate(start, end).sum().multiply(multiplier).select([band_name])
+            if tiles:
+                images.append(img_sum.set('date', start.format('YYYY-MM')))
+                continue
+            valores = redutores.reduzir_regiao(img_sum, roi, scale, estatisticas)
+            features.append(ee.Feature(None, valores.set('date', start.format('YYYY-MM'))))
+    if tiles:
+        colunas = reducao_tiles.serie_em_tiles(ee.ImageCollection(images), roi, tiles, scale, estatisticas)
+    else:
+        monthly_fc = ee.FeatureCollection(features)
+        colunas = fc_para_colunas(monthly_fc, ['date'] + redutores.colunas(estatisticas))
+    df = normalizar_serie(colunas, ESQUEMA_MES, extras=redutores.colunas_extras(estatisticas))
+    if not df.empty:
+        start_pd = pd.to_datetime(f"{start_year}-01-01")
+        end_pd = pd.to_datetime(f"{end_year}-12-31")
+        df = df[(df['date'] >= start_pd) & (df['date'] <= end_pd)].reset_index(drop=True)
+    return df
+
+
+# ---------- Climatologia mensal (média do mês ao longo dos anos) ----------
+def get_monthly_climatology(collection, roi, start_year, end_year, band_name, scale, multiplier, tiles=None):
+    import pandas as pd
+    months = range(1, 13)
+    features = []
+    images = []
+
+    for m in months:
+        # filtra só o mês m em todos os anos
+        monthly_coll = collection.filter(ee.Filter.calendarRange(m, m, 'month'))
+
+        # acumula precipitação dentro de cada mês/ano
+        def month_sum(img):
+            year = img.date().get('year')
+            month_coll = collection.filterDate(
+                ee.Date.fromYMD(year, m, 1),
+                ee.Date.fromYMD(year, m, 1).advance(1, 'month')
+            )
+            return month_coll.sum().multiply(multiplier).set({'year': year, 'month': m})
+
+        monthly_totals = monthly_coll.map(month_sum)
+
+        # média interanual
+        month_mean = monthly_totals.mean()
+        if tiles:
+            images.append(month_mean.select([band_name]).set('month', m))
+            continue
+
+        mean_val = month_mean.reduceRegion(
+            reducer=ee.Reducer.mean(),
+            geometry=roi,
+            scale=scale,
+            maxPixels=1e13
+        ).get(band_name)
+
+        features.append(ee.Feature(None, {'month': m, 'precip': mean_val}))
+
+    if tiles:
+        colunas = reducao_tiles.serie_em_tiles(ee.ImageCollection(images), roi, tiles, scale, chave='month')
+        df = colunas_para_df({'month': colunas['month'].astype('int8'), 'precip': colunas['precip'].astype('float32')})
+    else:
+        monthly_fc = ee.FeatureCollection(features)
+        df = _fc_to_df(monthly_fc, ['month', 'precip'], {'month': 'int8', 'precip': 'float32'})
+    nomes_meses = [datetime(2023, m, 1).strftime('%b') for m in months]
+    df['month_name'] = pd.Categorical.from_codes(df['month'].to_numpy() - 1, categories=nomes_meses)
+    return df.sort_values('month').reset_index(drop=True)
+
+
+# ---------- Precipitação anual ----------
+def get_annual_precipitation(collection, roi, start_year, end_year, band_name, scale, multiplier, tiles=None):
+    features = []
+    images = []
+    for y in range(start_year, end_year + 1):
+        start = ee.Date.fromYMD(y, 1, 1)
+        end = start.advance(1, 'year')
+        total = collection.filterDate(start, end).sum().multiply(multiplier)
+        if tiles:
+            images.append(total.select([band_name]).set('year', y))
+            continue
+        mean_val = total.reduceRegion(reducer=ee.Reducer.mean(), geometry=roi, scale=scale, maxPixels=1e13).get(band_name)
+        features.append(ee.Feature(None, {'year': y, 'precip': mean_val}))
+    if tiles:
+        colunas = reducao_tiles.serie_em_tiles(ee.ImageCollection(images), roi, tiles, scale, chave='year')
+        df = colunas_para_df({'year': colunas['year'].astype('int16'), 'precip': colunas['precip'].astype('float32')})
+    else:
+        annual_fc = ee.FeatureCollection(features)
+        df = _fc_to_df(annual_fc, ['year', 'precip'], {'year': 'int16', 'precip': 'float32'})
+    return df.sort_values('year').reset_index(drop=True)
+
+
+# ---------- Todas as séries de uma ROI pelo EE ----------
+@cache_compartilhado('series', ttl=24 * 3600)
+def calcular_series_ee(collection_agg, collection_daily, roi, start_year, end_year, band_name, scale, multiplier,
+                       estatisticas=redutores.PADRAO, tiles=None):
+    """Séries anual, climatológica, mensal e diária de uma ROI numa dada escala.
+
+    Não escreve na página (pode rodar em segundo plano, no refinamento da prévia):
+    o aviso sobre a série diária, se houver, volta em 'aviso'.
+    """
+    import pandas as pd
+    # --- Computações independentes aguardadas em conjunto (latência ≈ chamada mais lenta) ---
+    args_agg = (collection_agg, roi, start_year, end_year, band_name, scale, multiplier)
+    args_daily = (collection_daily, roi, start_year, end_year, band_name, scale, multiplier)
+    resultados = ee_async.rodar({
+        'anual': ee_async.executar(get_annual_precipitation, *args_agg, tiles=tiles),
+        'climatologia': ee_async.executar(get_monthly_climatology, *args_agg, tiles=tiles),
+        'mensal': ee_async.executar(get_monthly_total_series, *args_agg, estatisticas, tiles),
+        'n_images': ee_async.executar(_tamanho_colecao, collection_daily),
+        'diaria': ee_async.executar(get_daily_precip, *args_daily, estatisticas, tiles),
+    }, return_exceptions=True)
+    for chave in ('anual', 'climatologia', 'mensal'):
+        if isinstance(resultados[chave], Exception):
+            raise resultados[chave]
+
+    # --- Verifica tamanho da coleção diária antes de usar a série ---
+    # Se não for possível obter tamanho, desativa diária por segurança
+    n_images = resultados['n_images']
+    df_daily = pd.DataFrame(columns=['date', 'precip'])
+    aviso = None
+    if n_images is not None and n_images <= 5000:
+        # coleção segura para série diária
+        resultado_diario = resultados['diaria']
+        if isinstance(resultado_diario, RuntimeError) and (
+            'too_many_images' in str(resultado_diario) or 'coleção diária' in str(resultado_diario)
+        ):
+            # fallback: se a função detectar coleção grande internamente
+            aviso = f"Série diária desativada: {resultado_diario}. Usando série mensal como alternativa."
+            df_daily = get_monthly_total_series(*args_daily, estatisticas, tiles)
+        elif isinstance(resultado_diario, Exception):
+            raise resultado_diario
+        else:
+            df_daily = resultado_diario
+    return {
+        'df_annual': resultados['anual'],
+        'df_monthly_climatology': resultados['climatologia'],
+        'df_monthly_series': resultados['mensal'],
+        'df_daily': df_daily,
+        'n_images': n_images,
+        'aviso': aviso,
+    }
@@ -0,0 +1,48 @@
+"""Inicialização do Google Earth Engine compartilhada pelas páginas."""
+import json
+import os
+import tempfile
+
+import ee
+import streamlit as st
+
+from aquagee.conexao import obter_transporte
+
+
+def inicializar_com_conta_de_servico(service_account_info):
+    """Inicializa o Earth Engine a partir do dicionário da conta de serviço."""
+    with tempfile.NamedTemporaryFile(mode='w+', suffix='.json', delete=False) as f:
+        json.dump(service_account_info, f)
+        f.flush()
+        credentials = ee.ServiceAccountCredentials(service_account_info["client_email"], f.name)
+        # Use o project_id das credenciais para inicializar
+        ee.Initialize(credentials, project=credentials.project_id, http_transport=obter_transporte())
+
+
+# Este bloco é executado apenas uma vez por processo e fica em cache.
+# Sem spinner: as páginas chamam antes de st.set_page_config, que precisa ser o
+# primeiro comando a escrever na página.
+@st.cache_resource(show_spinner=False)
+def inicializar_gee():
+    try:
+        inicializar_com_conta_de_servico(dict(st.secrets["earthengine"]))
+        print("GEE Inicializado com sucesso.")
+    except Exception as e:
+        st.error("Ocorreu um erro ao inicializar o Google Earth Engine. Verifique as credenciais em st.secrets.")
+        st.error(f"Detalhes do erro: {e}")
+        st.stop()
+
+
+def inicializar_fora_do_streamlit():
+    """Inicialização para scripts de linha de comando (ingestão, tarefas, aquecimento).
+
+    Usa o JSON indicado em AQUAGEE_CREDENCIAIS ou, na falta dele, o mesmo
+    `.streamlit/secrets.toml` lido pelas páginas.
+    """
+    caminho = os.environ.get('AQUAGEE_CREDENCIAIS')
+    if caminho:
+        with open(caminho) as f:
+            service_account_info = json.load(f)
+    else:
+        service_account_info = dict(st.secrets["earthengine"])
+    inicializar_com_conta_de_servico(service_account_info)
@@ -0,0 +1,119 @@
+"""Preparação das séries para os gráficos (redução do volume enviado ao navegador)."""
+import time
+
+import numpy as np
+import streamlit as st
+
+# Largura típica do gráfico em pixels: mais pontos que isso não aparecem na tela
+LARGURA_PIXELS = 1200
+
+# Acima deste número de barras o SVG fica lento; passa-se a desenhar com WebGL
+LIMIAR_WEBGL = 1000
+
+
+def _baldes(n, n_baldes):
+    """Índice do balde de cada uma das n amostras (baldes de tamanho quase igual)."""
+    return (np.arange(n) * n_baldes) // n
+
+
+def indices_minmax(valores, n_baldes=LARGURA_PIXELS // 2):
+    """Índices do mínimo e do máximo de cada balde, em ordem crescente.
+
+    Mantém os dias extremos de chuva: o máximo de cada intervalo sempre é enviado.
+    """
+    valores = np.asarray(valores)
+    n = len(valores)
+    if n <= 2 * n_baldes:
+        return np.arange(n)
+    balde = _baldes(n, n_baldes)
+    # NaN iria para o fim de cada balde no lexsort; como -inf, vai para o início,
+    # e o mínimo é o primeiro valor depois dos NaN do balde
+    nulos = np.isnan(valores)
+    ordem = np.lexsort((np.where(nulos, -np.inf, valores), balde))
+    fronteiras = np.flatnonzero(np.diff(balde[ordem])) + 1
+    ultimos = np.concatenate((fronteiras - 1, [n - 1]))
+    primeiros = np.concatenate(([0], fronteiras))
+    primeiros = np.minimum(primeiros + np.bincount(balde, weights=nulos, minlength=n_baldes).astype(np.int64), ultimos)
+    return np.unique(np.concatenate((ordem[primeiros], ordem[ultimos])))
+
+
+def indices_lttb(x, y, n_pontos=LARGURA_PIXELS):
+    """Índices escolhidos pelo Largest-Triangle-Three-Buckets (preserva a forma da linha)."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    n = len(y)
+    if n <= n_pontos or n_pontos < 3:
+        return np.arange(n)
+
+    limites = np.linspace(1, n - 1, n_pontos - 1).astype(np.int64)
+    escolhidos = np.empty(n_pontos, dtype=np.int64)
+    escolhidos[0] = 0
+    escolhidos[-1] = n - 1
+    anterior = 0
+    for i in range(n_pontos - 2):
+        ini, fim = limites[i], limites[i + 1]
+        prox_ini, prox_fim = limites[i + 1], limites[i + 2] if i + 2 < len(limites) else n
+        media_x = x[prox_ini:prox_fim].mean()
+        media_y = y[prox_ini:prox_fim].mean()
+        area = np.abs(
+            (x[anterior] - media_x) * (y[ini:fim] - y[anterior])
+            - (x[anterior] - x[ini:fim]) * (media_y - y[anterior])
+        )
+        anterior = ini + int(np.argmax(area))
+        escolhidos[i + 1] = anterior
+    return escolhidos
+
+
+def reduzir_df(df, coluna_x='date', coluna_y='precip', metodo='minmax', n_pontos=LARGURA_PIXELS):
+    """Reduz o DataFrame a aproximadamente `n_pontos` linhas para exibição.
+
+    metodo='minmax' é usado em barras de chuva (guarda extremos de cada intervalo);
+    metodo='lttb' é usado em linhas (guarda o formato visual da série).
+    """
+    if len(df) <= n_pontos:
+        return df
+    if metodo == 'lttb':
+        x = df[coluna_x].to_numpy()
+        if np.issubdtype(x.dtype, np.datetime64):
+            x = x.astype('datetime64[s]').astype(np.int64)
+        indices = indices_lttb(x, df[coluna_y].to_numpy(), n_pontos)
+    else:
+        indices = indices_minmax(df[coluna_y].to_numpy(dtype=np.float64), n_pontos // 2)
+    return df.iloc[indices]
+
+
+def figura_barras(df, x, y, cor, labels, title, limiar_webgl=LIMIAR_WEBGL):
+    """Gráfico de barras de precipitação escolhendo o renderizador pelo tamanho da série.
+
+    Até `limiar_webgl` pontos usa `px.bar` (SVG); acima disso usa `go.Scattergl`
+    com uma haste vertical do zero ao valor de cada dia (barra de erro sem
+    tampa), desenhado pela GPU. As hastes só cobrem os dias presentes: numa
+    série reduzida por `indices_minmax` os dias omitidos ficam vazios, como no
+    `px.bar`, em vez de herdarem o valor do dia extremo vizinho.
+    Retorna (figura, nome do renderizador).
+    """
+    import plotly.express as px
+    import plotly.graph_objects as go
+    if len(df) <= limiar_webgl:
+        fig = px.bar(df, x=x, y=y, labels=labels, title=title, color_discrete_sequence=[cor])
+        return fig, 'SVG'
+    valores = df[y].to_numpy(dtype=np.float64)
+    fig = go.Figure(go.Scattergl(
+        x=df[x], y=valores, mode='markers', marker=dict(color=cor, size=2),
+        error_y=dict(
+            type='data', symmetric=False, array=np.zeros_like(valores), arrayminus=valores,
+            color=cor, thickness=1, width=0,
+        ),
+        name=labels.get(y, y),
+        hovertemplate='%{x|%d/%m/%Y}<br>%{y:.1f} mm<extra></extra>',
+    ))
+    fig.update_layout(title=title)
+    return fig, 'WebGL'
+
+
+def exibir_cronometrado(fig, renderizador, **kwargs):
+    """Envia a figura ao Streamlit e informa o renderizador e o tempo de serialização/envio."""
+    t0 = time.perf_counter()
+    st.plotly_chart(fig, **kwargs)
+    duracao = (time.perf_counter() - t0) * 1000
+    st.caption(f"Renderizador: {renderizador} · {len(fig.data[0].x)} pontos · {duracao:.0f} ms para montar e enviar o gráfico")
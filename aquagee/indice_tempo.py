@@ -0,0 +1,141 @@
+"""Índice local dos timestamps (`system:time_start`) das coleções sub-diárias.
+
+Para cada coleção, guarda um array int64 ordenado por mês. Meses fechados
+(terminados há mais de `LATENCIA_DIAS`) são buscados uma vez e gravados em
+disco; o mês corrente é completado de forma incremental, pedindo ao EE só os
+timestamps posteriores ao último conhecido. As horas de um dia saem de uma
+busca binária (`np.searchsorted`), sem chamadas ao EE.
+
+A cobertura mensal (ano -> meses com dado) de cada coleção fica em
+`cobertura.json`, derivada da primeira imagem e da última data disponível.
+"""
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import ee
+import numpy as np
+
+DIRETORIO_INDICE = Path(os.environ.get('AQUAGEE_INDICE_TEMPO', 'dados/indice_tempo'))
+
+# Dias após o fim do mês em que ainda podem chegar imagens atrasadas
+LATENCIA_DIAS = 5
+# Intervalo mínimo (s) entre consultas incrementais do mês corrente
+INTERVALO_ATUALIZACAO = 600
+
+MS_DIA = 24 * 60 * 60 * 1000
+
+_indices = {}
+_trava_indices = threading.Lock()
+
+
+def _ms(dia):
+    return int(datetime(dia.year, dia.month, dia.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _proximo_mes(ano, mes):
+    return (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+
+
+class IndiceTempo:
+    """Timestamps de uma coleção do EE, carregados por mês."""
+
+    def __init__(self, colecao_id, diretorio=DIRETORIO_INDICE):
+        self.colecao_id = colecao_id
+        self.caminho = Path(diretorio) / colecao_id.replace('/', '_')
+        self._meses = {}       # (ano, mes) -> array int64 ordenado
+        self._consultado = {}  # (ano, mes) -> instante (s) da última consulta do mês aberto
+        self._finalizados = set()  # meses fechados já completos (busca final feita ou lidos do disco)
+        self._trava = threading.Lock()
+
+    def _buscar(self, inicio_ms, fim_ms):
+        colecao = ee.ImageCollection(self.colecao_id).filterDate(inicio_ms, fim_ms)
+        return np.unique(np.asarray(colecao.aggregate_array('system:time_start').getInfo() or [], dtype=np.int64))
+
+    def _mes(self, ano, mes):
+        """Array do mês, buscando no disco/EE o que faltar."""
+        chave = (ano, mes)
+        fechado = date(*_proximo_mes(ano, mes), 1) + timedelta(days=LATENCIA_DIAS) <= date.today()
+        arquivo = self.caminho / f"{ano:04d}-{mes:02d}.npy"
+        with self._trava:
+            if chave in self._finalizados:
+                return self._meses[chave]
+            if chave in self._meses and not fechado and time.time() - self._consultado[chave] < INTERVALO_ATUALIZACAO:
+                return self._meses[chave]
+            if chave not in self._meses and fechado and arquivo.exists():
+                self._meses[chave] = np.load(arquivo)
+                self._finalizados.add(chave)
+                return self._meses[chave]
+
+            # Mês aberto (ou que acabou de fechar): completa a partir do último timestamp conhecido
+
+            inicio, fim = _ms(date(ano, mes, 1)), _ms(date(*_proximo_mes(ano, mes), 1))
+            conhecidos = self._meses.get(chave, np.empty(0, dtype=np.int64))
+            desde = int(conhecidos[-1]) + 1 if len(conhecidos) else inicio
+            novos = self._buscar(desde, fim) if desde < fim else conhecidos[:0]
+            self._meses[chave] = np.concatenate([conhecidos, novos]) if len(novos) else conhecidos
+            self._consultado[chave] = time.time()
+            if fechado:
+                self.caminho.mkdir(parents=True, exist_ok=True)
+                np.save(arquivo, self._meses[chave])
+                self._finalizados.add(chave)
+            return self._meses[chave]
+
+    def timestamps_do_dia(self, dia):
+        """Timestamps do dia (UTC), do mais recente para o mais antigo."""
+        mes = self._mes(dia.year, dia.month)
+        inicio = _ms(dia)
+        i0, i1 = np.searchsorted(mes, [inicio, inicio + MS_DIA])
+        return mes[i0:i1][::-1]
+
+
+def obter_indice(colecao_id):
+    """Índice compartilhado (um por processo) da coleção."""
+    with _trava_indices:
+        if colecao_id not in _indices:
+            _indices[colecao_id] = IndiceTempo(colecao_id)
+        return _indices[colecao_id]
+
+
+def rotulos_hora(timestamps):
+    """Rótulos "HH:MM" (UTC) dos timestamps."""
+    return [texto[11:16] for texto in np.datetime_as_string(np.asarray(timestamps, dtype='datetime64[ms]'), unit='m')]
+
+
+# ---------- Cobertura mensal ----------
+def _arquivo_cobertura(diretorio=DIRETORIO_INDICE):
+    return Path(diretorio) / 'cobertura.json'
+
+
+def _primeira_data(colecao_id):
+    inicio = ee.ImageCollection(colecao_id).sort('system:time_start').first().get('system:time_start').getInfo()
+    return datetime.fromtimestamp(inicio / 1000, tz=timezone.utc).date()
+
+
+def cobertura_mensal(colecao_id, ultima_data, diretorio=DIRETORIO_INDICE):
+    """{ano: [meses com dado]} da coleção, da primeira imagem até `ultima_data`.
+
+    A primeira data é buscada uma única vez e gravada em `cobertura.json`; a
+    última vem do rastreador de última data da página, então a cobertura cresce
+    sem varrer a coleção.
+    """
+    arquivo = _arquivo_cobertura(diretorio)
+    with _trava_indices:
+        registros = json.loads(arquivo.read_text()) if arquivo.exists() else {}
+        registro = registros.get(colecao_id)
+        if registro is None or date.fromisoformat(registro['ultima']) < ultima_data:
+            primeira = date.fromisoformat(registro['primeira']) if registro else _primeira_data(colecao_id)
+            registros[colecao_id] = {'primeira': primeira.isoformat(), 'ultima': ultima_data.isoformat()}
+            arquivo.parent.mkdir(parents=True, exist_ok=True)
+            arquivo.write_text(json.dumps(registros, indent=2, sort_keys=True))
+        else:
+            primeira = date.fromisoformat(registro['primeira'])
+            ultima_data = date.fromisoformat(registro['ultima'])
+
+    meses = {}
+    for indice_mes in range(primeira.year * 12 + primeira.month - 1, ultima_data.year * 12 + ultima_data.month):
+        meses.setdefault(indice_mes // 12, []).append(indice_mes % 12 + 1)
+    return meses
@@ -0,0 +1,127 @@
+"""Mapa de exemplo da página inicial, pré-calculado como PNG estático.
+
+A página inicial somava o CHIRPS PENTAD de um ano inteiro recortado pelo Brasil
+e montava um mapa do geemap com tiles do EE na primeira visita de cada
+processo. Agora a imagem é gerada uma vez (no deploy, ou ao trocar o ano de
+referência), já em Web Mercator, junto com os limites geográficos e a
+visualização usada:
+
+    dados/estaticos/mapa_inicial.png
+    dados/estaticos/mapa_inicial.json
+
+e a página só sobrepõe o PNG a um mapa base do folium, sem inicializar o Earth
+Engine nem fazer nenhuma chamada a ele. Se o deploy não rodou o comando (o
+diretório `dados/` não é versionado), a primeira visita gera os arquivos, e as
+seguintes, de qualquer processo, já os encontram prontos.
+
+Uso:
+    python -m aquagee.mapa_inicial [--ano 2023] [--largura 1024]
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+DIRETORIO_ESTATICOS = Path(os.environ.get('AQUAGEE_ESTATICOS', 'dados/estaticos'))
+NOME_PNG = 'mapa_inicial.png'
+NOME_METADADOS = 'mapa_inicial.json'
+
+ANO_PADRAO = 2023
+# Largura (px) do PNG; a altura segue a proporção do Brasil em Web Mercator
+LARGURA_PADRAO = 1024
+
+VIS_PARAMS = {'min': 200.0, 'max': 3000.0, 'palette': ['#1621a2', '#03ffff', '#13ff03', '#efff00', '#ffb103', '#ff2300']}
+
+
+# ---------- Geração (linha de comando) ----------
+def _gravar(caminho, dados):
+    """Grava por um arquivo temporário e troca, para a página nunca ler um arquivo pela metade."""
+    temporario = caminho.with_name(caminho.name + '.tmp')
+    temporario.write_bytes(dados)
+    temporario.replace(caminho)
+
+
+def gerar(ano=ANO_PADRAO, largura=LARGURA_PADRAO, diretorio=DIRETORIO_ESTATICOS):
+    """Calcula a precipitação anual do Brasil no EE e grava o PNG e os metadados; devolve os metadados."""
+    import ee
+
+    from aquagee.conexao import TIMEOUT_PADRAO, obter_transporte
+
+    brasil = ee.FeatureCollection('USDOS/LSIB_SIMPLE/2017').filter(ee.Filter.eq('country_na', 'Brazil')).geometry()
+    anual = ee.ImageCollection('UCSB-CHG/CHIRPS/PENTAD') \
+        .filter(ee.Filter.date(f'{ano}-01-01', f'{ano}-12-31')) \
+        .select('precipitation') \
+        .sum().clip(brasil)
+
+    # Limites em lat/lon do retângulo que envolve o Brasil: o PNG cobre exatamente esse retângulo
+    vertices = brasil.bounds(1).coordinates().get(0).getInfo()
+    lons = [lon for lon, _ in vertices]
+    lats = [lat for _, lat in vertices]
+    regiao = ee.Geometry.Rectangle([min(lons), min(lats), max(lons), max(lats)], 'EPSG:4326', False)
+
+    url = anual.getThumbURL({
+        'min': VIS_PARAMS['min'], 'max': VIS_PARAMS['max'], 'palette': VIS_PARAMS['palette'],
+        'region': regiao, 'dimensions': largura, 'crs': 'EPSG:3857', 'format': 'png',
+    })
+    resposta = obter_transporte().sessao.get(url, timeout=TIMEOUT_PADRAO)
+    resposta.raise_for_status()
+
+    metadados = {
+        'ano': ano,
+        'limites': [[min(lats), min(lons)], [max(lats), max(lons)]],
+        'vis_params': VIS_PARAMS,
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+    }
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    _gravar(diretorio / NOME_PNG, resposta.content)
+    _gravar(diretorio / NOME_METADADOS, json.dumps(metadados, indent=2).encode())
+    return metadados
+
+
+# ---------- Leitura (página inicial) ----------
+def versao(diretorio=DIRETORIO_ESTATICOS):
+    """Data de modificação dos metadados (muda a cada geração), ou None se o mapa ainda não foi gerado."""
+    caminho = Path(diretorio) / NOME_METADADOS
+    if not caminho.exists() or not (Path(diretorio) / NOME_PNG).exists():
+        return None
+    return caminho.stat().st_mtime
+
+
+def html_mapa(altura=400, diretorio=DIRETORIO_ESTATICOS):
+    """HTML do mapa folium com o PNG sobreposto e a barra de cores (texto, fácil de guardar em cache)."""
+    import folium
+    from branca.colormap import LinearColormap
+
+    diretorio = Path(diretorio)
+    metadados = json.loads((diretorio / NOME_METADADOS).read_text())
+    vis = metadados['vis_params']
+
+    mapa = folium.Map(location=[-15, -55], zoom_start=3, tiles='CartoDB dark_matter', height=altura)
+    folium.raster_layers.ImageOverlay(
+        image=str(diretorio / NOME_PNG), bounds=metadados['limites'],
+        name=f"Precipitação Anual ({metadados['ano']})",
+    ).add_to(mapa)
+    LinearColormap(
+        vis['palette'], vmin=vis['min'], vmax=vis['max'], caption=f"Precipitação Anual {metadados['ano']} (mm)",
+    ).add_to(mapa)
+    return mapa.get_root().render()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera o mapa estático da página inicial.")
+    parser.add_argument('--ano', type=int, default=ANO_PADRAO, help="ano da precipitação acumulada")
+    parser.add_argument('--largura', type=int, default=LARGURA_PADRAO, help="largura do PNG (px)")
+    parser.add_argument('--diretorio', type=Path, default=DIRETORIO_ESTATICOS)
+    args = parser.parse_args()
+
+    from aquagee.gee import inicializar_fora_do_streamlit
+    inicializar_fora_do_streamlit()
+
+    metadados = gerar(args.ano, args.largura, args.diretorio)
+    print(f"mapa de {metadados['ano']} gravado em {args.diretorio / NOME_PNG} (limites {metadados['limites']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Renderização estática (PNG) de imagens do EE com `getThumbURL`.
+
+Uma miniatura é uma única requisição ao EE mais o download do PNG, bem mais leve
+que um mapa interativo (getMapId + dezenas de tiles + mapa base). Todas cobrem o
+mesmo domínio dos mapas, então podem ser comparadas lado a lado.
+"""
+import ee
+
+from aquagee.conexao import TIMEOUT_PADRAO, obter_transporte
+from aquagee.dominio import DOMINIO
+
+# Largura padrão (px) das miniaturas
+DIMENSOES = 768
+
+
+def regiao_dominio():
+    """Retângulo do domínio dos mapas (Brasil) como geometria do EE."""
+    return ee.Geometry.Rectangle(
+        [DOMINIO['lon_min'], DOMINIO['lat_min'], DOMINIO['lon_max'], DOMINIO['lat_max']], 'EPSG:4326', False
+    )
+
+
+def renderizar_png(imagem, vis_params, dimensoes=DIMENSOES):
+    """PNG (bytes) da imagem de uma banda com `min`, `max` e `palette` de `vis_params`."""
+    url = imagem.getThumbURL({
+        'min': vis_params['min'], 'max': vis_params['max'], 'palette': vis_params['palette'],
+        'region': regiao_dominio(), 'dimensions': dimensoes, 'format': 'png',
+    })
+    resposta = obter_transporte().sessao.get(url, timeout=TIMEOUT_PADRAO)
+    resposta.raise_for_status()
+    return resposta.content
+
+
+def legenda_html(vis_params):
+    """Barra de cores em HTML para acompanhar as miniaturas (que não têm colorbar)."""
+    gradiente = ', '.join(f"#{cor}" for cor in vis_params['palette'])
+    return (f"<div style='height:12px;background:linear-gradient(to right, {gradiente})'></div>"
+            f"<div style='display:flex;justify-content:space-between;font-size:0.8em'>"
+            f"<span>{vis_params['min']}</span><span>{vis_params['max']}</span></div>")
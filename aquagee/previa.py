@@ -0,0 +1,51 @@
+"""Prévia rápida das séries de regiões grandes, com escala adaptativa e erro estimado.
+
+A escala nativa do dataset (5566 m no CHIRPS, 11132 m no IMERG/GSMaP) é fixa, e
+o custo de cada `reduceRegion` cresce com o número de pixels da ROI. No modo
+prévia a escala é multiplicada por um fator inteiro escolhido pela área da ROI
+para que cada redução caiba num orçamento de pixels (e, portanto, de latência).
+O resultado aparece logo, com um erro estimado, e o cálculo na escala nativa
+segue em segundo plano para substituí-lo quando terminar.
+
+O erro é estimado comparando a série anual em duas escalas grosseiras (s e 2s):
+a diferença entre elas é, em geral, maior que a da escala s para a nativa, e
+serve como limite prático.
+"""
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from aquagee import reducao_tiles
+
+# Pixels por redução que a prévia pode usar (orçamento de latência)
+ORCAMENTO_PIXELS = int(os.environ.get('AQUAGEE_ORCAMENTO_PREVIA', 2_000))
+# Refinamentos (na escala nativa) rodando ao mesmo tempo no processo. Pool
+# próprio: o refinamento espera por tarefas do pool de `ee_async`.
+MAX_REFINAMENTOS = 2
+
+_executor = ThreadPoolExecutor(max_workers=MAX_REFINAMENTOS, thread_name_prefix='ee-refino')
+
+
+def fator_escala(escala, geojson=None, roi=None, orcamento=ORCAMENTO_PIXELS, limites=None):
+    """Fator inteiro (>= 1) pelo qual multiplicar a escala nativa para caber no orçamento de pixels."""
+    limites = limites or reducao_tiles.limites_roi(geojson, roi)
+    pixels = reducao_tiles.estimar_pixels(escala, geojson, limites)
+    return max(1, math.ceil(math.sqrt(pixels / orcamento)))
+
+
+def erro_relativo(grossa, mais_grossa):
+    """Erro relativo estimado (0-1) entre duas séries de mesmas linhas: Σ|a - b| / Σ|a|."""
+    a = np.asarray(grossa, dtype=np.float64)
+    b = np.asarray(mais_grossa, dtype=np.float64)
+    validos = ~(np.isnan(a) | np.isnan(b))
+    total = np.abs(a[validos]).sum()
+    if not validos.any() or total == 0:
+        return None
+    return float(np.abs(a[validos] - b[validos]).sum() / total)
+
+
+def refinar(func, *args, **kwargs):
+    """Agenda o cálculo na escala nativa; devolve um `concurrent.futures.Future`."""
+    return _executor.submit(func, *args, **kwargs)
@@ -0,0 +1,205 @@
+"""Redução em tiles para regiões muito grandes (estados inteiros, áreas desenhadas).
+
+Um único `reduceRegion` sobre um estado inteiro na escala nativa, repetido para
+cada imagem da série, pode estourar o tempo limite do EE. Acima de um número
+estimado de pixels, a ROI é recortada numa grade de tiles; cada tile é reduzido
+separadamente (somas parciais), em paralelo e com concorrência limitada, e as
+partes são combinadas localmente de forma exata:
+
+    média = Σ soma(valor · peso) / Σ soma(peso)
+
+onde `peso` é o mesmo peso que o `ee.Reducer.mean()` usaria (máscara x fração do
+pixel dentro da geometria). Um pixel cortado pela borda entre dois tiles entra
+em cada um com a sua fração, de modo que nada é contado em dobro. O máximo
+combina pelo máximo das partes e a fração com chuva pela mesma razão de somas;
+o percentil 95 não é decomponível, e com ele a redução é feita sem tiles.
+"""
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+import numpy as np
+
+from aquagee import redutores, zonal
+from aquagee.cache import cache_compartilhado
+from aquagee.series import fc_para_colunas
+
+# Pixels (na escala do dataset) acima dos quais a ROI é dividida em tiles
+LIMIAR_PIXELS = int(os.environ.get('AQUAGEE_LIMIAR_TILES', 20_000))
+# Pixels por tile (aproximado; tiles na borda da ROI têm menos)
+PIXELS_POR_TILE = 5_000
+# Limite de tiles por ROI (os tiles crescem se a grade passar disso)
+MAX_TILES = 64
+# Pixels por arquivo nos downloads diretos (`getDownloadURL`): em float32, ~32 MB
+# e no máximo ~2800 px de lado, abaixo dos limites do EE (48 MB e 10000 px)
+PIXELS_POR_DOWNLOAD = 8_000_000
+# Tiles reduzidos ao mesmo tempo. Pool próprio: as séries já rodam no pool de
+# `ee_async`, e esperar por tarefas do mesmo pool poderia travá-lo.
+MAX_TILES_SIMULTANEOS = 4
+
+_executor = ThreadPoolExecutor(max_workers=MAX_TILES_SIMULTANEOS, thread_name_prefix='ee-tile')
+
+METROS_POR_GRAU = 111_320
+
+
+# ---------- Planejamento ----------
+@cache_compartilhado('limites_roi')
+def _limites_ee(roi):
+    """Limites de uma ROI do EE (divisões do GAUL): uma chamada por ROI, guardada sem validade."""
+    anel = np.asarray(roi.bounds(1000).coordinates().get(0).getInfo(), dtype=float)
+    return float(anel[:, 0].min()), float(anel[:, 1].min()), float(anel[:, 0].max()), float(anel[:, 1].max())
+
+
+def limites_roi(geojson=None, roi=None):
+    """(lon_min, lat_min, lon_max, lat_max) da ROI: local com o GeoJSON, senão do cache (ou do EE)."""
+    if geojson is not None:
+        return zonal.limites(geojson)
+    return _limites_ee(roi)
+
+
+def _area_retangulo(lon_min, lat_min, lon_max, lat_max):
+    lat_media = math.radians((lat_min + lat_max) / 2)
+    return (lon_max - lon_min) * (lat_max - lat_min) * METROS_POR_GRAU**2 * math.cos(lat_media)
+
+
+def estimar_pixels(escala, geojson=None, limites=None):
+    """Número aproximado de pixels da ROI na escala (m) do dataset.
+
+    Com o GeoJSON, usa a área do polígono; sem ele (divisões do GAUL), a área do
+    retângulo envolvente, o que superestima e só antecipa o uso de tiles.
+    """
+    area = zonal.area_m2(geojson) if geojson is not None else _area_retangulo(*limites)
+    return area / escala**2
+
+
+def _toca_roi(celula, geojson, amostras=8):
+    """Se a célula (lon0, lat0, lon1, lat1) tem algum ponto amostrado ou vértice da ROI."""
+    lon0, lat0, lon1, lat1 = celula
+    lon, lat = np.meshgrid(np.linspace(lon0, lon1, amostras), np.linspace(lat0, lat1, amostras))
+    if zonal.pontos_no_poligono(lon, lat, geojson).any():
+        return True
+    vertices = np.concatenate([anel for poligono in zonal._poligonos(geojson) for anel in poligono])
+    return bool(((vertices[:, 0] >= lon0) & (vertices[:, 0] <= lon1)
+                 & (vertices[:, 1] >= lat0) & (vertices[:, 1] <= lat1)).any())
+
+
+def planejar(escala, geojson=None, roi=None, estatisticas=redutores.PADRAO, limites=None):
+    """Limites (lon0, lat0, lon1, lat1) dos tiles da ROI, ou None se a redução direta basta.
+
+    Informe `geojson` quando a geometria é conhecida localmente; senão, `roi` (ee.Geometry).
+    `limites` (de `limites_roi`) evita recalculá-los quando o chamador já os tem.
+    """
+    if 'p95' in redutores.normalizar(estatisticas):
+        return None
+    limites = limites or limites_roi(geojson, roi)
+    if estimar_pixels(escala, geojson, limites) <= LIMIAR_PIXELS:
+        return None
+
+    celulas = dividir(limites, escala, PIXELS_POR_TILE, MAX_TILES)
+    if geojson is not None:
+        celulas = [c for c in celulas if _toca_roi(c, geojson)]
+    return celulas if len(celulas) > 1 else None
+
+
+def planejar_download(escala, geojson=None, roi=None, limites=None):
+    """Células para baixar o raster da ROI em arquivos abaixo do limite de download direto (ao menos uma)."""
+    limites = limites or limites_roi(geojson, roi)
+    celulas = dividir(limites, escala, PIXELS_POR_DOWNLOAD)
+    if geojson is not None and len(celulas) > 1:
+        celulas = [c for c in celulas if _toca_roi(c, geojson)]
+    return celulas
+
+
+def dividir(limites, escala, pixels_por_celula, max_celulas=None):
+    """Grade de células (lon0, lat0, lon1, lat1) cobrindo os limites, com ~pixels_por_celula pixels cada."""
+    lon_min, lat_min, lon_max, lat_max = limites
+    lado = math.sqrt(pixels_por_celula) * escala / METROS_POR_GRAU  # graus de latitude
+    passo_lat = lado
+    passo_lon = lado / max(math.cos(math.radians((lat_min + lat_max) / 2)), 0.1)
+    nx = max(1, math.ceil((lon_max - lon_min) / passo_lon))
+    ny = max(1, math.ceil((lat_max - lat_min) / passo_lat))
+    if max_celulas is not None and nx * ny > max_celulas:
+        fator = math.sqrt(nx * ny / max_celulas)
+        nx, ny = max(1, math.floor(nx / fator)), max(1, math.floor(ny / fator))
+
+    xs = np.linspace(lon_min, lon_max, nx + 1)
+    ys = np.linspace(lat_min, lat_max, ny + 1)
+    return [(float(xs[i]), float(ys[j]), float(xs[i + 1]), float(ys[j + 1])) for j in range(ny) for i in range(nx)]
+
+
+# ---------- Redução parcial ----------
+def _parciais(estatisticas):
+    """Nomes das somas parciais devolvidas por tile para as estatísticas pedidas."""
+    nomes = ['soma', 'peso']
+    if 'fracao_chuva' in estatisticas:
+        nomes.append('soma_chuva')
+    if 'maximo' in estatisticas:
+        nomes.append('maximo')
+    return nomes
+
+
+def reduzir_parcial(imagem, geometria, escala, estatisticas=redutores.PADRAO):
+    """ee.Dictionary com as somas parciais (ver `_parciais`) de uma imagem de uma banda sobre um tile.
+
+    O `ee.Reducer.sum()` pondera cada pixel como o `mean()`, então a soma de uma
+    banda constante 1 com a mesma máscara é exatamente o denominador da média.
+    """
+    estatisticas = redutores.normalizar(estatisticas)
+    imagem = imagem.rename('precip')
+    bandas = [imagem, imagem.multiply(0).add(1).rename('peso')]
+    if 'fracao_chuva' in estatisticas:
+        bandas.append(imagem.gte(redutores.LIMIAR_CHUVA).rename('chuva'))
+    redutor = ee.Reducer.sum()
+    if 'maximo' in estatisticas:
+        redutor = redutor.combine(ee.Reducer.max(), sharedInputs=True)
+    resultado = ee.Image.cat(bandas).reduceRegion(reducer=redutor, geometry=geometria, scale=escala, maxPixels=1e13)
+
+    def chave(banda, saida='sum'):
+        return banda if 'maximo' not in estatisticas else f"{banda}_{saida}"
+
+    chaves = [chave('precip'), chave('peso')]
+    if 'fracao_chuva' in estatisticas:
+        chaves.append(chave('chuva'))
+    if 'maximo' in estatisticas:
+        chaves.append(chave('precip', 'max'))
+    return ee.Dictionary.fromLists(_parciais(estatisticas), [resultado.get(c) for c in chaves])
+
+
+def _reduzir_tile(imagens, roi, celula, escala, estatisticas, chave):
+    geometria = ee.Geometry.Rectangle(list(celula), 'EPSG:4326', False).intersection(roi, ee.ErrorMargin(1))
+
+    def _por_imagem(img):
+        return ee.Feature(None, reduzir_parcial(img, geometria, escala, estatisticas).set(chave, img.get(chave)))
+
+    return fc_para_colunas(imagens.map(_por_imagem), [chave] + _parciais(estatisticas))
+
+
+def serie_em_tiles(imagens, roi, tiles, escala, estatisticas=redutores.PADRAO, chave='date'):
+    """Colunas (como as de `fc_para_colunas`) da série reduzida por tiles e combinada exatamente.
+
+    `imagens` é uma ee.ImageCollection de imagens de uma banda, cada uma com a
+    propriedade `chave` (data, ano ou mês). Devolve `chave` e as colunas de
+    `redutores.colunas(estatisticas)`.
+    """
+    estatisticas = redutores.normalizar(estatisticas)
+    partes = list(_executor.map(
+        lambda celula: _reduzir_tile(imagens, roi, celula, escala, estatisticas, chave), tiles
+    ))
+
+    chaves, inverso = np.unique(np.concatenate([p[chave] for p in partes]), return_inverse=True)
+
+    def somar(nome):
+        valores = np.concatenate([np.asarray(p[nome], dtype=np.float64) for p in partes])
+        return np.bincount(inverso, weights=valores, minlength=len(chaves))
+
+    peso = somar('peso')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        colunas = {chave: chaves, 'precip': somar('soma') / peso}
+        if 'maximo' in estatisticas:
+            maximo = np.full(len(chaves), -np.inf)
+            np.maximum.at(maximo, inverso, np.concatenate([np.asarray(p['maximo'], dtype=np.float64) for p in partes]))
+            colunas[redutores.COLUNAS['maximo']] = np.where(np.isinf(maximo), np.nan, maximo)
+        if 'fracao_chuva' in estatisticas:
+            colunas[redutores.COLUNAS['fracao_chuva']] = somar('soma_chuva') / peso
+    return colunas
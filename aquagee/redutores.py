@@ -0,0 +1,77 @@
+"""Redutor combinado para as séries de região: várias estatísticas numa só passada.
+
+Média, máximo, percentil 95 e fração da área com chuva são compilados num único
+`ee.Reducer` (`combine` com entradas compartilhadas), avaliado em um só
+`reduceRegion` por imagem. Pedir várias estatísticas custa praticamente o
+mesmo que pedir só a média.
+"""
+import ee
+
+# Acumulado mínimo (mm) para um pixel contar como "com chuva"
+LIMIAR_CHUVA = 1.0
+
+# Estatísticas disponíveis (na ordem de exibição) e a coluna de cada uma na série
+ESTATISTICAS = {
+    'media': 'Média',
+    'maximo': 'Máximo',
+    'p95': 'Percentil 95',
+    'fracao_chuva': f"Fração da área com chuva (≥ {LIMIAR_CHUVA:g} mm)",
+}
+COLUNAS = {'media': 'precip', 'maximo': 'precip_max', 'p95': 'precip_p95', 'fracao_chuva': 'fracao_chuva'}
+
+# A média é sempre calculada: é a coluna 'precip' usada pelos gráficos e séries derivadas
+PADRAO = ('media',)
+
+
+def normalizar(estatisticas):
+    """Tupla ordenada das estatísticas pedidas, sempre incluindo a média."""
+    pedidas = set(estatisticas or ()) | {'media'}
+    return tuple(nome for nome in ESTATISTICAS if nome in pedidas)
+
+
+def colunas(estatisticas):
+    """Colunas da série para as estatísticas pedidas ('precip' primeiro)."""
+    return [COLUNAS[nome] for nome in normalizar(estatisticas)]
+
+
+def colunas_extras(estatisticas):
+    """Colunas além de 'precip'."""
+    return colunas(estatisticas)[1:]
+
+
+def _redutor(saidas):
+    construtores = {
+        'media': ee.Reducer.mean,
+        'maximo': ee.Reducer.max,
+        'p95': lambda: ee.Reducer.percentile([95]),
+    }
+    redutor = None
+    for saida in saidas:
+        parcial = construtores[saida]().setOutputs([saida])
+        redutor = parcial if redutor is None else redutor.combine(parcial, sharedInputs=True)
+    return redutor
+
+
+def reduzir_regiao(imagem, geometria, escala, estatisticas=PADRAO):
+    """ee.Dictionary {coluna: valor} das estatísticas de uma imagem de uma banda, num único reduceRegion.
+
+    A fração com chuva é a média de uma banda indicadora (precip >= LIMIAR_CHUVA)
+    reduzida junto, pelo mesmo redutor.
+    """
+    estatisticas = normalizar(estatisticas)
+    saidas = [nome for nome in estatisticas if nome != 'fracao_chuva']
+    imagem = imagem.rename('precip')
+    if 'fracao_chuva' in estatisticas:
+        imagem = imagem.addBands(imagem.gte(LIMIAR_CHUVA).rename('chuva'))
+    resultado = imagem.reduceRegion(reducer=_redutor(saidas), geometry=geometria, scale=escala, maxPixels=1e13)
+
+    # O EE nomeia a saída pela banda se o redutor tem uma só saída, senão '<banda>_<saída>'
+    def chave(banda, saida):
+        return banda if len(saidas) == 1 else f"{banda}_{saida}"
+
+    chaves = [chave('precip', saida) for saida in saidas]
+    nomes = [COLUNAS[saida] for saida in saidas]
+    if 'fracao_chuva' in estatisticas:
+        chaves.append(chave('chuva', 'media'))
+        nomes.append(COLUNAS['fracao_chuva'])
+    return ee.Dictionary.fromLists(nomes, [resultado.get(c) for c in chaves])
@@ -0,0 +1,166 @@
+"""Transporte e representação das séries de precipitação extraídas do Earth Engine."""
+import ee
+import numpy as np
+# pandas é importado dentro das funções: as páginas carregam este módulo antes de haver qualquer série
+
+
+# ---------- Transporte colunar ----------
+def fc_para_colunas(fc, colunas, dtypes=None):
+    """Extrai colunas de um ee.FeatureCollection como arrays NumPy em uma única chamada.
+
+    Em vez de baixar cada Feature com seu dicionário de propriedades, o servidor
+    agrega cada coluna em uma lista (`reduceColumns` + `toList().repeat`), e a
+    resposta chega como `[[col1...], [col2...]]`. Features com algum valor nulo
+    nas colunas pedidas são descartadas pelo redutor.
+    """
+    dtypes = dtypes or {}
+    listas = fc.reduceColumns(ee.Reducer.toList().repeat(len(colunas)), colunas).get('list').getInfo()
+    return {
+        nome: np.asarray(valores, dtype=dtypes.get(nome))
+        for nome, valores in zip(colunas, listas or [[] for _ in colunas])
+    }
+
+
+def colunas_para_df(colunas):
+    """Monta um DataFrame diretamente a partir do dicionário de arrays (sem dicts por linha)."""
+    import pandas as pd
+    return pd.DataFrame(colunas, copy=False)
+
+
+# ---------- Normalização vetorizada ----------
+# Esquemas conhecidos das colunas de data devolvidas pelos extratores
+ESQUEMA_DATA = 'data'        # coluna 'date' no formato 'YYYY-MM-dd'
+ESQUEMA_MES = 'mes'          # coluna 'date' no formato 'YYYY-MM'
+ESQUEMA_EPOCH = 'epoch_ms'   # coluna 'time' em milissegundos desde 1970 (system:time_start)
+ESQUEMA_ANO_MES = 'ano_mes'  # colunas inteiras 'year' e 'month'
+
+
+def _datas(colunas, esquema):
+    """Converte as colunas de data do esquema em um array datetime64, sem laço em Python."""
+    if esquema == ESQUEMA_DATA:
+        return np.asarray(colunas['date'], dtype='datetime64[D]')
+    if esquema == ESQUEMA_MES:
+        return np.asarray(colunas['date'], dtype='datetime64[M]').astype('datetime64[D]')
+    if esquema == ESQUEMA_EPOCH:
+        # int64 -> datetime64[ms] é apenas uma reinterpretação dos mesmos bytes
+        return np.ascontiguousarray(colunas['time'], dtype=np.int64).view('datetime64[ms]')
+    if esquema == ESQUEMA_ANO_MES:
+        ano = np.asarray(colunas['year'], dtype=np.int64)
+        mes = np.asarray(colunas['month'], dtype=np.int64)
+        return ((ano - 1970) * 12 + (mes - 1)).astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"Esquema de série desconhecido: {esquema}")
+
+
+def normalizar_serie(colunas, esquema, coluna_valor='precip', extras=()):
+    """Garante colunas 'date' (datetime64) e 'precip' (float32) em uma única passada.
+
+    `colunas` é o dicionário de arrays devolvido por `fc_para_colunas`. Linhas sem
+    valor são descartadas e a ordenação só é feita se as datas não vierem em ordem.
+    As colunas em `extras` (outras estatísticas) seguem as mesmas linhas, em float32.
+    """
+    import pandas as pd
+    datas = _datas(colunas, esquema)
+    valores = {'precip': np.asarray(colunas[coluna_valor], dtype=np.float32)}
+    for nome in extras:
+        valores[nome] = np.asarray(colunas[nome], dtype=np.float32)
+
+    validos = ~np.isnan(valores['precip'])
+    if not validos.all():
+        datas = datas[validos]
+        valores = {nome: v[validos] for nome, v in valores.items()}
+
+    if datas.size > 1 and (datas[1:] < datas[:-1]).any():
+        ordem = np.argsort(datas, kind='stable')
+        datas = datas[ordem]
+        valores = {nome: v[ordem] for nome, v in valores.items()}
+
+    return pd.DataFrame({'date': datas, **valores}, copy=False)
+
+
+# ---------- Representação compacta ----------
+def serie_compacta(datas, valores, dataset=None, extras=None):
+    """Cria o DataFrame compacto de uma série a partir de arrays NumPy.
+
+    Colunas: 'date' (datetime64), 'precip' (float32), as colunas de `extras`
+    (float32) e, se informado, 'dataset' (Categorical com uma única categoria,
+    1 byte por linha).
+    """
+    import pandas as pd
+    datas = np.asarray(datas)
+    if not np.issubdtype(datas.dtype, np.datetime64):
+        datas = datas.astype('datetime64[D]')
+    colunas = {'date': datas, 'precip': np.asarray(valores, dtype=np.float32)}
+    for nome, valores_extra in (extras or {}).items():
+        colunas[nome] = np.asarray(valores_extra, dtype=np.float32)
+    if dataset is not None:
+        colunas['dataset'] = pd.Categorical.from_codes(
+            np.zeros(len(datas), dtype=np.int8), categories=[dataset]
+        )
+    return pd.DataFrame(colunas, copy=False)
+
+
+def concatenar_series(frames):
+    """Concatena séries compactas mantendo 'dataset' como Categorical (união das categorias)."""
+    import pandas as pd
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return serie_compacta(np.array([], dtype='datetime64[D]'), [], dataset=None)
+    if all('dataset' in f.columns for f in frames):
+        categorias = pd.CategoricalDtype(
+            list(dict.fromkeys(c for f in frames for c in f['dataset'].cat.categories))
+        )
+        frames = [f.astype({'dataset': categorias}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+# ---------- Séries derivadas ----------
+def derivar_de_mensal(df_monthly_series, start_year, end_year):
+    """Calcula os totais anuais e a climatologia a partir da série de totais mensais.
+
+    Retorna (df_annual, df_monthly_climatology) nos mesmos formatos devolvidos
+    pelos extratores do Earth Engine da página Séries Temporais.
+    """
+    import pandas as pd
+    meses = df_monthly_series['date'].to_numpy().astype('datetime64[M]')
+    totais_mensais = df_monthly_series['precip'].to_numpy(dtype=np.float64)
+
+    anos = meses.astype('datetime64[Y]').astype(np.int64) + 1970
+    anos_unicos, inverso_ano = np.unique(anos, return_inverse=True)
+    df_annual = pd.DataFrame({
+        'year': anos_unicos.astype(np.int16),
+        'precip': np.bincount(inverso_ano, weights=totais_mensais).astype(np.float32),
+    }, copy=False)
+    df_annual = df_annual[(df_annual['year'] >= start_year) & (df_annual['year'] <= end_year)].reset_index(drop=True)
+
+    mes_do_ano = (meses.astype(np.int64) % 12).astype(np.int8)
+    soma = np.bincount(mes_do_ano, weights=totais_mensais, minlength=12)
+    contagem = np.bincount(mes_do_ano, minlength=12)
+    presentes = np.flatnonzero(contagem)
+    nomes_meses = [pd.Timestamp(2023, m, 1).strftime('%b') for m in range(1, 13)]
+    df_monthly_climatology = pd.DataFrame({
+        'month': (presentes + 1).astype(np.int8),
+        'precip': (soma[presentes] / contagem[presentes]).astype(np.float32),
+        'month_name': pd.Categorical.from_codes(presentes, categories=nomes_meses),
+    }, copy=False)
+    return df_annual, df_monthly_climatology
+
+
+def totais_mensais(df_daily):
+    """Soma a série diária por mês (datas no primeiro dia do mês)."""
+    import pandas as pd
+    meses = df_daily['date'].to_numpy().astype('datetime64[M]')
+    meses_unicos, inverso = np.unique(meses, return_inverse=True)
+    totais = np.bincount(inverso, weights=df_daily['precip'].to_numpy(dtype=np.float64), minlength=len(meses_unicos))
+    return pd.DataFrame({
+        'date': meses_unicos.astype('datetime64[D]'),
+        'precip': totais.astype(np.float32),
+    }, copy=False)
+
+
+def derivar_series(df_daily, start_year, end_year):
+    """Calcula, a partir de uma série diária local, os totais mensais, anuais e a climatologia.
+
+    Retorna (df_monthly_series, df_annual, df_monthly_climatology).
+    """
+    df_monthly_series = totais_mensais(df_daily)
+    return (df_monthly_series,) + derivar_de_mensal(df_monthly_series, start_year, end_year)
@@ -0,0 +1,235 @@
+"""Tabela pré-calculada de médias zonais por município e estado (GAUL níveis 1 e 2).
+
+Para cada dataset, guarda a média ponderada por área da precipitação diária de
+todos os municípios e estados brasileiros, e os totais mensais derivados dela,
+em Parquet particionado:
+
+    dados/zonal/dataset=CHIRPS/ADM1=Minas Gerais/diario-2020-01.parquet
+    dados/zonal/dataset=CHIRPS/ADM1=Minas Gerais/mensal.parquet
+
+Cada pasta de estado tem um `cobertura.json` com o intervalo contínuo já gravado.
+Dentro de cada arquivo as linhas ficam ordenadas por (ADM2, date); a linha do
+próprio estado tem ADM2 vazio. Assim a consulta de um município na página
+Séries Temporais vira uma leitura local e filtrada de poucos arquivos.
+
+Carga inicial e atualização incremental (ex.: cron noturno):
+    python -m aquagee.tabela_zonal --dataset CHIRPS --inicio 2015-01-01 --fim 2024-12-31
+    python -m aquagee.tabela_zonal --incremental
+"""
+import argparse
+import json
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+import ee
+import numpy as np
+# pandas e pyarrow são importados dentro das funções (só a leitura/gravação das tabelas os usa)
+
+from aquagee import ee_async
+from aquagee.cubo import FONTES
+from aquagee.series import fc_para_colunas, serie_compacta
+
+DIRETORIO_ZONAL = Path(os.environ.get('AQUAGEE_ZONAL', 'dados/zonal'))
+
+# Valor de ADM2 usado na linha do estado inteiro
+ADM2_ESTADO = ''
+
+# Escala (m) de redução de cada dataset (resolução nativa)
+ESCALAS = {nome: round(fonte['resolucao'] * 111320) for nome, fonte in FONTES.items()}
+
+
+def _pasta(dataset, adm1, diretorio=DIRETORIO_ZONAL):
+    return Path(diretorio) / f"dataset={dataset}" / f"ADM1={adm1}"
+
+
+def ler_cobertura(dataset, adm1, diretorio=DIRETORIO_ZONAL):
+    """Intervalo contínuo de datas já gravado para o estado, ou None."""
+    caminho = _pasta(dataset, adm1, diretorio) / 'cobertura.json'
+    if not caminho.exists():
+        return None
+    info = json.loads(caminho.read_text())
+    return date.fromisoformat(info['inicio']), date.fromisoformat(info['fim'])
+
+
+def _gravar_cobertura(dataset, adm1, inicio, fim, diretorio=DIRETORIO_ZONAL):
+    atual = ler_cobertura(dataset, adm1, diretorio)
+    if atual is not None and inicio <= atual[1] + timedelta(days=1) and fim >= atual[0] - timedelta(days=1):
+        inicio, fim = min(inicio, atual[0]), max(fim, atual[1])
+    (_pasta(dataset, adm1, diretorio) / 'cobertura.json').write_text(json.dumps({'inicio': inicio.isoformat(), 'fim': fim.isoformat()}))
+
+
+# ---------- Cálculo no Earth Engine ----------
+def _unidades(estado):
+    """Municípios do estado e o próprio estado (ADM2 vazio) como um único FeatureCollection."""
+    municipios = (ee.FeatureCollection('FAO/GAUL/2015/level2')
+                  .filter(ee.Filter.eq('ADM0_NAME', 'Brazil'))
+                  .filter(ee.Filter.eq('ADM1_NAME', estado))
+                  .select(['ADM2_NAME']))
+    uf = (ee.FeatureCollection('FAO/GAUL/2015/level1')
+          .filter(ee.Filter.eq('ADM0_NAME', 'Brazil'))
+          .filter(ee.Filter.eq('ADM1_NAME', estado))
+          .map(lambda f: ee.Feature(f.geometry(), {'ADM2_NAME': ADM2_ESTADO})))
+    return municipios.merge(uf)
+
+
+def calcular_periodo(dataset, estado, inicio, fim):
+    """Médias diárias ponderadas por área de todas as unidades do estado em [inicio, fim].
+
+    Uma única requisição: `reduceRegions` por dia, achatado e devolvido em colunas.
+    """
+    import pandas as pd
+    fonte = FONTES[dataset]
+    colecao = ee.ImageCollection(fonte['id']).select(fonte['band'])
+    unidades = _unidades(estado)
+    inicio_ee = ee.Date(inicio.isoformat())
+
+    def por_dia(i):
+        dia = inicio_ee.advance(i, 'day')
+        img = colecao.filterDate(dia, dia.advance(1, 'day')).sum().multiply(fonte['multiplier']).rename('precip')
+        return img.reduceRegions(
+            collection=unidades, reducer=ee.Reducer.mean().setOutputs(['precip']), scale=ESCALAS[dataset]
+        ).map(lambda f: f.set('date', dia.format('YYYY-MM-dd')))
+
+    dias = ee.List.sequence(0, (fim - inicio).days)
+    fc = ee.FeatureCollection(dias.map(por_dia)).flatten()
+    colunas = fc_para_colunas(fc, ['ADM2_NAME', 'date', 'precip'], {'precip': 'float32'})
+    return pd.DataFrame({
+        'ADM2': colunas['ADM2_NAME'],
+        'date': colunas['date'].astype('datetime64[D]').astype('datetime64[s]'),
+        'precip': colunas['precip'],
+    }).sort_values(['ADM2', 'date'], kind='stable')
+
+
+# ---------- Gravação ----------
+def _gravar_mes(dataset, estado, df, mes, diretorio=DIRETORIO_ZONAL):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    pasta = _pasta(dataset, estado, diretorio)
+    pasta.mkdir(parents=True, exist_ok=True)
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(tabela, pasta / f"diario-{mes}.parquet", row_group_size=32768)
+
+
+def _atualizar_mensal(dataset, estado, diretorio=DIRETORIO_ZONAL):
+    """Regrava os totais mensais do estado a partir de todos os arquivos diários."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    pasta = _pasta(dataset, estado, diretorio)
+    diario = ds.dataset(sorted(pasta.glob('diario-*.parquet')), format='parquet').to_table().to_pandas()
+    diario['date'] = diario['date'].to_numpy().astype('datetime64[M]').astype('datetime64[s]')
+    mensal = diario.groupby(['ADM2', 'date'], sort=True, as_index=False)['precip'].sum()
+    pq.write_table(pa.Table.from_pandas(mensal, preserve_index=False), pasta / 'mensal.parquet')
+
+
+def _meses(inicio, fim):
+    """Fatias [ini, fim] de no máximo um mês cobrindo o intervalo."""
+    atual = inicio
+    while atual <= fim:
+        proximo = (atual.replace(day=1) + timedelta(days=32)).replace(day=1)
+        yield atual, min(proximo - timedelta(days=1), fim)
+        atual = proximo
+
+
+def listar_estados():
+    estados = (ee.FeatureCollection('FAO/GAUL/2015/level1')
+               .filter(ee.Filter.eq('ADM0_NAME', 'Brazil'))
+               .aggregate_array('ADM1_NAME').getInfo())
+    return sorted(e for e in estados if e and e != 'Name Unknown')
+
+
+def construir(dataset, inicio, fim, estados=None, diretorio=DIRETORIO_ZONAL):
+    """Calcula e grava a tabela do dataset para [inicio, fim], mês a mês, estados em paralelo."""
+    import pandas as pd
+    import pyarrow.parquet as pq
+    estados = estados or listar_estados()
+    for ini_mes, fim_mes in _meses(inicio, fim):
+        resultados = ee_async.rodar({
+            estado: ee_async.executar(calcular_periodo, dataset, estado, ini_mes, fim_mes)
+            for estado in estados
+        })
+        mes = ini_mes.strftime('%Y-%m')
+        for estado, df in resultados.items():
+            if ini_mes.day != 1:
+                # mês parcial (atualização incremental): junta com o que já estava gravado
+                existente = _pasta(dataset, estado, diretorio) / f"diario-{mes}.parquet"
+                if existente.exists():
+                    anterior = pq.read_table(existente).to_pandas()
+                    df = (pd.concat([anterior[anterior['date'] < pd.Timestamp(ini_mes)], df])
+                          .sort_values(['ADM2', 'date'], kind='stable'))
+            _gravar_mes(dataset, estado, df, mes, diretorio)
+            _gravar_cobertura(dataset, estado, ini_mes, fim_mes, diretorio)
+        print(f"{dataset}: {mes} gravado para {len(estados)} estados")
+    for estado in estados:
+        _atualizar_mensal(dataset, estado, diretorio)
+
+
+def incremental(dataset, diretorio=DIRETORIO_ZONAL):
+    """Acrescenta, aos estados já carregados, os dias até anteontem (latência dos produtos)."""
+    coberturas = {
+        pasta.name.split('=', 1)[1]: ler_cobertura(dataset, pasta.name.split('=', 1)[1], diretorio)
+        for pasta in (Path(diretorio) / f"dataset={dataset}").glob('ADM1=*')
+    }
+    coberturas = {estado: c for estado, c in coberturas.items() if c is not None}
+    if not coberturas:
+        print(f"{dataset}: sem carga inicial; nada a atualizar.")
+        return
+    inicio = min(c[1] for c in coberturas.values()) + timedelta(days=1)
+    fim = date.today() - timedelta(days=2)
+    if inicio <= fim:
+        construir(dataset, inicio, fim, sorted(coberturas), diretorio)
+
+
+# ---------- Leitura ----------
+def _ler(dataset, adm1, adm2, arquivo_glob, inicio, fim, diretorio):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    pasta = _pasta(dataset, adm1, diretorio)
+    arquivos = sorted(pasta.glob(arquivo_glob))
+    if not arquivos:
+        return None
+    filtro = ((ds.field('ADM2') == adm2)
+              & (ds.field('date') >= pa.scalar(np.datetime64(inicio, 's')))
+              & (ds.field('date') <= pa.scalar(np.datetime64(fim, 's'))))
+    tabela = ds.dataset(arquivos, format='parquet').to_table(columns=['date', 'precip'], filter=filtro)
+    return serie_compacta(tabela.column('date').to_numpy(), tabela.column('precip').to_numpy(), dataset=dataset)
+
+
+def series_unidade(dataset, adm1, adm2, start_year, end_year, diretorio=DIRETORIO_ZONAL):
+    """(df_daily, df_monthly_series) do município (ou estado, com adm2 vazio), ou None se não coberto."""
+    cobertura = ler_cobertura(dataset, adm1, diretorio)
+    inicio, fim = date(start_year, 1, 1), min(date(end_year, 12, 31), date.today() - timedelta(days=2))
+    if cobertura is None or cobertura[0] > inicio or cobertura[1] < fim:
+        return None
+    df_daily = _ler(dataset, adm1, adm2, 'diario-*.parquet', inicio, fim, diretorio)
+    df_monthly = _ler(dataset, adm1, adm2, 'mensal.parquet', inicio, fim, diretorio)
+    if df_daily is None or df_daily.empty or df_monthly is None:
+        return None
+    return df_daily, df_monthly
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tabela zonal por município/estado.")
+    parser.add_argument('--dataset', choices=list(FONTES), action='append',
+                        help="pode ser repetido; padrão: todos")
+    parser.add_argument('--inicio', type=date.fromisoformat)
+    parser.add_argument('--fim', type=date.fromisoformat)
+    parser.add_argument('--estados', nargs='*', help="restringe a alguns estados (ADM1_NAME)")
+    parser.add_argument('--incremental', action='store_true', help="acrescenta os dias novos desde a última carga")
+    args = parser.parse_args()
+
+    from aquagee.gee import inicializar_fora_do_streamlit
+    inicializar_fora_do_streamlit()
+
+    for dataset in args.dataset or list(FONTES):
+        if args.incremental:
+            incremental(dataset)
+        else:
+            if not (args.inicio and args.fim):
+                parser.error("--inicio e --fim são obrigatórios na carga inicial")
+            construir(dataset, args.inicio, args.fim, args.estados)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+"""Tarefas de extração em segundo plano, numa fila local persistente (SQLite).
+
+Séries longas e rasters mensais rodam fora da página, em processos
+trabalhadores, e sobrevivem ao fim da sessão do Streamlit. Cada tarefa é
+dividida em trechos (um mês de série diária ou de raster, um ano de série
+mensal); cada trecho concluído fica gravado em disco, e uma tarefa
+interrompida (reinício da máquina, trabalhador encerrado) é retomada do
+primeiro trecho que falta. Enquanto um trecho roda, o trabalhador renova o
+sinal de vida da tarefa; se mesmo assim ela for assumida por outro, o primeiro
+desiste na próxima atualização:
+
+    dados/tarefas/tarefas.db                       fila e estado
+    dados/tarefas/<id>/trechos/2015-01.parquet     trechos concluídos
+    dados/tarefas/<id>/trechos/2015-01_03.tif      partes de um raster grande
+    dados/tarefas/<id>/resultado.csv|.parquet|.zip resultado final
+
+Trabalhadores (ex.: serviço do sistema ao lado do Streamlit):
+    python -m aquagee.tarefas trabalhador --processos 2
+    python -m aquagee.tarefas listar
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+import ee
+
+from aquagee import extracao, reducao_tiles, redutores
+from aquagee.conexao import TIMEOUT_PADRAO, obter_transporte
+from aquagee.cubo import FONTES
+from aquagee.tabela_zonal import ESCALAS
+
+DIRETORIO_TAREFAS = Path(os.environ.get('AQUAGEE_TAREFAS', 'dados/tarefas'))
+
+SERIE_DIARIA = 'serie_diaria'
+SERIE_MENSAL = 'serie_mensal'
+RASTER_MENSAL = 'raster_mensal'
+TIPOS = {
+    SERIE_DIARIA: 'Série diária (CSV/Parquet)',
+    SERIE_MENSAL: 'Série mensal (CSV/Parquet)',
+    RASTER_MENSAL: 'Rasters mensais (GeoTIFF)',
+}
+
+PENDENTE, EXECUTANDO, CONCLUIDA, ERRO = 'pendente', 'executando', 'concluida', 'erro'
+
+# Sem atualização por este tempo (s), uma tarefa em execução é considerada abandonada
+TEMPO_ABANDONO = 15 * 60
+# Intervalo (s) entre os sinais de vida do trabalhador enquanto um trecho roda
+INTERVALO_BATIMENTO = 60
+# Tentativas antes de a tarefa ser marcada com erro
+MAX_TENTATIVAS = 3
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tarefas (
+    id TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    parametros TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    criada REAL NOT NULL,
+    atualizada REAL NOT NULL,
+    trechos_feitos INTEGER NOT NULL DEFAULT 0,
+    trechos_total INTEGER NOT NULL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    trabalhador TEXT,
+    erro TEXT
+)
+"""
+
+
+# ---------- Fila ----------
+@contextmanager
+def _conectar(diretorio=DIRETORIO_TAREFAS):
+    """Conexão em modo autocommit (WAL: leitores não bloqueiam os trabalhadores)."""
+    Path(diretorio).mkdir(parents=True, exist_ok=True)
+    conexao = sqlite3.connect(Path(diretorio) / 'tarefas.db', timeout=30, isolation_level=None)
+    try:
+        conexao.row_factory = sqlite3.Row
+        conexao.execute('PRAGMA journal_mode=WAL')
+        conexao.execute(_ESQUEMA)
+        yield conexao
+    finally:
+        conexao.close()
+
+
+def _trechos(tipo, parametros):
+    """Rótulos ('AAAA' ou 'AAAA-MM') dos trechos de uma tarefa, na ordem de execução."""
+    anos = range(parametros['inicio'], parametros['fim'] + 1)
+    if tipo == SERIE_MENSAL:
+        return [str(ano) for ano in anos]
+    # A série diária reduz cada imagem da coleção: trechos de um mês ficam abaixo
+    # do limite de 5000 imagens mesmo no IMERG (meia hora) e no GSMaP (hora)
+    return [f"{ano}-{mes:02d}" for ano in anos for mes in range(1, 13)]
+
+
+def _intervalo(trecho):
+    """(início, fim exclusivo) das datas de um trecho."""
+    if len(trecho) == 4:
+        return date(int(trecho), 1, 1), date(int(trecho) + 1, 1, 1)
+    inicio = date.fromisoformat(f"{trecho}-01")
+    return inicio, date(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+
+
+def enviar(tipo, parametros, diretorio=DIRETORIO_TAREFAS):
+    """Põe uma tarefa na fila e devolve seu id.
+
+    `parametros`: dataset, regiao ({'geojson': ...} ou {'adm1': ..., 'adm2': ...}),
+    inicio e fim (anos) e, nas séries, estatisticas.
+    """
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de tarefa desconhecido: {tipo}")
+    id_tarefa = uuid.uuid4().hex[:12]
+    agora = time.time()
+    with _conectar(diretorio) as conexao:
+        conexao.execute(
+            "INSERT INTO tarefas (id, tipo, parametros, estado, criada, atualizada, trechos_total)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (id_tarefa, tipo, json.dumps(parametros), PENDENTE, agora, agora, len(_trechos(tipo, parametros))),
+        )
+    return id_tarefa
+
+
+def consultar(id_tarefa, diretorio=DIRETORIO_TAREFAS):
+    """Estado da tarefa como dict (ou None se não existe)."""
+    with _conectar(diretorio) as conexao:
+        linha = conexao.execute("SELECT * FROM tarefas WHERE id = ?", (id_tarefa,)).fetchone()
+    return dict(linha) if linha is not None else None
+
+
+def listar(limite=20, diretorio=DIRETORIO_TAREFAS):
+    """Tarefas mais recentes primeiro."""
+    with _conectar(diretorio) as conexao:
+        linhas = conexao.execute("SELECT * FROM tarefas ORDER BY criada DESC LIMIT ?", (limite,)).fetchall()
+    return [dict(linha) for linha in linhas]
+
+
+def arquivos_resultado(id_tarefa, diretorio=DIRETORIO_TAREFAS):
+    """Arquivos de resultado de uma tarefa concluída (Path), por extensão."""
+    pasta = Path(diretorio) / id_tarefa
+    return {caminho.suffix.lstrip('.'): caminho for caminho in sorted(pasta.glob('resultado.*'))}
+
+
+def _reservar(trabalhador, diretorio=DIRETORIO_TAREFAS):
+    """Marca como em execução a próxima tarefa pendente (ou abandonada) e a devolve."""
+    with _conectar(diretorio) as conexao:
+        conexao.execute('BEGIN IMMEDIATE')
+        agora = time.time()
+        linha = conexao.execute(
+            "SELECT * FROM tarefas WHERE estado = ? OR (estado = ? AND atualizada < ?) ORDER BY criada LIMIT 1",
+            (PENDENTE, EXECUTANDO, agora - TEMPO_ABANDONO),
+        ).fetchone()
+        if linha is None:
+            conexao.execute('COMMIT')
+            return None
+        conexao.execute(
+            "UPDATE tarefas SET estado = ?, trabalhador = ?, atualizada = ?, tentativas = tentativas + 1 WHERE id = ?",
+            (EXECUTANDO, trabalhador, agora, linha['id']),
+        )
+        conexao.execute('COMMIT')
+        return dict(linha, trabalhador=trabalhador)
+
+
+class TarefaPerdida(Exception):
+    """A tarefa foi reservada por outro trabalhador (esta execução foi considerada abandonada)."""
+
+
+def _atualizar(tarefa, diretorio=DIRETORIO_TAREFAS, **campos):
+    """Atualiza a tarefa, desde que ela ainda pertença ao trabalhador que a reservou."""
+    campos['atualizada'] = time.time()
+    atribuicoes = ', '.join(f"{nome} = ?" for nome in campos)
+    with _conectar(diretorio) as conexao:
+        cursor = conexao.execute(
+            f"UPDATE tarefas SET {atribuicoes} WHERE id = ? AND trabalhador = ?",
+            (*campos.values(), tarefa['id'], tarefa['trabalhador']),
+        )
+    if cursor.rowcount == 0:
+        raise TarefaPerdida(tarefa['id'])
+
+
+@contextmanager
+def _batimento(tarefa, diretorio=DIRETORIO_TAREFAS, intervalo=INTERVALO_BATIMENTO):
+    """Renova `atualizada` a cada `intervalo` segundos enquanto o bloco roda (trechos longos).
+
+    Se a tarefa passou para outro trabalhador, as renovações param e o bloco
+    termina com `TarefaPerdida` ao sair.
+    """
+    parar = threading.Event()
+    perdida = threading.Event()
+
+    def laco():
+        while not parar.wait(intervalo):
+            try:
+                _atualizar(tarefa, diretorio)
+            except TarefaPerdida:
+                perdida.set()
+                return
+            except sqlite3.Error as e:
+                print(f"tarefa {tarefa['id']}: sinal de vida não gravado ({e})")
+
+    thread = threading.Thread(target=laco, name=f"batimento-{tarefa['id']}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        parar.set()
+        thread.join()
+    if perdida.is_set():
+        raise TarefaPerdida(tarefa['id'])
+
+
+# ---------- Execução dos trechos ----------
+def _roi(regiao):
+    if 'geojson' in regiao:
+        return ee.Geometry(regiao['geojson'])
+    return extracao.roi_divisao(regiao['adm1'], regiao['adm2'])
+
+
+def _trecho_serie(tipo, parametros, roi, tiles, trecho, arquivo):
+    fonte = FONTES[parametros['dataset']]
+    inicio, fim = _intervalo(trecho)
+    colecao = ee.ImageCollection(fonte['id']).select(fonte['band']).filterDate(inicio.isoformat(), fim.isoformat())
+    extrator = extracao.get_daily_precip if tipo == SERIE_DIARIA else extracao.get_monthly_total_series
+    df = extrator(colecao, roi, inicio.year, inicio.year, fonte['band'], ESCALAS[parametros['dataset']],
+                  fonte['multiplier'], parametros.get('estatisticas', redutores.PADRAO), tiles)
+    df.to_parquet(arquivo, index=False)
+
+
+def _arquivos_raster(trecho, celulas, pasta_trechos):
+    """GeoTIFFs de um trecho: um só, ou um por célula quando a ROI passa do limite de download."""
+    if len(celulas) == 1:
+        return [pasta_trechos / f"{trecho}.tif"]
+    return [pasta_trechos / f"{trecho}_{k:02d}.tif" for k in range(len(celulas))]
+
+
+def _trecho_raster(parametros, roi, celulas, trecho, pasta_trechos):
+    """Baixa o total do mês, uma requisição por célula (as já gravadas são puladas)."""
+    fonte = FONTES[parametros['dataset']]
+    inicio, fim = _intervalo(trecho)
+    imagem = (ee.ImageCollection(fonte['id']).select(fonte['band'])
+              .filterDate(inicio.isoformat(), fim.isoformat()).sum()
+              .multiply(fonte['multiplier']).rename('precip').clip(roi))
+    for celula, arquivo in zip(celulas, _arquivos_raster(trecho, celulas, pasta_trechos)):
+        if arquivo.exists():
+            continue
+        url = imagem.getDownloadURL({
+            'region': ee.Geometry.Rectangle(list(celula), 'EPSG:4326', False),
+            'scale': ESCALAS[parametros['dataset']], 'crs': 'EPSG:4326', 'format': 'GEO_TIFF',
+        })
+        resposta = obter_transporte().sessao.get(url, timeout=TIMEOUT_PADRAO)
+        resposta.raise_for_status()
+        temporario = arquivo.with_suffix('.tif.tmp')
+        temporario.write_bytes(resposta.content)
+        temporario.replace(arquivo)
+
+
+def _finalizar(tipo, pasta_trechos, pasta):
+    """Junta os trechos no resultado final."""
+    import pandas as pd
+    if tipo == RASTER_MENSAL:
+        with zipfile.ZipFile(pasta / 'resultado.zip', 'w') as arquivo_zip:
+            for tif in sorted(pasta_trechos.glob('*.tif')):
+                arquivo_zip.write(tif, tif.name)
+        return
+    df = pd.concat([pd.read_parquet(p) for p in sorted(pasta_trechos.glob('*.parquet'))], ignore_index=True)
+    df.to_parquet(pasta / 'resultado.parquet', index=False)
+    df.to_csv(pasta / 'resultado.csv', index=False)
+
+
+def executar_tarefa(tarefa, diretorio=DIRETORIO_TAREFAS):
+    """Executa os trechos que faltam de uma tarefa reservada e grava o resultado."""
+    tipo, parametros = tarefa['tipo'], json.loads(tarefa['parametros'])
+    pasta = Path(diretorio) / tarefa['id']
+    pasta_trechos = pasta / 'trechos'
+    pasta_trechos.mkdir(parents=True, exist_ok=True)
+    extensao = '.tif' if tipo == RASTER_MENSAL else '.parquet'
+
+    roi = _roi(parametros['regiao'])
+    escala, geojson = ESCALAS[parametros['dataset']], parametros['regiao'].get('geojson')
+    limites = reducao_tiles.limites_roi(geojson, roi)
+    if tipo == RASTER_MENSAL:
+        # ROIs grandes (estados, Brasil) são baixadas em partes abaixo do limite de download direto
+        celulas = reducao_tiles.planejar_download(escala, geojson, roi, limites=limites)
+    else:
+        tiles = reducao_tiles.planejar(escala, geojson, roi, parametros.get('estatisticas', redutores.PADRAO),
+                                       limites=limites)
+
+    trechos = _trechos(tipo, parametros)
+    for feitos, trecho in enumerate(trechos):
+        with _batimento(tarefa, diretorio):
+            if tipo == RASTER_MENSAL:
+                _trecho_raster(parametros, roi, celulas, trecho, pasta_trechos)
+            else:
+                arquivo = pasta_trechos / f"{trecho}{extensao}"
+                if not arquivo.exists():  # trechos já gravados (execução anterior) são pulados
+                    temporario = arquivo.with_suffix(arquivo.suffix + '.tmp')
+                    _trecho_serie(tipo, parametros, roi, tiles, trecho, temporario)
+                    temporario.replace(arquivo)
+        _atualizar(tarefa, diretorio, trechos_feitos=feitos + 1)
+
+    _finalizar(tipo, pasta_trechos, pasta)
+    _atualizar(tarefa, diretorio, estado=CONCLUIDA)
+
+
+# ---------- Trabalhadores ----------
+def trabalhar(ocioso=5, diretorio=DIRETORIO_TAREFAS):
+    """Laço de um processo trabalhador: reserva e executa tarefas até ser encerrado."""
+    from aquagee.gee import inicializar_fora_do_streamlit
+    inicializar_fora_do_streamlit()
+
+    trabalhador = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        tarefa = _reservar(trabalhador, diretorio)
+        if tarefa is None:
+            time.sleep(ocioso)
+            continue
+        print(f"[{trabalhador}] tarefa {tarefa['id']} ({tarefa['tipo']}), tentativa {tarefa['tentativas'] + 1}")
+        try:
+            executar_tarefa(tarefa, diretorio)
+        except TarefaPerdida:
+            print(f"[{trabalhador}] tarefa {tarefa['id']} assumida por outro trabalhador; abandonando")
+        except Exception as e:
+            estado = ERRO if tarefa['tentativas'] + 1 >= MAX_TENTATIVAS else PENDENTE
+            try:
+                _atualizar(tarefa, diretorio, estado=estado, erro=str(e))
+            except TarefaPerdida:
+                pass
+            print(f"[{trabalhador}] tarefa {tarefa['id']} falhou: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fila de tarefas de extração em segundo plano.")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+    trabalhador = comandos.add_parser('trabalhador', help="executa tarefas da fila")
+    trabalhador.add_argument('--processos', type=int, default=1)
+    comandos.add_parser('listar', help="mostra as tarefas mais recentes")
+    args = parser.parse_args()
+
+    if args.comando == 'listar':
+        for tarefa in listar():
+            print(f"{tarefa['id']}  {tarefa['tipo']:<14} {tarefa['estado']:<10} "
+                  f"{tarefa['trechos_feitos']}/{tarefa['trechos_total']}  {tarefa['erro'] or ''}")
+        return
+
+    processos = [multiprocessing.Process(target=trabalhar, daemon=True) for _ in range(args.processos)]
+    for processo in processos:
+        processo.start()
+    for processo in processos:
+        processo.join()
+
+
+if __name__ == '__main__':
+    main()
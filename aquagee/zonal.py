@@ -0,0 +1,158 @@
+"""Médias zonais sobre grades locais com um vetor esparso de pesos (1 x pixels).
+
+Para uma região (ROI desenhada, retângulo, círculo em torno de um ponto) e uma
+grade de dataset (CHIRPS 0,05°, IMERG/GSMaP 0,1°), o peso de cada pixel é a
+fração do pixel coberta pela região (estimada por subamostragem) vezes sua área
+relativa (cos(lat)). Os pesos são calculados uma vez e guardados em cache pelo
+hash da geometria; depois, a média em todos os instantes sai de um único
+produto esparso x denso:
+
+    medias (1 x tempo) = W (1 x pixels) @ X (pixels x tempo)
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+DIRETORIO_PESOS = Path(os.environ.get('AQUAGEE_PESOS', 'dados/pesos'))
+
+# Subamostras por lado de cada pixel para estimar a fração coberta (4 x 4 = 16 pontos)
+SUBAMOSTRAS = 4
+# Matrizes de pesos mantidas em memória (as demais ficam apenas no disco)
+MAX_EM_MEMORIA = 32
+
+_cache = OrderedDict()
+
+
+# ---------- Geometrias GeoJSON ----------
+def _poligonos(geojson):
+    """Lista de polígonos (cada um, lista de anéis como arrays Nx2) de um GeoJSON."""
+    if geojson['type'] == 'Polygon':
+        return [[np.asarray(anel, dtype=float) for anel in geojson['coordinates']]]
+    if geojson['type'] == 'MultiPolygon':
+        return [[np.asarray(anel, dtype=float) for anel in poligono] for poligono in geojson['coordinates']]
+    raise ValueError(f"Geometria não suportada: {geojson['type']}")
+
+
+def limites(geojson):
+    """(lon_min, lat_min, lon_max, lat_max) do GeoJSON."""
+    pontos = np.concatenate([anel for poligono in _poligonos(geojson) for anel in poligono])
+    return pontos[:, 0].min(), pontos[:, 1].min(), pontos[:, 0].max(), pontos[:, 1].max()
+
+
+def area_m2(geojson):
+    """Área aproximada (m²) do GeoJSON: fórmula do laço (shoelace) numa projeção equivalente local."""
+    raio = 6371008.8
+    area = 0.0
+    for poligono in _poligonos(geojson):
+        for k, anel in enumerate(poligono):
+            lat0 = np.radians(anel[:, 1].mean())
+            x = np.radians(anel[:, 0]) * np.cos(lat0) * raio
+            y = np.radians(anel[:, 1]) * raio
+            parcial = abs(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1])) / 2
+            area += parcial if k == 0 else -parcial  # anéis internos são buracos
+    return area
+
+
+def pontos_no_poligono(lon, lat, geojson):
+    """Máscara booleana dos pontos (arrays de mesma forma) dentro do GeoJSON (regra par-ímpar)."""
+    dentro = np.zeros(np.shape(lon), dtype=bool)
+    for poligono in _poligonos(geojson):
+        no_poligono = np.zeros(np.shape(lon), dtype=bool)
+        for anel in poligono:  # o primeiro anel é o externo; os demais são buracos
+            for (xa, ya), (xb, yb) in zip(anel[:-1], anel[1:]):
+                cruza = (ya > lat) != (yb > lat)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    x_corte = xa + (lat - ya) * (xb - xa) / (yb - ya)
+                no_poligono ^= cruza & (lon < x_corte)
+        dentro |= no_poligono
+    return dentro
+
+
+# ---------- Matriz de pesos ----------
+def _pesos_regiao(grade, geojson, janela, subamostras):
+    """Índices de pixel (relativos à janela) e pesos de área de uma região."""
+    y0, y1, x0, x1 = janela
+    ry0, ry1, rx0, rx1 = grade.janela(*limites(geojson))
+    h, w = ry1 - ry0, rx1 - rx0
+    deslocamentos = ((np.arange(subamostras) + 0.5) / subamostras - 0.5) * grade.resolucao
+    lons = (grade.lons[rx0:rx1, None] + deslocamentos[None, :]).ravel()
+    lats = (grade.lats[ry0:ry1, None] - deslocamentos[None, :]).ravel()
+    lon, lat = np.meshgrid(lons, lats)
+    fracao = pontos_no_poligono(lon, lat, geojson).reshape(h, subamostras, w, subamostras).mean(axis=(1, 3))
+    if not fracao.any():
+        # região menor que as subamostras: usa o pixel que contém o centro da região
+        lon_min, lat_min, lon_max, lat_max = limites(geojson)
+        cy0, _, cx0, _ = grade.janela((lon_min + lon_max) / 2, (lat_min + lat_max) / 2,
+                                      (lon_min + lon_max) / 2, (lat_min + lat_max) / 2)
+        fracao = np.zeros((h, w))
+        fracao[min(max(cy0 - ry0, 0), h - 1), min(max(cx0 - rx0, 0), w - 1)] = 1
+    area = fracao * np.cos(np.radians(grade.lats[ry0:ry1]))[:, None]
+    linhas, colunas = np.nonzero(area)
+    indices = (ry0 - y0 + linhas) * (x1 - x0) + (rx0 - x0 + colunas)
+    return indices, area[linhas, colunas]
+
+
+def _chave(grade, geojson, subamostras):
+    texto = json.dumps([grade.resolucao, subamostras, geojson], sort_keys=True, default=float)
+    return hashlib.sha1(texto.encode()).hexdigest()
+
+
+def _construir(grade, geojson, subamostras):
+    from scipy import sparse
+
+    janela = grade.janela(*limites(geojson))
+    n_pixels = (janela[1] - janela[0]) * (janela[3] - janela[2])
+    indices, pesos = _pesos_regiao(grade, geojson, janela, subamostras)
+    matriz = sparse.csr_matrix(
+        (pesos.astype(np.float32), (np.zeros(len(indices), dtype=np.int64), indices)), shape=(1, n_pixels),
+    )
+    return janela, matriz
+
+
+def matriz_pesos(grade, geojson, subamostras=SUBAMOSTRAS, diretorio=DIRETORIO_PESOS):
+    """(janela, W): janela da grade que contém a região e matriz esparsa 1 x pixels da janela.
+
+    Procura primeiro no cache em memória, depois em disco (`<hash>.npz`); só
+    então calcula e grava.
+    """
+    from scipy import sparse  # só com o cubo local: as páginas importam este módulo de início
+
+    chave = _chave(grade, geojson, subamostras)
+    if chave in _cache:
+        _cache.move_to_end(chave)
+        return _cache[chave]
+
+    arquivo = Path(diretorio) / f"{chave}.npz"
+    if arquivo.exists():
+        dados = np.load(arquivo)
+        resultado = (tuple(int(v) for v in dados['janela']),
+                     sparse.csr_matrix((dados['data'], dados['indices'], dados['indptr']), shape=tuple(dados['shape'])))
+    else:
+        resultado = _construir(grade, geojson, subamostras)
+        arquivo.parent.mkdir(parents=True, exist_ok=True)
+        janela, matriz = resultado
+        np.savez(arquivo, janela=np.array(janela), data=matriz.data, indices=matriz.indices,
+                 indptr=matriz.indptr, shape=np.array(matriz.shape))
+
+    _cache[chave] = resultado
+    if len(_cache) > MAX_EM_MEMORIA:
+        _cache.popitem(last=False)
+    return resultado
+
+
+def medias(matriz, bloco):
+    """Médias ponderadas (1 x tempo) de um bloco (tempo x linhas x colunas) da janela.
+
+    Pixels sem dado (NaN) são excluídos renormalizando os pesos em cada instante.
+    """
+    x = bloco.reshape(bloco.shape[0], -1).T  # pixels x tempo
+    validos = ~np.isnan(x)
+    soma = matriz @ np.where(validos, x, 0)
+    peso = matriz @ validos.astype(np.float32)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return soma / peso
+
@@ -0,0 +1,76 @@
+"""Compara a sessão padrão do cliente do EE com a sessão configurada de `aquagee.conexao`.
+
+Uso:
+    python benchmarks/bench_conexao.py caminho/conta_de_servico.json [n_dias]
+
+As duas sessões usam o mesmo transporte do cliente do EE e ambas mantêm as
+conexões abertas; o que muda é só o adaptador (pool do tamanho de `ee_async`,
+com bloqueio, e novas tentativas em falhas de conexão). Por isso o laço de
+`obter_series_temporais` (uma redução por dia sobre um ponto com raio de 10 km)
+roda de duas formas: em sequência e em paralelo no pool de `ee_async`, onde o
+tamanho do pool importa. Além do tempo por chamada, mostra quantas conexões
+cada sessão abriu.
+"""
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+import ee
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from aquagee.conexao import TransportePersistente, contar_conexoes  # noqa: E402
+from aquagee.ee_async import MAX_CONCORRENCIA  # noqa: E402
+
+
+def reducao_do_dia(i):
+    geom = ee.Geometry.Point([-45.462025, -22.424808]).buffer(10000)
+    colecao = ee.ImageCollection('UCSB-CHG/CHIRPS/DAILY').select('precipitation')
+    dia = ee.Date((date(2023, 1, 1) + timedelta(days=i)).strftime('%Y-%m-%d'))
+    img = colecao.filterDate(dia, dia.advance(1, 'day')).sum()
+    return img.reduceRegion(ee.Reducer.mean(), geom, 5566)
+
+
+def medir(n_dias):
+    """ms por chamada em sequência e em paralelo (pool do tamanho de `ee_async`)."""
+    t0 = time.perf_counter()
+    for i in range(n_dias):
+        reducao_do_dia(i).getInfo()
+    sequencial = (time.perf_counter() - t0) / n_dias
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=MAX_CONCORRENCIA) as executor:
+        list(executor.map(lambda i: reducao_do_dia(i).getInfo(), range(n_dias)))
+    paralelo = (time.perf_counter() - t0) / n_dias
+    return sequencial, paralelo
+
+
+def main():
+    info = json.loads(Path(sys.argv[1]).read_text())
+    n_dias = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    credentials = ee.ServiceAccountCredentials(info['client_email'], sys.argv[1])
+
+    ee.Initialize(credentials, project=credentials.project_id)
+    padrao = medir(n_dias)
+    _, conexoes_padrao = contar_conexoes(ee.data._get_state().requests_session)
+
+    ee.Reset()
+    transporte = TransportePersistente()
+    ee.Initialize(credentials, project=credentials.project_id, http_transport=transporte)
+    configurada = medir(n_dias)
+    _, conexoes_configurada = contar_conexoes(transporte.sessao)
+
+    print(f"{'':22}{'sequencial':>12}{'paralelo':>12}{'conexões':>10}")
+    for nome, (sequencial, paralelo), conexoes in (
+        ('sessão padrão', padrao, conexoes_padrao),
+        ('sessão configurada', configurada, conexoes_configurada),
+    ):
+        print(f"{nome:<22}{sequencial * 1000:9.1f} ms{paralelo * 1000:9.1f} ms{conexoes:10d}")
+    print(f"reutilização de conexões (configurada): {transporte.taxa_reutilizacao():.0%}")
+
+
+if __name__ == '__main__':
+    main()
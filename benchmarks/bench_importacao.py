@@ -0,0 +1,111 @@
+"""Mede o carregamento a frio de cada página (`python -X importtime`) e falha se piorar.
+
+Uso:
+    python benchmarks/bench_importacao.py [repeticoes]
+    python benchmarks/bench_importacao.py --gravar [repeticoes]
+
+Os imports de nível de módulo de cada página são extraídos (ast) e executados
+num processo novo, sem rodar o restante do script (que precisaria do Streamlit
+em execução e do Earth Engine). O tempo é a soma dos tempos cumulativos dos
+imports de primeiro nível, o menor entre as repetições.
+
+Sai com código 1 se uma página voltar a carregar de início uma biblioteca que
+deve ser importada sob demanda (`SOB_DEMANDA`: geemap, folium, plotly, pandas,
+zarr, scipy...), ou se o tempo passar do orçamento (orcamento_importacao.json)
+mais a tolerância.
+O orçamento vale para a máquina em que foi gravado: regrave com --gravar ao
+trocar de máquina. Não precisa de credenciais.
+"""
+import ast
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+ARQUIVO_ORCAMENTO = Path(__file__).with_name('orcamento_importacao.json')
+
+# Importadas só no modo/aba que as usa
+SOB_DEMANDA = ('geemap', 'folium', 'streamlit_folium', 'plotly', 'altair', 'pandas', 'pyarrow', 'zarr', 'scipy')
+
+# Folga sobre o orçamento antes de acusar regressão
+TOLERANCIA = 0.25
+
+
+def paginas():
+    return [RAIZ / '🏠Pagina Inicial.py', *sorted((RAIZ / 'pages').glob('*.py'))]
+
+
+def imports_da_pagina(caminho):
+    """Código com apenas os imports de nível de módulo da página (o que roda no carregamento)."""
+    arvore = ast.parse(caminho.read_text(encoding='utf-8'))
+    return '\n'.join(ast.unparse(no) for no in arvore.body if isinstance(no, (ast.Import, ast.ImportFrom)))
+
+
+def medir(codigo):
+    """(ms, módulos de primeiro nível carregados) de uma execução de `codigo` num processo novo."""
+    processo = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        cwd=RAIZ, capture_output=True, text=True,
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(processo.stderr.strip().splitlines()[-1])
+    total_us = 0
+    modulos = set()
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, cumulativo, nome = linha[len('import time:'):].split('|')
+        modulos.add(nome.strip().split('.')[0])
+        if not nome.startswith('  '):  # " nome": import de primeiro nível
+            total_us += int(cumulativo)
+    return total_us / 1000, modulos
+
+
+def medir_repetido(codigo, repeticoes):
+    medicoes = [medir(codigo) for _ in range(repeticoes)]
+    return min(ms for ms, _ in medicoes), medicoes[0][1]
+
+
+def main():
+    argumentos = sys.argv[1:]
+    gravar = '--gravar' in argumentos
+    argumentos = [a for a in argumentos if a != '--gravar']
+    repeticoes = int(argumentos[0]) if argumentos else 5
+
+    # Módulos que o próprio Streamlit já carrega não contam como regressão da página
+    base_ms, base_modulos = medir_repetido('import streamlit', repeticoes)
+    print(f"{'streamlit (base)':<32} {base_ms:8.0f} ms")
+
+    orcamento = json.loads(ARQUIVO_ORCAMENTO.read_text()) if ARQUIVO_ORCAMENTO.exists() else {}
+    medidos = {}
+    falhas = []
+    for caminho in paginas():
+        nome = caminho.name
+        try:
+            ms, modulos = medir_repetido(imports_da_pagina(caminho), repeticoes)
+        except RuntimeError as e:
+            falhas.append(f"{nome}: importação falhou ({e})")
+            continue
+        medidos[nome] = round(ms)
+        limite = orcamento.get(nome)
+        situacao = f"orçamento {limite} ms" if limite is not None else "sem orçamento"
+        print(f"{nome:<32} {ms:8.0f} ms  ({situacao})")
+
+        pesados = sorted(m for m in SOB_DEMANDA if m in modulos and m not in base_modulos)
+        if pesados:
+            falhas.append(f"{nome}: carrega de início {', '.join(pesados)}")
+        if limite is not None and ms > limite * (1 + TOLERANCIA):
+            falhas.append(f"{nome}: {ms:.0f} ms > {limite} ms + {TOLERANCIA:.0%}")
+
+    if gravar:
+        ARQUIVO_ORCAMENTO.write_text(json.dumps(medidos, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+        print(f"orçamento gravado em {ARQUIVO_ORCAMENTO.name}")
+
+    for falha in falhas:
+        print(f"REGRESSÃO: {falha}")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == '__main__':
+    main()
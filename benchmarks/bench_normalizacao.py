@@ -0,0 +1,86 @@
+"""Compara a normalização antiga (`_ensure_date_and_precip`) com `normalizar_serie`.
+
+Uso:
+    python benchmarks/bench_normalizacao.py [n_linhas]
+
+Séries sintéticas de 1 milhão de linhas (padrão) nos três esquemas de data.
+Não precisa de credenciais.
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from aquagee.series import ESQUEMA_ANO_MES, ESQUEMA_DATA, ESQUEMA_EPOCH, normalizar_serie  # noqa: E402
+
+
+def _ensure_date_and_precip(df, band_name=None, multiplier=1):
+    """Versão anterior da página Séries Temporais, mantida aqui como referência."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=['date', 'precip'])
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+    elif 'time' in df.columns:
+        df['date'] = pd.to_datetime(df['time'], unit='ms', errors='coerce')
+    elif 'year' in df.columns and 'month' in df.columns:
+        df['date'] = pd.to_datetime(df['year'].astype(str) + '-' + df['month'].astype(str).str.zfill(2) + '-01', errors='coerce')
+    else:
+        df['date'] = pd.NaT
+
+    if 'precip' in df.columns:
+        df['precip'] = pd.to_numeric(df['precip'], errors='coerce')
+    elif band_name and band_name in df.columns:
+        df['precip'] = pd.to_numeric(df[band_name], errors='coerce') * multiplier
+    else:
+        numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+        if numeric_cols:
+            df['precip'] = pd.to_numeric(df[numeric_cols[0]], errors='coerce') * multiplier
+        else:
+            df['precip'] = pd.Series([pd.NA] * len(df), dtype='float64')
+
+    df = df.dropna(subset=['precip']).sort_values('date').reset_index(drop=True)
+    return df[['date', 'precip']]
+
+
+def sinteticos(n):
+    rng = np.random.default_rng(0)
+    dias = np.datetime64('1900-01-01') + np.arange(n)
+    precip = rng.gamma(0.4, 8.0, n)
+    meses = np.datetime64('1900-01') + np.arange(n)
+    return {
+        ESQUEMA_DATA: {'date': dias.astype(str), 'precip': precip},
+        ESQUEMA_EPOCH: {'time': dias.astype('datetime64[ms]').astype(np.int64), 'precip': precip},
+        ESQUEMA_ANO_MES: {
+            'year': meses.astype('datetime64[Y]').astype(np.int64) + 1970,
+            'month': meses.astype(np.int64) % 12 + 1,
+            'precip': precip,
+        },
+    }
+
+
+def cronometrar(func, repeticoes=3):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        resultado = func()
+        tempos.append(time.perf_counter() - t0)
+    return min(tempos), resultado
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    for esquema, colunas in sinteticos(n).items():
+        t_antigo, antigo = cronometrar(lambda: _ensure_date_and_precip(pd.DataFrame(colunas)))
+        t_novo, novo = cronometrar(lambda: normalizar_serie(colunas, esquema))
+        assert np.allclose(antigo['precip'].to_numpy(), novo['precip'].to_numpy(), rtol=1e-6)
+        print(f"{esquema:>9}: antigo {t_antigo * 1000:8.1f} ms ({antigo.memory_usage(deep=True).sum() / 1e6:6.1f} MB) | "
+              f"vetorizado {t_novo * 1000:8.1f} ms ({novo.memory_usage(deep=True).sum() / 1e6:6.1f} MB) | "
+              f"{t_antigo / t_novo:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
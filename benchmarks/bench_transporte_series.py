@@ -0,0 +1,77 @@
+"""Compara o transporte por Features (JSON de getInfo) com o transporte colunar.
+
+Uso:
+    python benchmarks/bench_transporte_series.py [n_dias]
+
+Gera respostas sintéticas no formato devolvido pelo Earth Engine para uma série
+diária e mede tempo de decodificação + montagem do DataFrame e pico de memória.
+Não precisa de credenciais.
+"""
+import json
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from aquagee.series import colunas_para_df  # noqa: E402
+
+
+def payloads(n_dias):
+    rng = np.random.default_rng(0)
+    datas = [(date(1981, 1, 1) + timedelta(days=i)).isoformat() for i in range(n_dias)]
+    precip = rng.gamma(0.4, 8.0, n_dias).tolist()
+    features = {
+        'type': 'FeatureCollection',
+        'columns': {'date': 'String', 'precip': 'Float', 'system:index': 'String'},
+        'features': [
+            {'type': 'Feature', 'geometry': None, 'id': f'{i}_0',
+             'properties': {'date': d, 'precip': p}}
+            for i, (d, p) in enumerate(zip(datas, precip))
+        ],
+    }
+    colunar = [datas, precip]
+    return json.dumps(features), json.dumps(colunar)
+
+
+def por_features(texto):
+    info = json.loads(texto)
+    rows = [f.get('properties', {}) for f in info.get('features', []) if f.get('properties') is not None]
+    return pd.DataFrame(rows)
+
+
+def por_colunas(texto):
+    datas, precip = json.loads(texto)
+    return colunas_para_df({'date': np.asarray(datas), 'precip': np.asarray(precip, dtype='float64')})
+
+
+def medir(func, texto, repeticoes=5):
+    tracemalloc.start()
+    func(texto)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        func(texto)
+        tempos.append(time.perf_counter() - t0)
+    return min(tempos), pico
+
+
+def main():
+    n_dias = int(sys.argv[1]) if len(sys.argv) > 1 else 16000
+    texto_features, texto_colunas = payloads(n_dias)
+    print(f"{n_dias} dias | payload features: {len(texto_features) / 1e6:.2f} MB | "
+          f"payload colunar: {len(texto_colunas) / 1e6:.2f} MB")
+    for nome, func, texto in (('features', por_features, texto_features), ('colunar', por_colunas, texto_colunas)):
+        tempo, pico = medir(func, texto)
+        print(f"{nome:>9}: {tempo * 1000:8.1f} ms | pico de memória {pico / 1e6:7.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
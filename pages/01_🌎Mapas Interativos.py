@@ -1,20 +1,18 @@
 import streamlit as st
 import ee
-import geemap.foliumap as geemap 
-import folium
 from datetime import date, timedelta, datetime
-import json
-import tempfile
 import calendar
+import time
 
-# Cria arquivo temporário com as credenciais
-service_account_info = dict(st.secrets["earthengine"])
+from aquagee.animacao import TIPO_DIARIO, TIPO_INSTANTANEO, Reprodutor
+from aquagee.buffer_recente import LIMITES_MAPA, PASSOS, BufferCircular, colorir, iniciar_coletor
+from aquagee.cache import cache_compartilhado
+from aquagee.gee import inicializar_gee
+from aquagee.indice_tempo import cobertura_mensal, obter_indice, rotulos_hora
+from aquagee.miniaturas import legenda_html
 
-with tempfile.NamedTemporaryFile(mode='w+', suffix='.json', delete=False) as f:
-    json.dump(service_account_info, f)
-    f.flush()
-    credentials = ee.ServiceAccountCredentials(service_account_info["client_email"], f.name)
-    ee.Initialize(credentials)
+# Inicializa o GEE (uma vez por processo, com transporte HTTP persistente)
+inicializar_gee()
     
 st.set_page_config(
     layout='wide',
@@ -84,8 +82,7 @@ DATASETS = {
 
 # --- FUNÇÕES AUXILIARES OTIMIZADAS ---
 
-@st.cache_data
-
+@cache_compartilhado('ultima_data', ttl=3600)
 def get_ultima_data_disponivel(info, colecao_id_key='id'):
     """Busca a última data disponível de forma robusta, expandindo o intervalo caso necessário."""
     hoje = date.today()
@@ -113,12 +110,56 @@ def get_ultima_data_disponivel(info, colecao_id_key='id'):
 
 def desenhar_mapa(image, vis_params, titulo, legenda):
     """Função para renderizar o mapa no Streamlit."""
+    # geemap (e o folium) só são importados quando um mapa é desenhado
+    import geemap.foliumap as geemap
     st.write(f"**Exibindo:** {titulo}")
     mapa = geemap.Map(center=[-15, -55], zoom=4, tiles='cartodbdark_matter')
     mapa.addLayer(image, vis_params, titulo)
     mapa.add_colorbar(vis_params, label=legenda,background_color='white')
     mapa.to_streamlit(width=1920, height=800)
 
+def desenhar_grade(grade, vis_params, titulo, legenda):
+    """Renderiza uma grade local (buffer recente) como sobreposição de imagem, sem tiles do EE."""
+    import folium
+    import geemap.foliumap as geemap
+    st.write(f"**Exibindo:** {titulo}")
+    mapa = geemap.Map(center=[-15, -55], zoom=4, tiles='cartodbdark_matter')
+    folium.raster_layers.ImageOverlay(
+        image=colorir(grade, vis_params), bounds=LIMITES_MAPA, mercator_project=True, name=titulo
+    ).add_to(mapa)
+    mapa.add_colorbar(vis_params, label=legenda, background_color='white')
+    mapa.to_streamlit(width=1920, height=800)
+
+@st.cache_resource
+def obter_buffer_recente(nome):
+    """Buffer local (somente leitura) dos quadros recentes do dataset.
+
+    A thread do coletor é iniciada em cada processo, mas só o que obtém a trava
+    exclusiva coleta e grava; os demais apenas leem.
+    """
+    if nome not in PASSOS:
+        return None
+    iniciar_coletor(nome)
+    return BufferCircular(nome, somente_leitura=True)
+
+def exibir_quadro_local(buffer, timestamp, info):
+    """Mostra um quadro do buffer recente. Retorna False se ele não estiver no buffer."""
+    grade = buffer.quadro(timestamp)
+    if grade is None:
+        return False
+    data_img = datetime.utcfromtimestamp(timestamp / 1000.0).strftime("%d/%m/%Y - %H:%M")
+    desenhar_grade(
+        grade,
+        info['vis_params']['ultima_imagem'],
+        f"Imagem para a data - {data_img}",
+        "Precipitação Instantânea"
+    )
+    return True
+
+def imagem_por_timestamp(info, timestamp):
+    """Imagem da coleção com o `system:time_start` exato (vindo do índice de timestamps)."""
+    return ee.ImageCollection(info['id']).filter(ee.Filter.eq('system:time_start', int(timestamp))).first()
+
 def soma_periodo(info, inicio, fim, para_agregados=False):
     """
     Função simplificada para somar imagens em um período.
@@ -139,32 +180,29 @@ def soma_periodo(info, inicio, fim, para_agregados=False):
 
 def ultima_imagem(info):
     """Mostra a imagem mais recente ou permite escolher entre as últimas disponíveis."""
-    
+
     ultima_data = get_ultima_data_disponivel(info)
     if not ultima_data:
         st.warning("Não foi possível encontrar imagens recentes com dados disponíveis.")
         return
 
-    # Buscar imagens nos últimos 40 dias até a última data disponível
-    inicio_busca = ultima_data - timedelta(days=40)
-    colecao = (
-        ee.ImageCollection(info['id'])
-        .filterDate(str(inicio_busca), str(ultima_data + timedelta(days=1)))
-        .sort('system:time_start', False)
-    )
-
-    imagens_disponiveis = colecao.aggregate_array("system:time_start").getInfo()
-    if not imagens_disponiveis:
+    # Horário mais recente pelo índice local de timestamps (a última data pode cair no dia UTC seguinte)
+    indice = obter_indice(info['id'])
+    timestamps = indice.timestamps_do_dia(ultima_data + timedelta(days=1))
+    if not len(timestamps):
+        timestamps = indice.timestamps_do_dia(ultima_data)
+    if not len(timestamps):
         st.warning("Nenhuma imagem encontrada.")
         return
 
-    else:
-        # Última imagem automaticamente
-        img = colecao.first()
-        if img is None:
-            st.warning("Nenhuma imagem encontrada.")
-            return
-        data_img = ee.Date(img.get("system:time_start")).format("dd/MM/YYYY - HH:mm").getInfo()
+    # Com o buffer recente em dia com a coleção, o quadro mais novo é lido localmente
+    buffer = obter_buffer_recente(info['name'])
+    ultimo_local = buffer.recente(int(timestamps[0])) if buffer is not None else None
+    if ultimo_local is not None and exibir_quadro_local(buffer, ultimo_local, info):
+        return
+
+    img = imagem_por_timestamp(info, timestamps[0])
+    data_img = datetime.utcfromtimestamp(timestamps[0] / 1000.0).strftime("%d/%m/%Y - %H:%M")
 
     # Visualização
     vis = info['vis_params']['ultima_imagem']
@@ -194,66 +232,32 @@ def selecionar_imagem(info):
     # Seleção de data (máximo = última data disponível)
     data_sel = st.sidebar.date_input("Data", max_value=ultima_data, value=ultima_data)
 
-    # Construir intervalo de busca como strings ISO (evita passar objetos ee.Date como str)
-    start_str = data_sel.strftime('%Y-%m-%d')
-    end_str = (data_sel + timedelta(days=1)).strftime('%Y-%m-%d')
-
-    colecao = (
-        ee.ImageCollection(info['id'])
-        .filterDate(start_str, end_str)
-        .sort('system:time_start', False)
-    )
+    # Dias dentro do buffer recente: horas e quadros vêm do disco, sem chamadas ao EE
+    buffer = obter_buffer_recente(info['name'])
+    timestamps_locais = buffer.timestamps_do_dia(data_sel) if buffer is not None else []
+    if len(timestamps_locais):
+        opcoes = dict(zip(rotulos_hora(timestamps_locais), timestamps_locais.tolist()))
+        hora_sel_label = st.sidebar.selectbox("Hora (UTC)", list(opcoes), index=0)
+        if exibir_quadro_local(buffer, opcoes[hora_sel_label], info):
+            return
 
-    # Obter timestamps disponíveis para a data (ms desde epoch)
+    # Horas disponíveis pelo índice local de timestamps (ordenado, mais recente primeiro)
     try:
-        timestamps = colecao.aggregate_array('system:time_start').getInfo() or []
+        timestamps = obter_indice(info['id']).timestamps_do_dia(data_sel)
     except Exception as e:
         st.error(f"Erro ao listar imagens para a data selecionada: {e}")
         return
 
-    if not timestamps:
+    if not len(timestamps):
         st.warning("Nenhuma imagem encontrada para a data selecionada.")
         return
 
-    # Mapear timestamps para rótulos legíveis (UTC) e manter ordem (coleção já ordenada mais recente primeiro)
-    labels = []
-    ts_map = {}
-    for ts in timestamps:
-        dt = datetime.utcfromtimestamp(ts / 1000.0)
-        label = dt.strftime("%H:%M")
-        # se houver colisão no rótulo (mesma hora:minuto), acrescenta segundos para distinguir
-        if label in ts_map:
-            label = dt.strftime("%H:%M:%S")
-        if label in ts_map:
-            # como último recurso, inclui milissegundos
-            label = dt.strftime("%H:%M:%S.%f")[:-3]
-        ts_map[label] = ts
-        labels.append(label)
-
-    # Remove duplicados preservando ordem
-    seen = set()
-    options = []
-    for l in labels:
-        if l not in seen:
-            options.append(l)
-            seen.add(l)
-
-    # Índice padrão para a opção mais recente (primeiro da coleção ordenada)
-    default_index = 0
-    hora_sel_label = st.sidebar.selectbox("Hora (UTC)", options, index=default_index)
-
-    selected_ts = ts_map[hora_sel_label]
-
-    # Tenta obter a imagem com o timestamp exato; se falhar, procura num pequeno intervalo de ±30 min
-    img = colecao.filter(ee.Filter.eq('system:time_start', int(selected_ts))).first()
-    if img is None:
-        ts_dt = datetime.utcfromtimestamp(selected_ts / 1000.0)
-        start_window = (ts_dt - timedelta(minutes=30)).strftime('%Y-%m-%dT%H:%M:%S')
-        end_window = (ts_dt + timedelta(minutes=30)).strftime('%Y-%m-%dT%H:%M:%S')
-        img = colecao.filterDate(start_window, end_window).first()
-        if img is None:
-            st.warning("Não foi possível localizar a imagem para a hora selecionada.")
-            return
+    opcoes = rotulos_hora(timestamps)
+    hora_sel_label = st.sidebar.selectbox("Hora (UTC)", opcoes, index=0)
+
+    # O timestamp vem do índice, então o filtro exato sempre encontra a imagem
+    selected_ts = int(timestamps[opcoes.index(hora_sel_label)])
+    img = imagem_por_timestamp(info, selected_ts)
 
     data_img = datetime.utcfromtimestamp(selected_ts / 1000.0).strftime("%d/%m/%Y - %H:%M")
 
@@ -324,25 +328,9 @@ def acumulado_mensal(info):
         index=anos_disponiveis.index(ano_default)
     )
 
-    # Descobre quais meses têm dado no ano selecionado
+    # Meses com dado no ano selecionado, pelo índice de cobertura (sem varrer a coleção)
     colecao_id = info['id2'] if 'id2' in info else info['id']
-    colecao_ano = (
-        ee.ImageCollection(colecao_id)
-        .filterDate(f"{ano_sel}-01-01", f"{ano_sel+1}-01-01")
-        .select(info['band'])
-    )
-
-    # Extrair lista de meses com dados
-    def get_month(img):
-        return ee.Date(img.get("system:time_start")).get("month")
-    
-    meses_disponiveis = (
-        colecao_ano.map(lambda img: ee.Feature(None, {"month": get_month(img)}))
-        .aggregate_array("month")
-        .distinct()
-        .getInfo()
-    )
-    meses_disponiveis = sorted(set(meses_disponiveis))
+    meses_disponiveis = cobertura_mensal(colecao_id, ultima_data).get(ano_sel, [])
 
     if not meses_disponiveis:
         st.warning(f"Não há dados disponíveis para o ano {ano_sel}.")
@@ -406,6 +394,73 @@ def acumulado_anual(info):
     )
 
 
+def animacao(info):
+    """Reproduz uma sequência de quadros (sub-diários ou acumulados diários) como animação."""
+    st.sidebar.header("Filtros")
+
+    ultima_data = get_ultima_data_disponivel(info)
+    if not ultima_data:
+        st.warning("Não foi possível determinar a última data com dados disponíveis.")
+        return
+
+    tipos = {"Acumulados diários": TIPO_DIARIO}
+    if info['name'] in PASSOS:
+        tipos = {"Imagens sub-diárias": TIPO_INSTANTANEO, **tipos}
+    tipo = tipos[st.sidebar.radio("Quadros", list(tipos))]
+
+    # Limite de dias da janela para manter a sequência num tamanho reproduzível
+    max_dias = 3 if tipo == TIPO_INSTANTANEO else 60
+    periodo = st.sidebar.date_input(
+        "Período",
+        value=(ultima_data - timedelta(days=1 if tipo == TIPO_INSTANTANEO else 13), ultima_data),
+        max_value=ultima_data
+    )
+    if len(periodo) != 2:
+        st.info("Selecione a data inicial e a final do período.")
+        return
+    inicio, fim = periodo
+    if (fim - inicio).days + 1 > max_dias:
+        st.warning(f"Escolha no máximo {max_dias} dias para este tipo de quadro.")
+        return
+    fps = st.sidebar.slider("Quadros por segundo", 1, 10, 4)
+
+    dias = [inicio + timedelta(days=i) for i in range((fim - inicio).days + 1)]
+    if tipo == TIPO_INSTANTANEO:
+        indice = obter_indice(info['id'])
+        quadros = [int(ts) for dia in dias for ts in indice.timestamps_do_dia(dia)[::-1]]
+        rotulos = [datetime.utcfromtimestamp(ts / 1000.0).strftime("%d/%m/%Y - %H:%M UTC") for ts in quadros]
+        vis = info['vis_params']['ultima_imagem']
+    else:
+        quadros = dias
+        rotulos = [dia.strftime('%d/%m/%Y') for dia in dias]
+        vis = info['vis_params']['diario']
+
+    if not quadros:
+        st.warning("Nenhuma imagem encontrada para o período selecionado.")
+        return
+
+    # Legenda com a mesma paleta dos mapas
+    st.markdown(legenda_html(vis), unsafe_allow_html=True)
+
+    reprodutor = Reprodutor(info, tipo, quadros, vis)
+    posicao = st.slider("Quadro", 0, len(quadros) - 1, 0) if len(quadros) > 1 else 0
+    reproduzir = st.button("▶ Reproduzir")
+    tela = st.empty()
+
+    if not reproduzir:
+        tela.image(reprodutor.obter(posicao), caption=rotulos[posicao], use_container_width=True)
+        return
+
+    # Cada quadro é exibido assim que chega; a pré-busca mantém os próximos a caminho
+    inicio_reproducao = time.perf_counter()
+    for i in range(posicao, len(quadros)):
+        inicio_quadro = time.perf_counter()
+        tela.image(reprodutor.obter(i), caption=rotulos[i], use_container_width=True)
+        time.sleep(max(0.0, 1 / fps - (time.perf_counter() - inicio_quadro)))
+    fps_efetivo = (len(quadros) - posicao) / (time.perf_counter() - inicio_reproducao)
+    st.caption(f"Taxa efetiva: {fps_efetivo:.1f} quadros/s (alvo: {fps})")
+
+
 # --- INTERFACE PRINCIPAL DO APP ---
 st.sidebar.title('Menu de Análise')
 dataset_selecionado = st.sidebar.selectbox('Escolha o conjunto de dados:', list(DATASETS.keys()), index=1)
@@ -418,7 +473,8 @@ modos = {
     "Selecionar Imagem por Data": selecionar_imagem,
     "Acumulado Diário": acumulado_diario,
     "Acumulado Mensal": acumulado_mensal,
-    "Acumulado Anual": acumulado_anual
+    "Acumulado Anual": acumulado_anual,
+    "Animação": animacao
 }
 
 # CHIRPS Daily não é ideal para "Última Imagem" por ter latência de ~2 dias
@@ -1,29 +1,19 @@
 # ...existing code...
 import streamlit as st
-import folium
-from folium.plugins import Draw
-from streamlit_folium import st_folium
 import ee
-import geemap.foliumap as geemap
-from datetime import date, datetime
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
-import json
-import tempfile
+from datetime import date
+# geemap, folium, plotly e pandas são importados onde são usados (modo de desenho,
+# abas de resultados): a configuração na barra lateral não paga por eles.
+
+from aquagee import aquecimento, cache, cubo, ee_async, previa, reducao_tiles, redutores, tabela_zonal, tarefas
+from aquagee.conexao import obter_transporte
+from aquagee.gee import inicializar_gee
+from aquagee.extracao import DATASETS, argumentos_series, calcular_series_ee, get_annual_precipitation, roi_divisao
+from aquagee.graficos import exibir_cronometrado, figura_barras, reduzir_df
+from aquagee.series import derivar_de_mensal, derivar_series
 
 # --- Configurações Iniciais e Autenticação do GEE ---
-try:
-    service_account_info = dict(st.secrets["earthengine"])
-    with tempfile.NamedTemporaryFile(mode='w+', suffix='.json', delete=False) as f:
-        json.dump(service_account_info, f)
-        f.flush()
-        credentials = ee.ServiceAccountCredentials(service_account_info["client_email"], f.name)
-        ee.Initialize(credentials)
-except Exception as e:
-    st.error("Ocorreu um erro na autenticação com o Google Earth Engine. Verifique suas credenciais.")
-    st.error(f"Detalhes do erro: {e}")
-    st.stop()
+inicializar_gee()
 
 # --- Configuração da Página do Streamlit ---
 st.set_page_config(
@@ -47,36 +37,6 @@ except FileNotFoundError:
 # --- Dicionário de Datasets e Constantes ---
 PALETA_PRECIPITACAO = ['#FFFFFF', '#00FFFF', '#0000FF', '#00FF00', '#FFFF00', '#FF0000', '#800000']
 
-DATASETS = {
-    'CHIRPS': {
-        'id': 'UCSB-CHG/CHIRPS/DAILY',
-        'id2': 'UCSB-CHG/CHIRPS/PENTAD',
-        'band': 'precipitation',
-        'multiplier': 1, # Unidade já é mm/dia
-        'scale': 5566,
-        'start_year': 1981,
-        'name': 'CHIRPS',
-    },
-    'IMERG': {
-        'id': 'NASA/GPM_L3/IMERG_V07',
-        'id2': 'NASA/GPM_L3/IMERG_V07',
-        'band': 'precipitation',
-        'multiplier': 0.5,
-        'scale': 11132,
-        'start_year': 2000,
-        'name': 'IMERG',
-    },
-    'GSMaP': {
-        'id': 'JAXA/GPM_L3/GSMaP/v8/operational',
-        'id2': 'JAXA/GPM_L3/GSMaP/v8/operational',
-        'band': 'hourlyPrecipRate',
-        'multiplier': 1,
-        'scale': 11132,
-        'start_year': 2000,
-        'name': 'GSMaP',
-    },
-}
-
 # --- Coleções de Features (Divisões Políticas) ---
 @st.cache_data
 def get_feature_collection(name):
@@ -89,152 +49,31 @@ def get_feature_collection(name):
 collection_estados = get_feature_collection('estados')
 collection_municipios = get_feature_collection('municipios')
 
-# ---------- Helpers robustos ----------
-def _fc_to_df(fc):
-    """Converte um ee.FeatureCollection (já calculado) em pandas.DataFrame de forma defensiva."""
-    info = fc.getInfo()
-    features = info.get('features', []) if isinstance(info, dict) else []
-    rows = [f.get('properties', {}) for f in features if f.get('properties') is not None]
-    return pd.DataFrame(rows)
-
-def _ensure_date_and_precip(df, band_name=None, multiplier=1):
-    """Garante colunas 'date' (datetime) e 'precip' (float). Retorna df com essas colunas."""
-    if df is None or df.empty:
-        return pd.DataFrame(columns=['date', 'precip'])
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-    elif 'time' in df.columns:
-        df['date'] = pd.to_datetime(df['time'], unit='ms', errors='coerce')
-    elif 'year' in df.columns and 'month' in df.columns:
-        df['date'] = pd.to_datetime(df['year'].astype(str) + '-' + df['month'].astype(str).str.zfill(2) + '-01', errors='coerce')
-    else:
-        df['date'] = pd.NaT
-
-    if 'precip' in df.columns:
-        df['precip'] = pd.to_numeric(df['precip'], errors='coerce')
-    elif band_name and band_name in df.columns:
-        df['precip'] = pd.to_numeric(df[band_name], errors='coerce') * multiplier
-    else:
-        numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
-        if numeric_cols:
-            df['precip'] = pd.to_numeric(df[numeric_cols[0]], errors='coerce') * multiplier
-        else:
-            df['precip'] = pd.Series([pd.NA] * len(df), dtype='float64')
-
-    df = df.dropna(subset=['precip']).sort_values('date').reset_index(drop=True)
-    return df[['date', 'precip']]
-
-# ---------- Função diária (robusta e sem getRegion) ----------
-def get_daily_precip(collection, roi, start_year, end_year, band_name, scale, multiplier):
-    """
-    Calcula série diária reduzindo cada imagem sobre a ROI.
-    Faz verificação do número de imagens e aborta (lança RuntimeError)
-    se a coleção exceder o limite seguro de getInfo (5000).
-    """
-    start = ee.Date.fromYMD(start_year, 1, 1)
-    end = ee.Date.fromYMD(end_year, 12, 31).advance(1, 'day')
-    daily_coll = collection.filterDate(start, end).filterBounds(roi)
-
-    # Verifica tamanho da coleção para evitar getInfo massivo
-    n_images = daily_coll.size().getInfo()
-    if n_images > 5000:
-        raise RuntimeError(f"too_many_images: coleção diária tem {n_images} imagens (>5000)")
-
-    def _per_image(img):
-        img_band = img.select([band_name]).multiply(multiplier)
-        date_str = ee.Date(img.get('system:time_start')).format('YYYY-MM-dd')
-        val = img_band.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=roi,
-            scale=scale,
-            maxPixels=1e13
-        ).get(band_name)
-        return ee.Feature(None, {'date': date_str, 'precip': val})
-
-    daily_fc = daily_coll.map(_per_image)
-    df = _fc_to_df(daily_fc)
-    df = _ensure_date_and_precip(df, band_name=band_name, multiplier=multiplier)
-    return df
-
-# ---------- Série mensal (YYYY-MM) ----------
-def get_monthly_total_series(collection, roi, start_year, end_year, band_name, scale, multiplier):
-    years = list(range(start_year, end_year + 1))
-    features = []
-    for y in years:
-        for m in range(1, 13):
-            start = ee.Date.fromYMD(y, m, 1)
-            end = start.advance(1, 'month')
-            img_sum = collection.filterDate(start, end).sum().multiply(multiplier)
-            mean_val = img_sum.reduceRegion(
-                reducer=ee.Reducer.mean(), geometry=roi, scale=scale, maxPixels=1e13
-            ).get(band_name)
-            features.append(ee.Feature(None, {'date': start.format('YYYY-MM'), 'precip': mean_val}))
-    monthly_fc = ee.FeatureCollection(features)
-    df = _fc_to_df(monthly_fc)
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'].astype(str) + '-01', errors='coerce')
-    df = _ensure_date_and_precip(df, band_name=band_name, multiplier=multiplier)
-    if not df.empty:
-        start_pd = pd.to_datetime(f"{start_year}-01-01")
-        end_pd = pd.to_datetime(f"{end_year}-12-31")
-        df = df[(df['date'] >= start_pd) & (df['date'] <= end_pd)].reset_index(drop=True)
-    return df
-
-# ---------- Climatologia mensal (média do mês ao longo dos anos) ----------
-def get_monthly_climatology(collection, roi, start_year, end_year, band_name, scale, multiplier):
-    months = range(1, 13)
-    features = []
-
-    for m in months:
-        # filtra só o mês m em todos os anos
-        monthly_coll = collection.filter(ee.Filter.calendarRange(m, m, 'month'))
-
-        # acumula precipitação dentro de cada mês/ano
-        def month_sum(img):
-            year = img.date().get('year')
-            month_coll = collection.filterDate(
-                ee.Date.fromYMD(year, m, 1),
-                ee.Date.fromYMD(year, m, 1).advance(1, 'month')
-            )
-            return month_coll.sum().multiply(multiplier).set({'year': year, 'month': m})
-
-        monthly_totals = monthly_coll.map(month_sum)
-
-        # média interanual
-        month_mean = monthly_totals.mean()
-
-        mean_val = month_mean.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=roi,
-            scale=scale,
-            maxPixels=1e13
-        ).get(band_name)
-
-        features.append(ee.Feature(None, {'month': m, 'precip': mean_val}))
-
-    monthly_fc = ee.FeatureCollection(features)
-    df = _fc_to_df(monthly_fc)
-    if 'month' in df.columns:
-        df['month'] = pd.to_numeric(df['month'], errors='coerce').astype('Int64')
-        df['month_name'] = df['month'].apply(lambda x: datetime(2023, int(x), 1).strftime('%b') if pd.notna(x) else '')
-    df['precip'] = pd.to_numeric(df.get('precip', pd.Series([], dtype=float)), errors='coerce')
-    return df.sort_values('month').reset_index(drop=True)
-
-# ---------- Precipitação anual ----------
-def get_annual_precipitation(collection, roi, start_year, end_year, band_name, scale, multiplier):
-    features = []
-    for y in range(start_year, end_year + 1):
-        start = ee.Date.fromYMD(y, 1, 1)
-        end = start.advance(1, 'year')
-        total = collection.filterDate(start, end).sum().multiply(multiplier)
-        mean_val = total.reduceRegion(reducer=ee.Reducer.mean(), geometry=roi, scale=scale, maxPixels=1e13).get(band_name)
-        features.append(ee.Feature(None, {'year': y, 'precip': mean_val}))
-    annual_fc = ee.FeatureCollection(features)
-    df = _fc_to_df(annual_fc)
-    if 'year' in df.columns:
-        df['year'] = pd.to_numeric(df['year'], errors='coerce').astype('Int64')
-    df['precip'] = pd.to_numeric(df.get('precip', pd.Series([], dtype=float)), errors='coerce')
-    return df.sort_values('year').reset_index(drop=True)
+# Listas de nomes das divisões, compartilhadas entre os processos do app
+@cache.cache_compartilhado('divisoes', ttl=7 * 24 * 3600)
+def listar_estados():
+    estados_info = collection_estados.aggregate_array('ADM1_NAME').getInfo()
+    return sorted([estado for estado in estados_info if estado and estado != 'Name Unknown'])
+
+@cache.cache_compartilhado('divisoes', ttl=7 * 24 * 3600)
+def listar_municipios(estado):
+    municipios_filtrados = collection_municipios.filter(ee.Filter.eq('ADM1_NAME', estado))
+    return sorted(municipios_filtrados.aggregate_array('ADM2_NAME').getInfo())
+
+def exibir_estatisticas(df, titulo_x):
+    """Linhas das estatísticas extras (máximo, p95, fração com chuva) e a tabela completa da série."""
+    import plotly.express as px
+    extras = [c for c in df.columns if c in redutores.COLUNAS.values() and c != 'precip']
+    if not extras:
+        return
+    nomes = {coluna: redutores.ESTATISTICAS[nome] for nome, coluna in redutores.COLUNAS.items()}
+    df_plot = reduzir_df(df, 'date', 'precip', metodo='lttb')
+    fig = px.line(df_plot, x='date', y=['precip'] + [c for c in extras if c != 'fracao_chuva'], labels={'date': titulo_x, 'value': 'Precipitação (mm)', 'variable': 'Estatística'})
+    fig.for_each_trace(lambda trace: trace.update(name=nomes[trace.name]))
+    fig.update_layout(template="plotly_white", title="Estatísticas da região")
+    st.plotly_chart(fig, use_container_width=True)
+    with st.expander("Tabela da série"):
+        st.dataframe(df.rename(columns=nomes), hide_index=True, use_container_width=True)
 
 # --- Interface do Usuário (Sidebar) ---
 st.sidebar.header("1. Selecione a Fonte de Dados")
@@ -244,8 +83,6 @@ dataset_name = st.sidebar.selectbox(
 )
 selected_dataset = DATASETS[dataset_name]
 
-ee_collection_id_daily = selected_dataset['id']
-ee_collection_id_agg = selected_dataset['id2']
 band_name = selected_dataset['band']
 dataset_scale = selected_dataset['scale']
 dataset_start_year = selected_dataset['start_year']
@@ -257,30 +94,30 @@ st.sidebar.header("2. Selecione a Região")
 tipo_analise = st.sidebar.radio("Como deseja selecionar a área?", ('Por Divisão Política', 'Por Quadrado (Lat/Lon)', 'Por Ponto (Lat/Lon)', 'Desenhar no Mapa'), key='tipo_analise')
 
 roi = None
+roi_geojson = None  # geometria conhecida localmente (permite responder pelo cubo local)
+unidade_zonal = None  # (ADM1, ADM2) da divisão política (permite responder pela tabela zonal)
 local_selecionado_nome = "Área de Interesse"
 
 if tipo_analise == 'Por Divisão Política':
     tipo_divisao = st.sidebar.radio("Analisar por:", ('Município', 'Estado'))
     try:
-        estados_info = collection_estados.aggregate_array('ADM1_NAME').getInfo()
-        estados = sorted([estado for estado in estados_info if estado and estado != 'Name Unknown'])
+        estados = listar_estados()
         default_index = estados.index('Minas Gerais') if 'Minas Gerais' in estados else 0
         estado_selecionado = st.sidebar.selectbox("Escolha o Estado", estados, index=default_index)
 
         if tipo_divisao == 'Município':
             if estado_selecionado:
                 with st.spinner("Carregando municípios..."):
-                    municipios_filtrados = collection_municipios.filter(ee.Filter.eq('ADM1_NAME', estado_selecionado))
-                    municipios = sorted(municipios_filtrados.aggregate_array('ADM2_NAME').getInfo())
+                    municipios = listar_municipios(estado_selecionado)
                 municipio_selecionado = st.sidebar.selectbox("Escolha o Município", municipios, index=0)
                 if municipio_selecionado:
                     local_selecionado_nome = f"{municipio_selecionado}, {estado_selecionado}"
-                    roi_fc = collection_municipios.filter(ee.Filter.And(ee.Filter.eq('ADM1_NAME', estado_selecionado), ee.Filter.eq('ADM2_NAME', municipio_selecionado)))
-                    roi = roi_fc.geometry()
+                    unidade_zonal = (estado_selecionado, municipio_selecionado)
+                    roi = roi_divisao(*unidade_zonal)
         else:
             local_selecionado_nome = estado_selecionado
-            roi_fc = collection_estados.filter(ee.Filter.eq('ADM1_NAME', estado_selecionado))
-            roi = roi_fc.geometry()
+            unidade_zonal = (estado_selecionado, tabela_zonal.ADM2_ESTADO)
+            roi = roi_divisao(*unidade_zonal)
     except Exception as e:
         st.sidebar.error(f"Não foi possível carregar a lista de estados/municípios. Erro: {e}")
         st.stop()
@@ -294,6 +131,7 @@ elif tipo_analise == 'Por Quadrado (Lat/Lon)':
 
     # Cria retângulo no GEE
     roi = ee.Geometry.Rectangle([lon_min, lat_min, lon_max, lat_max])
+    roi_geojson = cubo.retangulo_geojson(lon_min, lat_min, lon_max, lat_max)
     local_selecionado_nome = f"Quadrado: [{lat_min}, {lon_min}] até [{lat_max}, {lon_max}]"
         
         
@@ -305,15 +143,17 @@ elif tipo_analise == 'Por Ponto (Lat/Lon)':
     local_selecionado_nome = f"Ponto ({lat:.2f}, {lon:.2f}) com raio de {buffer_radius/1000:.1f} km"
     point = ee.Geometry.Point([lon, lat])
     roi = point.buffer(buffer_radius)
+    roi_geojson = cubo.circulo_geojson(lon, lat, buffer_radius)
 
 if 'drawn_geometry' not in st.session_state:
     st.session_state.drawn_geometry = None
 
 if tipo_analise == 'Desenhar no Mapa':
-    st.sidebar.markdown("ATENÇÃO: Áreas grandes podem demorar para processar.")
+    st.sidebar.markdown("ATENÇÃO: Áreas grandes podem demorar para processar (são reduzidas em tiles).")
     local_selecionado_nome = "Área Desenhada no Mapa"
     if st.session_state.drawn_geometry:
         roi = ee.Geometry(st.session_state.drawn_geometry)
+        roi_geojson = st.session_state.drawn_geometry
 
 st.sidebar.divider()
 
@@ -323,16 +163,78 @@ start_year = st.sidebar.slider("Ano Inicial", dataset_start_year, current_year,
 end_year = st.sidebar.slider("Ano Final", dataset_start_year, current_year, current_year - 1)
 st.sidebar.markdown("CUIDADO: períodos muito longos podem levar a tempos de processamento elevados.")
 
+# Estatísticas extras das séries diária e mensal (calculadas na mesma passada que a média)
+estatisticas = redutores.normalizar(st.sidebar.multiselect(
+    "Estatísticas da região",
+    [nome for nome in redutores.ESTATISTICAS if nome != 'media'],
+    format_func=lambda nome: redutores.ESTATISTICAS[nome],
+    help="Além da média, calcula estas estatísticas sobre os pixels da região (séries diária e mensal)."
+))
+
+modo_previa = st.sidebar.toggle(
+    "Prévia rápida para regiões grandes", value=True,
+    help="Mostra primeiro um resultado numa escala mais grosseira (com erro estimado) e o substitui "
+         "pelo cálculo na escala nativa assim que ele terminar."
+)
+
 run_analysis = st.sidebar.button("📊 Gerar Análise", type="primary", use_container_width=True)
 
+# --- Tarefas em segundo plano (séries longas e rasters), executadas por `python -m aquagee.tarefas trabalhador` ---
+if 'tarefas' not in st.session_state:
+    st.session_state.tarefas = []
+
+with st.sidebar.expander("📦 Exportação em segundo plano"):
+    st.caption("Para períodos longos: a extração roda fora desta página e continua mesmo se você fechá-la.")
+    tipo_tarefa = st.selectbox("Resultado", list(tarefas.TIPOS), format_func=tarefas.TIPOS.get)
+    if roi_geojson is not None:
+        regiao_tarefa = {'geojson': roi_geojson}
+    elif unidade_zonal is not None:
+        regiao_tarefa = {'adm1': unidade_zonal[0], 'adm2': unidade_zonal[1]}
+    else:
+        regiao_tarefa = None
+    if st.button("Enviar tarefa", disabled=regiao_tarefa is None or start_year > end_year, use_container_width=True):
+        id_tarefa = tarefas.enviar(tipo_tarefa, {
+            'dataset': selected_dataset['name'], 'regiao': regiao_tarefa, 'nome': local_selecionado_nome,
+            'inicio': start_year, 'fim': end_year, 'estatisticas': list(estatisticas),
+        })
+        st.session_state.tarefas.insert(0, id_tarefa)
+
+    for id_tarefa in st.session_state.tarefas:
+        tarefa = tarefas.consultar(id_tarefa)
+        if tarefa is None:
+            continue
+        st.markdown(f"**{tarefas.TIPOS[tarefa['tipo']]}** · `{id_tarefa}`")
+        if tarefa['estado'] == tarefas.CONCLUIDA:
+            for extensao, caminho in tarefas.arquivos_resultado(id_tarefa).items():
+                st.download_button(
+                    f"Baixar {extensao.upper()}", caminho.read_bytes(), file_name=f"{id_tarefa}.{extensao}",
+                    key=f"baixar_{id_tarefa}_{extensao}", use_container_width=True,
+                )
+        elif tarefa['estado'] == tarefas.ERRO:
+            st.error(f"Falhou: {tarefa['erro']}")
+        else:
+            st.progress(tarefa['trechos_feitos'] / tarefa['trechos_total'],
+                        text=f"{tarefa['estado'].capitalize()}: {tarefa['trechos_feitos']}/{tarefa['trechos_total']} trechos")
+    if st.session_state.tarefas:
+        st.button("🔄 Atualizar estado", use_container_width=True)
+
 
 
 # --- LÓGICA DE EXIBIÇÃO PRINCIPAL ---
 st.title(f"☔️ Análise de Precipitação Acumulada ({selected_dataset['name']})")
 
-if not run_analysis:
+# Resultados da última análise ficam na sessão: interações nos gráficos (ex.: janela
+# de visualização) reexecutam o script sem precisar consultar o GEE novamente.
+chave_analise = (dataset_name, roi.serialize() if roi is not None else None, start_year, end_year, estatisticas)
+analise_salva = st.session_state.get('analise')
+tem_analise_salva = analise_salva is not None and analise_salva['chave'] == chave_analise
+
+if not run_analysis and not tem_analise_salva:
     if tipo_analise == 'Desenhar no Mapa':
         st.info('ℹ️ Use as ferramentas no canto superior esquerdo do mapa para desenhar sua área de interesse. A última forma desenhada será utilizada. Após desenhar, clique em "Gerar Análise" na barra lateral.')
+        import folium
+        from folium.plugins import Draw
+        from streamlit_folium import st_folium
         m_draw = folium.Map(location=[-15, -55], zoom_start=4, tiles='openstreetmap')
         Draw(export=False, position='topleft').add_to(m_draw)
         output = st_folium(m_draw, width='100%', height=600, returned_objects=['last_active_drawing'])
@@ -352,50 +254,127 @@ if start_year >= end_year:
     st.error("❌ O ano inicial deve ser anterior ao ano final.")
     st.stop()
 
-with st.spinner(f"Processando dados de '{selected_dataset['name']}' para '{local_selecionado_nome}'... Isso pode levar alguns minutos."):
-    try:
-        date_filter = ee.Filter.date(f"{start_year}-01-01", f"{end_year}-12-31")
-        
-        precip_collection_agg = ee.ImageCollection(ee_collection_id_agg).select(band_name).filter(date_filter).filterBounds(roi)
-        precip_collection_daily = ee.ImageCollection(ee_collection_id_daily).select(band_name).filter(date_filter).filterBounds(roi)
-        
-        df_annual = get_annual_precipitation(precip_collection_agg, roi, start_year, end_year, band_name, dataset_scale, dataset_multiplier)
-        df_monthly_climatology = get_monthly_climatology(precip_collection_agg, roi, start_year, end_year, band_name, dataset_scale, dataset_multiplier)
-        df_monthly_series = get_monthly_total_series(precip_collection_agg, roi, start_year, end_year, band_name, dataset_scale, dataset_multiplier)
-
-        # --- Verifica tamanho da coleção diária antes de tentar processar ---
-        daily_disabled = False
-        df_daily = pd.DataFrame(columns=['date', 'precip'])
-        try:
-            n_images = precip_collection_daily.size().getInfo()
-        except Exception as e:
-            # Se não for possível obter tamanho, desativa diária por segurança
-            n_images = None
-            daily_disabled = True
-
-        if n_images is not None and n_images > 5000:
-            daily_disabled = True
-            # st.warning(f"A coleção diária tem {n_images} imagens (>5000). Série diária desativada para evitar erro. Use a série mensal.")
-        elif not daily_disabled:
-            # coleção segura para série diária
+if run_analysis:
+    # Se o cubo local ou a tabela zonal cobrem o período, tudo é calculado sem chamadas ao Earth Engine
+    # (os caminhos locais guardam só a média; outras estatísticas vão ao EE)
+    series_locais = None
+    df_local = None
+    if estatisticas == redutores.PADRAO:
+        df_local = cubo.serie_diaria_local(selected_dataset['name'], roi_geojson, start_year, end_year)
+    if df_local is not None:
+        series_locais = (df_local,) + derivar_series(df_local, start_year, end_year)
+        fonte_local = "cubo local"
+    elif unidade_zonal is not None and estatisticas == redutores.PADRAO:
+        tabela = tabela_zonal.series_unidade(selected_dataset['name'], *unidade_zonal, start_year, end_year)
+        if tabela is not None:
+            series_locais = tabela + derivar_de_mensal(tabela[1], start_year, end_year)
+            fonte_local = "tabela zonal pré-calculada"
+
+    if series_locais is not None:
+        df_daily, df_monthly_series, df_annual, df_monthly_climatology = series_locais
+        n_images = len(df_daily)
+        st.sidebar.success(f"⚡ Resultado lido localmente ({fonte_local}), sem consultar o GEE.")
+    else:
+        with st.spinner(f"Processando dados de '{selected_dataset['name']}' para '{local_selecionado_nome}'... Isso pode levar alguns minutos."):
             try:
-                df_daily = get_daily_precip(precip_collection_daily, roi, start_year, end_year, band_name, dataset_scale, dataset_multiplier)
-            except RuntimeError as e:
-                # fallback: se a função detectar coleção grande internamente
-                msg = str(e)
-                if 'too_many_images' in msg or 'coleção diária' in msg:
-                    daily_disabled = True
-                    st.warning(f"Série diária desativada: {msg}. Usando série mensal como alternativa.")
-                    df_daily = get_monthly_total_series(precip_collection_daily, roi, start_year, end_year, band_name, dataset_scale, dataset_multiplier)
+                args_ee = argumentos_series(selected_dataset, roi, start_year, end_year)
+                precip_collection_agg = args_ee[0]
+
+                # ROIs grandes (pelo número estimado de pixels) são reduzidas em tiles. Os limites
+                # da ROI servem ao plano dos tiles e à prévia (no GAUL, vêm do cache compartilhado)
+                limites = reducao_tiles.limites_roi(roi_geojson, roi)
+                tiles = reducao_tiles.planejar(dataset_scale, roi_geojson, roi, estatisticas, limites=limites)
+
+                args_nativos = (*args_ee, dataset_scale, dataset_multiplier, estatisticas, tiles)
+                fator = previa.fator_escala(dataset_scale, roi_geojson, roi, limites=limites) if modo_previa else 1
+                if fator > 1 and not calcular_series_ee.em_cache(*args_nativos):
+                    # Prévia numa escala grosseira; a escala nativa é calculada em segundo plano
+                    escala_previa = dataset_scale * fator
+                    # A série anual na escala 2x (para o erro estimado) é pedida junto com a prévia
+                    futuro_2x = ee_async.submeter(get_annual_precipitation, precip_collection_agg, roi, start_year, end_year, band_name, 2 * escala_previa, dataset_multiplier)
+                    series = calcular_series_ee(*args_ee, escala_previa, dataset_multiplier, estatisticas)
+                    anual_2x = futuro_2x.result()
+                    series['previa'] = {
+                        'escala': escala_previa,
+                        'erro': previa.erro_relativo(series['df_annual']['precip'], anual_2x['precip'])
+                        if len(anual_2x) == len(series['df_annual']) else None,
+                    }
+                    st.session_state.refinamento = {
+                        'chave': chave_analise,
+                        'futuro': previa.refinar(calcular_series_ee, *args_nativos),
+                    }
                 else:
-                    raise
-    except Exception as e:
-        st.error("Ocorreu um erro ao processar os dados do Earth Engine. Verifique se a região de interesse é válida e tente novamente.")
-        st.error(f"Detalhe do erro: {e}")
-        st.stop()
+                    if tiles:
+                        st.sidebar.info(f"🧩 Região grande: redução dividida em {len(tiles)} tiles.")
+                    series = calcular_series_ee(*args_nativos)
+                    st.session_state.pop('refinamento', None)
+            except Exception as e:
+                st.error("Ocorreu um erro ao processar os dados do Earth Engine. Verifique se a região de interesse é válida e tente novamente.")
+                st.error(f"Detalhe do erro: {e}")
+                st.stop()
+        if unidade_zonal is not None:
+            # Divisões consultadas com frequência entram no aquecimento do cache
+            aquecimento.registrar(aquecimento.SERIE, dataset=dataset_name, adm1=unidade_zonal[0], adm2=unidade_zonal[1],
+                                  inicio=start_year, fim=end_year, estatisticas=list(estatisticas))
+        if series['aviso']:
+            st.warning(series['aviso'])
+        df_annual, df_monthly_climatology = series['df_annual'], series['df_monthly_climatology']
+        df_monthly_series, df_daily, n_images = series['df_monthly_series'], series['df_daily'], series['n_images']
+    st.session_state.analise = {
+        'chave': chave_analise,
+        'df_annual': df_annual,
+        'df_monthly_climatology': df_monthly_climatology,
+        'df_monthly_series': df_monthly_series,
+        'df_daily': df_daily,
+        'n_images': n_images,
+        'previa': series.get('previa') if series_locais is None else None,
+    }
+
+analise = st.session_state.analise
+df_annual = analise['df_annual'].copy()
+df_monthly_climatology = analise['df_monthly_climatology']
+df_monthly_series = analise['df_monthly_series']
+df_daily = analise['df_daily']
+n_images = analise['n_images']
+
+transporte = obter_transporte()
+st.sidebar.caption(
+    f"Conexões com o GEE: {transporte.estatisticas()['requisicoes']} requisições, "
+    f"{transporte.taxa_reutilizacao():.0%} reaproveitando conexão aberta."
+)
+metricas_cache = cache.metricas()
+if 'series' in metricas_cache and metricas_cache['series']['taxa'] is not None:
+    st.sidebar.caption(f"Cache compartilhado de séries: {metricas_cache['series']['taxa']:.0%} de acertos.")
 
 st.header(f"📍 Resultados para: {local_selecionado_nome} | Fonte: {selected_dataset['name']}")
 
+@st.fragment(run_every=3)
+def acompanhar_refinamento():
+    """Consulta o cálculo na escala nativa e, quando pronto, troca a prévia pelo resultado final."""
+    refinamento = st.session_state.get('refinamento')
+    if refinamento is None or refinamento['chave'] != chave_analise:
+        return
+    if not refinamento['futuro'].done():
+        st.caption("⏳ Calculando na escala nativa em segundo plano; os gráficos serão atualizados ao terminar.")
+        return
+    del st.session_state['refinamento']
+    try:
+        series = refinamento['futuro'].result()
+    except Exception as e:
+        st.warning(f"Não foi possível refinar a prévia na escala nativa. Detalhe do erro: {e}")
+        return
+    st.session_state.analise = {**series, 'chave': chave_analise, 'previa': None}
+    st.rerun()
+
+if analise.get('previa'):
+    erro = analise['previa']['erro']
+    st.info(
+        f"🔎 Prévia na escala de {analise['previa']['escala'] / 1000:.0f} km "
+        f"(nativa: {dataset_scale / 1000:.1f} km)"
+        + (f", erro estimado de ±{erro:.1%} nos totais anuais." if erro is not None else ".")
+    )
+    acompanhar_refinamento()
+
 if not df_annual.empty and 'precip' in df_annual.columns and not df_annual['precip'].isnull().all():
     media_anual = df_annual['precip'].mean()
     ano_mais_chuvoso = df_annual.loc[df_annual['precip'].idxmax()]
@@ -410,6 +389,7 @@ else:
 tab1, tab2, tab3, tab4, tab5 = st.tabs(["🗺️ Mapa da Seleção", "📈 Série Diária", "📈 Série Mensal", "📉 Climatologia Mensal", "📊 Série Anual"])
 
 with tab1:
+    import geemap.foliumap as geemap
     st.subheader("Mapa da Região de Interesse")
     m_roi = geemap.Map(center=[-15, -55], zoom=4)
     m_roi.centerObject(roi, 10)
@@ -417,23 +397,44 @@ with tab1:
     m_roi.to_streamlit()
 
 with tab2:
+    import pandas as pd
     st.subheader(f"Precipitação Diária ({start_year}-{end_year})")
     if not df_daily.empty and not df_daily['precip'].isnull().all():
-        fig_daily = px.bar(
-            df_daily, x="date", y="precip",
+        # Janela de visualização: ao estreitá-la, a série é reduzida novamente com mais detalhe
+        data_min = df_daily['date'].min().date()
+        data_max = df_daily['date'].max().date()
+        if data_min < data_max:
+            janela = st.slider(
+                "Janela de visualização", min_value=data_min, max_value=data_max,
+                value=(data_min, data_max), format="DD/MM/YYYY", key='janela_diaria'
+            )
+            df_janela = df_daily[(df_daily['date'] >= pd.Timestamp(janela[0])) & (df_daily['date'] <= pd.Timestamp(janela[1]))]
+        else:
+            df_janela = df_daily
+        todos_os_dias = st.checkbox("Mostrar todos os dias (sem redução)", key='diaria_completa')
+        df_plot = df_janela if todos_os_dias else reduzir_df(df_janela, 'date', 'precip', metodo='minmax')
+        if len(df_plot) < len(df_janela):
+            st.caption(
+                f"Exibindo {len(df_plot)} de {len(df_janela)} dias (mínimo e máximo de cada intervalo, "
+                "preservando os dias extremos). Reduza a janela para ver todos os dias."
+            )
+        # Séries densas são desenhadas com WebGL em vez de barras SVG
+        fig_daily, renderizador = figura_barras(
+            df_plot, "date", "precip", "#0384fc",
             labels={"date": "Data", "precip": "Precipitação Diária (mm)"},
             title=f"Precipitação Diária ({start_year}-{end_year})<br><b>{local_selecionado_nome}</b>",
-            color_discrete_sequence=["#0384fc"]
         )
         fig_daily.update_layout(
             template="plotly_white", xaxis_title='Data', yaxis_title='Precipitação (mm)',
             xaxis=dict(tickformat="%d-%b-%Y", tickangle=-45)
         )
-        st.plotly_chart(fig_daily, use_container_width=True)
+        exibir_cronometrado(fig_daily, renderizador, use_container_width=True)
+        exibir_estatisticas(df_janela, "Data")
     else:
         st.warning(f"A coleção diária tem {n_images} imagens (>5000). Série diária desativada para evitar erro. Use a série mensal.")
 
 with tab3:
+    import plotly.express as px
     st.subheader(f"Precipitação Mensal Total ({start_year}-{end_year})")
     if not df_monthly_series.empty and not df_monthly_series['precip'].isnull().all():
         fig_monthly_series = px.bar(
@@ -446,6 +447,7 @@ with tab3:
             xaxis_tickformat='%b %Y'
         )
         st.plotly_chart(fig_monthly_series, use_container_width=True)
+        exibir_estatisticas(df_monthly_series, "Mês")
     else:
         st.warning("Não há dados para a série mensal no período selecionado.")
 
@@ -460,6 +462,7 @@ with tab4:
         st.warning("Não há dados mensais para o período selecionado.")
 
 with tab5:
+    import plotly.graph_objects as go
     st.subheader(f"Precipitação Anual Total ({start_year}-{end_year})")
     if not df_annual.empty and not df_annual['precip'].isnull().all():
         media_historica = df_annual['precip'].mean()
@@ -1,23 +1,22 @@
 import streamlit as st
 import ee
-import geemap.foliumap as geemap 
-import folium
 from datetime import date, timedelta, datetime
-import json
-import tempfile
-import pandas as pd
-import altair as alt
+import numpy as np
+# geemap, folium e altair são importados só no modo que os usa (mapas ou gráfico)
 
+from aquagee import aquecimento, ee_async, redutores
+from aquagee.cache import cache_compartilhado
+from aquagee.comparacao import (
+    DATASETS, DATASETS_PARA_COMPARAR, miniatura_comparacao, obter_soma_periodo, periodo_comparacao, url_tiles_comparacao,
+)
+from aquagee.gee import inicializar_gee
+from aquagee.graficos import reduzir_df
+from aquagee.miniaturas import legenda_html
+from aquagee.series import concatenar_series, serie_compacta
 
-# --- Configurações Iniciais e Autenticação do GEE ---
-# Cria arquivo temporário com as credenciais
-service_account_info = dict(st.secrets["earthengine"])
 
-with tempfile.NamedTemporaryFile(mode='w+', suffix='.json', delete=False) as f:
-    json.dump(service_account_info, f)
-    f.flush()
-    credentials = ee.ServiceAccountCredentials(service_account_info["client_email"], f.name)
-    ee.Initialize(credentials)
+# --- Configurações Iniciais e Autenticação do GEE ---
+inicializar_gee()
 
 # --- Configuração da Página do Streamlit ---
 
@@ -36,68 +35,18 @@ with open('style.css')as f:
     st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html = True)
 
 
-# --- CONFIGURAÇÕES DOS DADOS ---
-PALETA_PRECIPITACAO = ['1621a2', '03ffff', '13ff03', 'efff00', 'ffb103', 'ff2300']
-
-# Dicionário com informações detalhadas de cada fonte de dados
-DATASETS = {
-    'CHIRPS': {
-        'id': 'UCSB-CHG/CHIRPS/DAILY',
-        'id2': 'UCSB-CHG/CHIRPS/PENTAD',
-        'band': 'precipitation',
-        'band2': 'precipitation',
-        'multiplier': 1,      # já vem em mm/dia
-        'multiplier2': 1,     # já vem em mm/pentad
-        'temp': False,
-        'start_year': 1981,
-        'scale': 5566,
-        'name': 'CHIRPS',
-        'type': 'daily',      # etiqueta para ajudar a função
-    },
-    'IMERG': {
-        'id': 'NASA/GPM_L3/IMERG_V07',            # 30 min
-        'id2': 'NASA/GPM_L3/IMERG_MONTHLY_V07',   # mensal
-        'band': 'precipitation',
-        'band2': 'precipitation',
-        'multiplier': 0.5,    # 30 min → mm/24h (48 steps * 0.5 = 24h)
-        'multiplier2': 1,     # 
-        'temp': True,
-        'start_year': 2000,
-        'scale': 11132,
-        'name': 'IMERG',
-        'type': 'subdaily',
-    },
-    'GSMAP': {
-        'id': 'JAXA/GPM_L3/GSMaP/v8/operational', # horário
-        'id2': 'JAXA/GPM_L3/GSMaP/v8/operational',
-        'band': 'hourlyPrecipRate',
-        'band2': 'hourlyPrecipRate',
-        'multiplier': 1,       # já em mm/h
-        'multiplier2': 1,
-        'temp': False,
-        'start_year': 2000,
-        'scale': 11132,
-        'name': 'GSMaP',
-        'type': 'hourly',
-    },
-
-}
-
-# Ordem fixa para exibição dos mapas
-DATASETS_PARA_COMPARAR = ['GSMAP', 'IMERG', 'CHIRPS']
-
 # --- FUNÇÕES AUXILIARES ---
 
-def desenhar_mapa_em_coluna(coluna, image, vis_params, titulo, legenda):
+def desenhar_mapa_em_coluna(coluna, image, vis_params, titulo, legenda, banda):
     """Renderiza um mapa geemap dentro de uma coluna específica do Streamlit."""
+    import geemap.foliumap as geemap
     with coluna:
-        st.subheader(titulo)
         mapa = geemap.Map(center=[-19, -60], zoom=3, tiles='cartodbdark_matter')
         
         # Adiciona uma verificação para garantir que a imagem não está vazia
         try:
-            # Pega o nome da banda do dicionário de visualização se possível, senão da imagem
-            band_name = vis_params.get('bands', image.bandNames().get(0).getInfo())
+            # A banda da soma é conhecida (a do dataset), sem consultar bandNames() no EE
+            band_name = vis_params.get('bands', banda)
             masked_image = image.select(band_name).updateMask(image.select(band_name).gt(vis_params['min']))
             mapa.addLayer(masked_image, vis_params, titulo)
             mapa.add_colorbar(vis_params, label=legenda, background_color='white')
@@ -106,34 +55,22 @@ def desenhar_mapa_em_coluna(coluna, image, vis_params, titulo, legenda):
             
         mapa.to_streamlit(height=600)
 
-def obter_soma_periodo(info, inicio, fim):
-    colecao = ee.ImageCollection(info['id']).filterDate(inicio, fim).select(info['band'])
-
-    # Casos especiais com coleção mensal/pentadal
-    if 'id2' in info and (info['id2'] != info['id']) and (info['type'] in ['monthly', 'pentad']):
-        colecao = ee.ImageCollection(info['id2']).filterDate(inicio, fim).select(info['band2'])
-        return colecao.sum().multiply(info['multiplier2'])
-
-    # IMERG: mm/h → mm/30min → mm/dia
-    if info['name'] == "IMERG":
-        colecao = colecao.map(lambda img: img.multiply(0.5))
-        return colecao.sum()
+def obter_series_temporais(info, escala, inicio_python, fim_python, geometry, estatisticas=redutores.PADRAO):
+    """Retorna a série compacta (date, precip float32, dataset categórico) para o periodo e escala.
 
-    # GSMaP: já em mm/h → precisa multiplicar por 1h
-    if info['name'] == "GSMaP":
-        colecao = colecao.map(lambda img: img.multiply(1))
-        return colecao.sum()
+    As estatísticas extras pedidas saem do mesmo reduceRegion que a média e viram colunas adicionais.
+    """
+    datas = []
+    valores = []
+    extras = {coluna: [] for coluna in redutores.colunas_extras(estatisticas)}
 
-    # CHIRPS diário: já vem pronto em mm/dia
-    if info['name'] == "CHIRPS":
-        return colecao.sum()
+    def _registrar(data, img):
+        rr = redutores.reduzir_regiao(img, geometry, info['scale'], estatisticas).getInfo() or {}
+        datas.append(data)
+        valores.append(rr.get('precip') or 0.0)
+        for coluna, lista in extras.items():
+            lista.append(rr.get(coluna))
 
-    # fallback
-    return colecao.sum().multiply(info['multiplier'])
-
-def obter_series_temporais(info, escala, inicio_python, fim_python, geometry):
-    """Retorna lista de dicts {'date':..., 'dataset':..., 'value':...} para o periodo e escala."""
-    resultados = []
     try:
         if escala == "Diário":
             cur = inicio_python
@@ -141,12 +78,7 @@ def obter_series_temporais(info, escala, inicio_python, fim_python, geometry):
                 inicio = ee.Date(cur.strftime("%Y-%m-%d"))
                 fim = inicio.advance(1, 'day')
                 img = obter_soma_periodo(info, inicio, fim)
-                rr = img.reduceRegion(ee.Reducer.mean(), geometry, info['scale']).getInfo()
-                val = None
-                if rr:
-                    # pega o primeiro valor retornado
-                    val = list(rr.values())[0]
-                resultados.append({'date': cur.strftime("%Y-%m-%d"), 'dataset': info['name'], 'value': val or 0.0})
+                _registrar(np.datetime64(cur, 'D'), img)
                 cur += timedelta(days=1)
 
         elif escala == "Mensal":
@@ -159,12 +91,7 @@ def obter_series_temporais(info, escala, inicio_python, fim_python, geometry):
                 inicio = ee.Date.fromYMD(cur_year, cur_month, 1)
                 fim = inicio.advance(1, 'month')
                 img = obter_soma_periodo(info, inicio, fim)
-                rr = img.reduceRegion(ee.Reducer.mean(), geometry, info['scale']).getInfo()
-                val = None
-                if rr:
-                    val = list(rr.values())[0]
-                label = f"{cur_year}-{cur_month:02d}"
-                resultados.append({'date': label, 'dataset': info['name'], 'value': val or 0.0})
+                _registrar(np.datetime64(f"{cur_year}-{cur_month:02d}-01", 'D'), img)
                 # advance month
                 if cur_month == 12:
                     cur_month = 1
@@ -177,66 +104,223 @@ def obter_series_temporais(info, escala, inicio_python, fim_python, geometry):
                 inicio = ee.Date.fromYMD(ano, 1, 1)
                 fim = inicio.advance(1, 'year')
                 img = obter_soma_periodo(info, inicio, fim)
-                rr = img.reduceRegion(ee.Reducer.mean(), geometry, info['scale']).getInfo()
-                val = None
-                if rr:
-                    val = list(rr.values())[0]
-                resultados.append({'date': str(ano), 'dataset': info['name'], 'value': val or 0.0})
+                _registrar(np.datetime64(f"{ano}-01-01", 'D'), img)
     except Exception as e:
         # devolve resultados parciais e loga no streamlit
         st.warning(f"Erro ao gerar séries para {info['name']}: {e}")
-    return resultados
+    extras = {coluna: np.array(lista, dtype=float) for coluna, lista in extras.items()}
+    return serie_compacta(np.array(datas, dtype='datetime64[D]'), valores, dataset=info['name'], extras=extras)
 
 # --- MODOS DE ANÁLISE (LÓGICA PRINCIPAL) ---
 
 def processar_comparacao(modo, **kwargs):
-    """Função central que busca os dados para os 3 datasets e os exibe em colunas."""
-    st.header(f"Comparação de Precipitação - {modo}")
+    """Busca em paralelo as miniaturas dos 3 datasets e as exibe em colunas.
 
-    col1, col2, col3 = st.columns(3)
-    colunas = [col1, col2, col3]
+    O mapa interativo de cada coluna só é carregado quando pedido.
+    """
+    st.header(f"Comparação de Precipitação - {modo}")
 
-    for i, nome_dataset in enumerate(DATASETS_PARA_COMPARAR):
+    try:
+        inicio, fim, vis, legenda = periodo_comparacao(modo, **kwargs)
+    except ValueError:
+        st.error("Modo de análise desconhecido.")
+        return
+
+    with st.spinner("Renderizando os mapas..."):
+        miniaturas = ee_async.rodar({
+            nome_dataset: ee_async.executar(miniatura_comparacao, nome_dataset, inicio, fim, vis)
+            for nome_dataset in DATASETS_PARA_COMPARAR
+        }, return_exceptions=True)
+
+    colunas = st.columns(3)
+    for coluna, nome_dataset in zip(colunas, DATASETS_PARA_COMPARAR):
         info = DATASETS[nome_dataset]
-        
-        try:
-            if modo == "Diário":
-                data_sel = kwargs['data_sel']
-
-                inicio = ee.Date(data_sel.strftime("%Y-%m-%d"))
-                fim = inicio.advance(1, 'day')
-                img = obter_soma_periodo(info, inicio, fim)
-                vis = {'min': 1, 'max': 50, 'palette': PALETA_PRECIPITACAO}
-                legenda = "Precipitação [mm/dia]"
-
-            elif modo == "Mensal":
-                ano, mes_idx, meses = kwargs['ano'], kwargs['mes_idx'], kwargs['meses']
+        with coluna:
+            st.subheader(info['name'])
+            png = miniaturas[nome_dataset]
+            if isinstance(png, Exception):
+                st.error(f"Ocorreu um erro ao processar os dados para {info['name']}: {png}")
+                continue
+            st.image(png, use_container_width=True)
+            st.markdown(legenda_html(vis), unsafe_allow_html=True)
+            st.caption(legenda)
+            interativo = st.toggle("Mapa interativo", key=f"interativo_{nome_dataset}")
+
+        if interativo:
+            img = obter_soma_periodo(info, inicio, fim)
+            desenhar_mapa_em_coluna(coluna, img, vis, info['name'], legenda, info['band'])
+
+def processar_visao_sincronizada(modo, esquerda, direita, **kwargs):
+    """Uma única cena com a camada de cada dataset e um divisor (swipe) entre duas delas.
+
+    O mapa base e cada camada do EE são carregados uma vez só, e a navegação é
+    naturalmente compartilhada, em vez de três iframes independentes.
+    """
+    import folium
+    import geemap.foliumap as geemap
+    from folium.plugins import SideBySideLayers
+    st.header(f"Comparação de Precipitação - {modo}")
 
-                inicio = ee.Date.fromYMD(ano, mes_idx, 1)
-                fim = inicio.advance(1, 'month')
-                img = obter_soma_periodo(info, inicio, fim)
-                vis = {'min': 50, 'max': 600, 'palette': PALETA_PRECIPITACAO}
-                legenda = "Precipitação [mm/mês]"
-
-            elif modo == "Anual":
-                ano = kwargs['ano']
-                
-                inicio = f"{ano}-01-01"
-                fim = f"{ano}-12-31"
-                img = obter_soma_periodo(info, inicio, fim)
-                vis = {'min': 200, 'max': 3000, 'palette': PALETA_PRECIPITACAO}
-                legenda = "Precipitação [mm/ano]"
+    try:
+        inicio, fim, vis, legenda = periodo_comparacao(modo, **kwargs)
+    except ValueError:
+        st.error("Modo de análise desconhecido.")
+        return
+
+    with st.spinner("Preparando as camadas..."):
+        urls = ee_async.rodar({
+            nome_dataset: ee_async.executar(url_tiles_comparacao, nome_dataset, inicio, fim, vis)
+            for nome_dataset in DATASETS_PARA_COMPARAR
+        }, return_exceptions=True)
+
+    mapa = geemap.Map(center=[-15, -55], zoom=4, tiles='cartodbdark_matter')
+    camadas = {}
+    for nome_dataset in DATASETS_PARA_COMPARAR:
+        info = DATASETS[nome_dataset]
+        if isinstance(urls[nome_dataset], Exception):
+            st.warning(f"Ocorreu um erro ao processar os dados para {info['name']}: {urls[nome_dataset]}")
+            continue
+        camadas[nome_dataset] = folium.TileLayer(
+            tiles=urls[nome_dataset], attr='Google Earth Engine', name=info['name'],
+            overlay=True, show=nome_dataset in (esquerda, direita)
+        )
+        camadas[nome_dataset].add_to(mapa)
+
+    if esquerda != direita and esquerda in camadas and direita in camadas:
+        SideBySideLayers(camadas[esquerda], camadas[direita]).add_to(mapa)
+        st.caption(f"Arraste o divisor para comparar {DATASETS[esquerda]['name']} (esquerda) e {DATASETS[direita]['name']} (direita).")
+    mapa.add_colorbar(vis, label=legenda, background_color='white')
+    mapa.to_streamlit(height=700)
+
+# --- DIFERENÇA / VIÉS ---
+# Grade comum (0,1°, a dos produtos de satélite) para as diferenças em relação ao CHIRPS
+GRADE_COMUM = {'crs': 'EPSG:4326', 'crsTransform': [0.1, 0, -180, 0, -0.1, 90]}
+PALETA_DIVERGENTE = ['8c510a', 'd8b365', 'f6e8c3', 'f5f5f5', 'c7eae5', '5ab4ac', '01665e']
+# Amplitude (mm) da escala de diferenças em cada escala temporal
+AMPLITUDE_DIFERENCA = {'Diário': 20, 'Mensal': 150, 'Anual': 800}
+# Razões só onde o CHIRPS tem ao menos este acumulado (mm), para não dividir por ~0
+MINIMO_RAZAO = 1
+PRODUTOS_VIES = ['IMERG', 'GSMAP']
+
+def imagem_diferencas(inicio, fim):
+    """Imagem multibanda na grade comum: somas, diferenças e razões de IMERG e GSMaP em relação ao CHIRPS."""
+    somas = {}
+    for nome_dataset in DATASETS_PARA_COMPARAR:
+        info = DATASETS[nome_dataset]
+        somas[nome_dataset] = (
+            obter_soma_periodo(info, inicio, fim)
+            .setDefaultProjection(crs='EPSG:4326', scale=info['scale'])
+            .reduceResolution(ee.Reducer.mean(), maxPixels=64)
+            .reproject(**GRADE_COMUM)
+            .rename(info['name'])
+        )
+    referencia = somas['CHIRPS']
+    bandas = [somas[nome] for nome in DATASETS_PARA_COMPARAR]
+    for nome_dataset in PRODUTOS_VIES:
+        nome = DATASETS[nome_dataset]['name']
+        bandas.append(somas[nome_dataset].subtract(referencia).rename(f"{nome}_menos_CHIRPS"))
+        bandas.append(somas[nome_dataset].divide(referencia.updateMask(referencia.gte(MINIMO_RAZAO))).rename(f"{nome}_razao_CHIRPS"))
+    return ee.Image.cat(bandas)
+
+@cache_compartilhado('vies', ttl=6 * 3600)
+def estatisticas_vies(inicio, fim):
+    """Viés médio, RMSE e correlação de IMERG e GSMaP contra o CHIRPS sobre o Brasil.
+
+    Todas saem dos momentos (médias de P, C, P², C², P·C e d²) calculados num
+    único reduceRegion com `mean` combinado a `count`.
+    """
+    imagem = imagem_diferencas(inicio, fim)
+    referencia = imagem.select('CHIRPS')
+    momentos = [referencia.rename('C'), referencia.multiply(referencia).rename('CC')]
+    for nome_dataset in PRODUTOS_VIES:
+        nome = DATASETS[nome_dataset]['name']
+        produto = imagem.select(nome)
+        diferenca = imagem.select(f"{nome}_menos_CHIRPS")
+        momentos += [
+            produto.rename(f"{nome}_P"),
+            produto.multiply(produto).rename(f"{nome}_PP"),
+            produto.multiply(referencia).rename(f"{nome}_PC"),
+            diferenca.multiply(diferenca).rename(f"{nome}_DD"),
+        ]
+    # só pixels com os três produtos válidos entram nas estatísticas
+    mascara = imagem.select(['CHIRPS', 'IMERG', 'GSMaP']).mask().reduce(ee.Reducer.min())
+    brasil = ee.FeatureCollection('USDOS/LSIB_SIMPLE/2017').filter(ee.Filter.eq('country_na', 'Brazil')).geometry()
+    resultado = ee.Image.cat(momentos).updateMask(mascara).reduceRegion(
+        reducer=ee.Reducer.mean().combine(ee.Reducer.count(), sharedInputs=True),
+        geometry=brasil, crs=GRADE_COMUM['crs'], crsTransform=GRADE_COMUM['crsTransform'],
+        maxPixels=1e9, tileScale=4
+    ).getInfo()
+
+    m_c, m_cc = resultado['C_mean'], resultado['CC_mean']
+    linhas = []
+    for nome_dataset in PRODUTOS_VIES:
+        nome = DATASETS[nome_dataset]['name']
+        m_p, m_pp, m_pc = resultado[f"{nome}_P_mean"], resultado[f"{nome}_PP_mean"], resultado[f"{nome}_PC_mean"]
+        variancias = (m_pp - m_p ** 2) * (m_cc - m_c ** 2)
+        linhas.append({
+            'Produto': nome,
+            'Viés médio (mm)': m_p - m_c,
+            'RMSE (mm)': resultado[f"{nome}_DD_mean"] ** 0.5,
+            'Correlação': (m_pc - m_p * m_c) / variancias ** 0.5 if variancias > 0 else float('nan'),
+            'Pixels': resultado[f"{nome}_P_count"],
+        })
+    return linhas
+
+@cache_compartilhado('url_tiles', ttl=6 * 3600)
+def url_tiles_diferencas(inicio, fim, banda, vis_params):
+    """Modelo de URL dos tiles de uma banda da imagem de diferenças, em cache por período."""
+    return imagem_diferencas(inicio, fim).select(banda).getMapId(vis_params)['tile_fetcher'].url_format
+
+def processar_vies(modo, **kwargs):
+    """Mapas de diferença e razão em relação ao CHIRPS e estatísticas de viés sobre o Brasil."""
+    import folium
+    import geemap.foliumap as geemap
+    st.header(f"Diferença e Viés em relação ao CHIRPS - {modo}")
 
-            else:
-                st.error("Modo de análise desconhecido.")
-                return
+    try:
+        inicio, fim, _, _ = periodo_comparacao(modo, **kwargs)
+    except ValueError:
+        st.error("Modo de análise desconhecido.")
+        return
+
+    amplitude = AMPLITUDE_DIFERENCA[modo]
+    vis_diferenca = {'min': -amplitude, 'max': amplitude, 'palette': PALETA_DIVERGENTE}
+    vis_razao = {'min': 0, 'max': 2, 'palette': PALETA_DIVERGENTE}
+    camadas = {}
+    for nome_dataset in PRODUTOS_VIES:
+        nome = DATASETS[nome_dataset]['name']
+        camadas[f"{nome} − CHIRPS"] = (f"{nome}_menos_CHIRPS", vis_diferenca)
+        camadas[f"{nome} / CHIRPS"] = (f"{nome}_razao_CHIRPS", vis_razao)
+
+    with st.spinner("Calculando diferenças e estatísticas..."):
+        tarefas = {
+            titulo: ee_async.executar(url_tiles_diferencas, inicio, fim, banda, vis)
+            for titulo, (banda, vis) in camadas.items()
+        }
+        tarefas['estatisticas'] = ee_async.executar(estatisticas_vies, inicio, fim)
+        resultados = ee_async.rodar(tarefas, return_exceptions=True)
+
+    estatisticas = resultados.pop('estatisticas')
+    if isinstance(estatisticas, Exception):
+        st.warning(f"Não foi possível calcular as estatísticas: {estatisticas}")
+    else:
+        st.dataframe(
+            estatisticas, hide_index=True, use_container_width=True,
+            column_config={
+                'Viés médio (mm)': st.column_config.NumberColumn(format="%.2f"),
+                'RMSE (mm)': st.column_config.NumberColumn(format="%.2f"),
+                'Correlação': st.column_config.NumberColumn(format="%.3f"),
+            }
+        )
 
-            desenhar_mapa_em_coluna(colunas[i], img, vis, info['name'], legenda)
-        
-        except Exception as e:
-            with colunas[i]:
-                st.subheader(info['name'])
-                st.error(f"Ocorreu um erro ao processar os dados para {info['name']}: {e}")
+    mapa = geemap.Map(center=[-15, -55], zoom=4, tiles='cartodbdark_matter')
+    for i, (titulo, url) in enumerate(resultados.items()):
+        if isinstance(url, Exception):
+            st.warning(f"Ocorreu um erro ao processar a camada {titulo}: {url}")
+            continue
+        folium.TileLayer(tiles=url, attr='Google Earth Engine', name=titulo, overlay=True, show=i == 0).add_to(mapa)
+    mapa.add_colorbar(vis_diferenca, label="Diferença [mm] (razão: 0 a 2, neutro em 1)", background_color='white')
+    mapa.to_streamlit(height=700)
 
 # --- INTERFACE DO USUÁRIO (SIDEBAR) ---
 st.sidebar.title('Menu de Comparação')
@@ -270,14 +354,18 @@ if visualizacao == "Mapas":
     "Escolha a Escala Temporal:",
     list(modos.keys())
 )
+    exibicao_mapas = st.sidebar.radio("Exibição dos mapas:", ["Lado a lado", "Visão sincronizada", "Diferença/Viés"])
+    if exibicao_mapas == "Visão sincronizada":
+        camada_esquerda = st.sidebar.selectbox("Camada à esquerda", DATASETS_PARA_COMPARAR, index=DATASETS_PARA_COMPARAR.index('IMERG'), format_func=lambda n: DATASETS[n]['name'])
+        camada_direita = st.sidebar.selectbox("Camada à direita", DATASETS_PARA_COMPARAR, index=DATASETS_PARA_COMPARAR.index('CHIRPS'), format_func=lambda n: DATASETS[n]['name'])
+
     if modo_selecionado == "Diário":
         data_selecionada = st.sidebar.date_input(
             "Data",
             max_value=date.today() - timedelta(days=1),
             value=date.today() - timedelta(days=2)
         )
-        if st.sidebar.button("Gerar Mapas", use_container_width=True):
-            processar_comparacao("Diário", data_sel=data_selecionada)
+        pedido_mapas = ("Diário", {'data_sel': data_selecionada})
 
     elif modo_selecionado == "Mensal":
         mes_passado = date.today().replace(day=1) - timedelta(days=1)
@@ -287,18 +375,30 @@ if visualizacao == "Mapas":
         meses_nomes = ["Janeiro","Fevereiro","Março","Abril","Maio","Junho",
                        "Julho","Agosto","Setembro","Outubro","Novembro","Dezembro"]
         mes_selecionado_idx = st.sidebar.selectbox("Mês", range(1,13), format_func=lambda m: meses_nomes[m-1], index=mes_passado.month-1)
-        
-        if st.sidebar.button("Gerar Mapas", use_container_width=True):
-            processar_comparacao("Mensal", ano=ano_selecionado, mes_idx=mes_selecionado_idx, meses=meses_nomes)
+        pedido_mapas = ("Mensal", {'ano': ano_selecionado, 'mes_idx': mes_selecionado_idx, 'meses': meses_nomes})
 
     elif modo_selecionado == "Anual":
         ultimo_ano_completo = ANO_ATUAL - 1
         ano_selecionado = st.sidebar.selectbox("Ano", range(ANO_INICIAL_GLOBAL, ultimo_ano_completo + 1), index=range(ANO_INICIAL_GLOBAL, ultimo_ano_completo + 1).index(ultimo_ano_completo))
-        if st.sidebar.button("Gerar Mapas", use_container_width=True):
-            processar_comparacao("Anual", ano=ano_selecionado)
+        pedido_mapas = ("Anual", {'ano': ano_selecionado})
+
+    # O pedido fica na sessão para que abrir um mapa interativo (rerun) não apague a comparação
+    if st.sidebar.button("Gerar Mapas", use_container_width=True):
+        st.session_state.comparacao_mapas = pedido_mapas
+        aquecimento.registrar(aquecimento.MAPA, modo=pedido_mapas[0],
+                              **{nome: valor for nome, valor in pedido_mapas[1].items() if nome != 'meses'})
+    if st.session_state.get('comparacao_mapas') == pedido_mapas:
+        if exibicao_mapas == "Diferença/Viés":
+            processar_vies(pedido_mapas[0], **pedido_mapas[1])
+        elif exibicao_mapas == "Visão sincronizada":
+            processar_visao_sincronizada(pedido_mapas[0], camada_esquerda, camada_direita, **pedido_mapas[1])
+        else:
+            processar_comparacao(pedido_mapas[0], **pedido_mapas[1])
+        if pedido_mapas[0] == "Anual":
             st.sidebar.warning('Atenção: alguns plots podem demorar um pouco para carregar devido ao volume de dados anual.')
 
 else:  # Gráfico
+    import altair as alt
     modo_selecionado = st.sidebar.radio( "Escolha a Escala Temporal:",('Diário', 'Mensal'))
 
     # inputs de período para gerar séries temporais
@@ -308,6 +408,13 @@ else:  # Gráfico
     lat = st.sidebar.number_input("Latitude", value=-22.424808, format="%.6f")
     lon = st.sidebar.number_input("Longitude", value=-45.462025, format="%.6f")
     raio_km = st.sidebar.number_input("Raio (km)", value=10, min_value=1)
+
+    # Estatísticas extras calculadas junto com a média (um único redutor combinado)
+    estatisticas = redutores.normalizar(st.sidebar.multiselect(
+        "Estatísticas da região",
+        [nome for nome in redutores.ESTATISTICAS if nome != 'media'],
+        format_func=lambda nome: redutores.ESTATISTICAS[nome]
+    ))
     
 
     
@@ -331,54 +438,74 @@ else:  # Gráfico
         start_date = start_year
         end_date = end_year
 
+    chave_grafico = (modo_selecionado, str(start_date), str(end_date), lat, lon, raio_km, estatisticas)
     if st.sidebar.button("Gerar Gráfico", use_container_width=True):
         # constrói geometry
         geom = ee.Geometry.Point([float(lon), float(lat)]).buffer(int(raio_km) * 1000)
-        todas_series = []
         with st.spinner("Gerando séries... isso pode demorar conforme o tamanho do período"):
-            for nome_dataset in DATASETS_PARA_COMPARAR:
-                info = DATASETS[nome_dataset]
-                series = obter_series_temporais(info, modo_selecionado, start_date, end_date, geom)
-                todas_series.extend(series)
-
-        if not todas_series:
+            # as três bases são consultadas em paralelo
+            series_por_dataset = ee_async.rodar({
+                nome_dataset: ee_async.executar(obter_series_temporais, DATASETS[nome_dataset], modo_selecionado, start_date, end_date, geom, estatisticas)
+                for nome_dataset in DATASETS_PARA_COMPARAR
+            })
+            df = concatenar_series([series_por_dataset[nome_dataset] for nome_dataset in DATASETS_PARA_COMPARAR])
+        # guarda a série completa na sessão para que a janela de visualização não refaça as consultas
+        st.session_state.comparacao_grafico = {'chave': chave_grafico, 'df': df}
+
+    grafico_salvo = st.session_state.get('comparacao_grafico')
+    if grafico_salvo is not None and grafico_salvo['chave'] == chave_grafico:
+        df = grafico_salvo['df']
+        if df.empty:
             st.error("Nenhum dado retornado para o período/posição selecionados.")
         else:
-            df = pd.DataFrame(todas_series)
-            # converter coluna date para datetime conforme escala
-            if modo_selecionado == "Diário":
-                df['date'] = pd.to_datetime(df['date'])
-            elif modo_selecionado == "Mensal":
-                df['date'] = pd.to_datetime(df['date'] + "-01")
-            else:
-                # anual: usa primeiro dia do ano
-                df['date'] = pd.to_datetime(df['date'] + "-01-01")
-
+            # Janela de visualização: ao estreitá-la, cada série é reduzida novamente com mais detalhe
+            data_min = df['date'].min().date()
+            data_max = df['date'].max().date()
+            if data_min < data_max:
+                janela = st.slider(
+                    "Janela de visualização", min_value=data_min, max_value=data_max,
+                    value=(data_min, data_max), format="DD/MM/YYYY", key='janela_comparacao'
+                )
+                df = df[(df['date'] >= np.datetime64(janela[0])) & (df['date'] <= np.datetime64(janela[1]))]
+            # Estatística exibida (as extras vêm como colunas da mesma série)
+            nomes_colunas = {coluna: redutores.ESTATISTICAS[nome] for nome, coluna in redutores.COLUNAS.items()}
+            colunas_grafico = [c for c in df.columns if c in nomes_colunas]
+            coluna_y = 'precip'
+            if len(colunas_grafico) > 1:
+                coluna_y = st.selectbox("Estatística no gráfico", colunas_grafico, format_func=nomes_colunas.get)
+            unidade_y = '(fração)' if coluna_y == 'fracao_chuva' else '(mm)'
+            # Reduz cada série a ~largura do gráfico (LTTB) antes de embutir os dados no Vega
+            df_plot = concatenar_series([
+                reduzir_df(df[df['dataset'] == nome], coluna_y=coluna_y, metodo='lttb')
+                for nome in df['dataset'].cat.categories
+            ])
+            if len(df_plot) < len(df):
+                st.caption(f"Exibindo {len(df_plot)} de {len(df)} pontos. Reduza a janela para ver todos os pontos.")
 
             titulo_grafico = f"Série Temporal de Precipitação ({modo_selecionado})"
             selecao_legenda = alt.selection_point(fields=['dataset'], bind='legend')
 
-            chart = alt.Chart(df).mark_line(
+            chart = alt.Chart(df_plot).mark_line(
                 strokeWidth=2, # Linha mais grossa
                 point={'filled': False, 'fill': 'white', 'size': 40}
             ).encode(
                 # Eixo X (Data)
                 x=alt.X('date:T', title='Período', axis=alt.Axis(format='%d/%m/%Y')),
-                
+            
                 # Eixo Y (Precipitação)
-                y=alt.Y('value:Q', title='Precipitação (mm)', axis=alt.Axis(format='.1f')),
-                
+                y=alt.Y(f'{coluna_y}:Q', title=f"{nomes_colunas[coluna_y]} {unidade_y}", axis=alt.Axis(format='.1f')),
+            
                 # Cor baseada na fonte de dados (traduzido)
                 color=alt.Color('dataset:N', title='Fonte de Dados'),
-                
+            
                 # Opacidade ligada à seleção da legenda
                 opacity=alt.condition(selecao_legenda, alt.value(1.0), alt.value(0.2)),
-                
+            
                 # Tooltip (caixa de informação) traduzido e formatado
                 tooltip=[
                     alt.Tooltip('dataset:N', title='Fonte'),
                     alt.Tooltip('date:T', title='Data', format='%d/%m/%Y'),
-                    alt.Tooltip('value:Q', title='Precip. (mm)', format='.2f')
+                    alt.Tooltip(f'{coluna_y}:Q', title=f"{nomes_colunas[coluna_y]} {unidade_y}", format='.2f')
                 ]
             ).add_selection(
                 selecao_legenda
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from aquagee.graficos import _baldes, indices_lttb, indices_minmax
+
+
+@pytest.mark.parametrize('n', [1201, 5000, 12345])
+def test_minmax_guarda_extremos_de_cada_balde(n):
+    rng = np.random.default_rng(n)
+    valores = rng.gamma(0.5, 6, n)
+    valores[rng.random(n) < 0.05] = np.nan
+    n_baldes = 600
+
+    indices = indices_minmax(valores, n_baldes)
+
+    assert np.all(np.diff(indices) > 0)
+    assert len(indices) <= 2 * n_baldes
+    balde = _baldes(n, n_baldes)
+    for b in range(n_baldes):
+        no_balde = valores[balde == b]
+        escolhidos = valores[indices[balde[indices] == b]]
+        if np.isnan(no_balde).all():
+            continue
+        assert np.nanmax(escolhidos) == np.nanmax(no_balde)
+        assert np.nanmin(escolhidos) == np.nanmin(no_balde)
+
+
+def test_minmax_nao_reduz_series_curtas():
+    valores = np.arange(100.0)
+    assert np.array_equal(indices_minmax(valores, 600), np.arange(100))
+
+
+def test_lttb_mantem_extremidades_e_tamanho():
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 300)
+    indices = indices_lttb(x, y, 500)
+    assert len(indices) == 500
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert np.all(np.diff(indices) > 0)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from aquagee import reducao_tiles
+
+
+def _partes_sinteticas(rng, n_tiles=5, n_datas=12):
+    """Pixels (data, tile, valor, peso) e as somas parciais por tile, com datas faltando em alguns tiles."""
+    datas = np.array([f"2020-01-{d:02d}" for d in range(1, n_datas + 1)])
+    pixels = []
+    partes = []
+    for tile in range(n_tiles):
+        # cada tile perde algumas datas (imagem toda mascarada: a feature nula é descartada)
+        presentes = datas[rng.random(n_datas) > 0.3]
+        parte = {'date': [], 'soma': [], 'peso': [], 'soma_chuva': [], 'maximo': []}
+        for data in presentes:
+            valores = rng.gamma(0.6, 8, size=rng.integers(1, 30))
+            pesos = rng.random(len(valores))
+            pixels.extend((data, v, p) for v, p in zip(valores, pesos))
+            parte['date'].append(data)
+            parte['soma'].append(np.sum(valores * pesos))
+            parte['peso'].append(np.sum(pesos))
+            parte['soma_chuva'].append(np.sum((valores >= 1) * pesos))
+            parte['maximo'].append(valores.max())
+        partes.append({nome: np.asarray(v) for nome, v in parte.items()})
+    return pixels, partes
+
+
+def test_serie_em_tiles_recombina_exatamente(monkeypatch):
+    rng = np.random.default_rng(0)
+    pixels, partes = _partes_sinteticas(rng)
+    monkeypatch.setattr(reducao_tiles, '_reduzir_tile', lambda _i, _r, celula, *_a: partes[celula])
+    monkeypatch.setattr('aquagee.redutores.LIMIAR_CHUVA', 1)
+
+    colunas = reducao_tiles.serie_em_tiles(None, None, range(len(partes)), 5566, ('maximo', 'fracao_chuva'))
+
+    for i, data in enumerate(colunas['date']):
+        valores = np.array([v for d, v, _ in pixels if d == data])
+        pesos = np.array([p for d, _, p in pixels if d == data])
+        assert colunas['precip'][i] == pytest.approx(np.sum(valores * pesos) / np.sum(pesos))
+        assert colunas['precip_max'][i] == pytest.approx(valores.max())
+        assert colunas['fracao_chuva'][i] == pytest.approx(np.sum((valores >= 1) * pesos) / np.sum(pesos))
+    assert set(colunas['date']) == {d for d, _, _ in pixels}
+
+
+def test_dividir_cobre_os_limites():
+    limites = (-50.0, -20.0, -44.0, -15.0)
+    celulas = reducao_tiles.dividir(limites, 5566, reducao_tiles.PIXELS_POR_TILE)
+    assert min(c[0] for c in celulas) == limites[0] and max(c[2] for c in celulas) == limites[2]
+    assert min(c[1] for c in celulas) == limites[1] and max(c[3] for c in celulas) == limites[3]
+    area = sum((c[2] - c[0]) * (c[3] - c[1]) for c in celulas)
+    assert area == pytest.approx((limites[2] - limites[0]) * (limites[3] - limites[1]))
+
+
+@pytest.mark.parametrize('max_celulas', [1, 4, 10, 64])
+def test_dividir_respeita_max_celulas(max_celulas):
+    celulas = reducao_tiles.dividir((-74.0, -34.0, -34.0, 5.0), 1000, 5_000, max_celulas)
+    assert 1 <= len(celulas) <= max_celulas
@@ -1,9 +1,8 @@
 
 import streamlit as st
-import ee
-import geemap.foliumap as geemap
-import json
-import tempfile
+import streamlit.components.v1 as components
+
+from aquagee import mapa_inicial
 
 # --- Configuração da Página e Estilo ---
 st.set_page_config(
@@ -21,63 +20,20 @@ st.set_page_config(
 with open('style.css') as f:
     st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
-# --- Inicialização Segura do Google Earth Engine ---
-# Este bloco é executado apenas uma vez e fica em cache para otimizar o desempenho.
-@st.cache_resource
-def initialize_gee():
-    try:
-        service_account_info = dict(st.secrets["earthengine"])
-        with tempfile.NamedTemporaryFile(mode='w+', suffix='.json', delete=False) as f:
-            json.dump(service_account_info, f)
-            f.flush()
-            credentials = ee.ServiceAccountCredentials(service_account_info["client_email"], f.name)
-            # Use o project_id das credenciais para inicializar
-            ee.Initialize(credentials, project=credentials.project_id)
-            print("GEE Inicializado com sucesso.")
-    except Exception as e:
-        st.error("Ocorreu um erro ao inicializar o Google Earth Engine. Verifique as credenciais em st.secrets.")
-        st.error(f"Detalhes do erro: {e}")
-        st.stop()
-
-initialize_gee()
-
-# --- Função em Cache para Gerar o Mapa de Exemplo ---
-# O cache de dados evita que o GEE processe a mesma informação repetidamente.
+# --- Mapa de Exemplo ---
+# Pré-calculado por `python -m aquagee.mapa_inicial` (PNG estático + limites): com o
+# arquivo presente, a página inicial não inicializa o Google Earth Engine nem faz chamadas a ele.
 @st.cache_data
-def create_brazil_annual_map():
-    """
-    Cria e retorna um mapa geemap com a precipitação anual de um ano de referência para o Brasil.
-    """
-    try:
-        # Carrega a coleção de limites do Brasil
-        countries = ee.FeatureCollection('USDOS/LSIB_SIMPLE/2017')
-        brazil = countries.filter(ee.Filter.eq('country_na', 'Brazil'))
-
-        # Carrega a coleção CHIRPS para um ano recente (ex: 2023)
-        precip_collection = ee.ImageCollection('UCSB-CHG/CHIRPS/PENTAD') \
-            .filter(ee.Filter.date('2023-01-01', '2023-12-31')) \
-            .select('precipitation')
-
-        # Soma todas as imagens para obter o acumulado anual e recorta para o Brasil
-        annual_precipitation = precip_collection.sum().clip(brazil)
-
-        # Parâmetros de visualização
-        palette = ['#1621a2', '#03ffff', '#13ff03', '#efff00', '#ffb103', '#ff2300']
-        vis_params = {'min': 200.0, 'max': 3000.0, 'palette': palette}
-
-        # Cria o mapa com um tema escuro
-        m = geemap.Map(center=[-15, -55], zoom=3, tiles=None)
-        m.add_basemap('CartoDB.DarkMatter')
-        m.addLayer(
-            annual_precipitation,
-            vis_params,
-            'Precipitação Anual (2023)'
-        )
-        
-        return m
-    except ee.ee_exception.EEException as e:
-        st.warning(f"Não foi possível gerar o mapa de exemplo. Erro no GEE: {e}")
-        return None
+def html_mapa_exemplo(versao):
+    """HTML do mapa de exemplo; `versao` (data do arquivo) renova o cache quando o PNG é regenerado."""
+    return mapa_inicial.html_mapa(altura=400)
+
+@st.cache_resource
+def gerar_mapa_exemplo():
+    """Gera o PNG na primeira visita de um deploy que não rodou o comando (erros não ficam em cache)."""
+    from aquagee.gee import inicializar_com_conta_de_servico
+    inicializar_com_conta_de_servico(dict(st.secrets["earthengine"]))
+    mapa_inicial.gerar()
 
 # --- ESTRUTURA DA PÁGINA INICIAL ---
 
@@ -102,10 +58,15 @@ with col1:
     st.info("👈 **Para começar, expanda o menu na barra lateral à esquerda e escolha uma das ferramentas de análise.**", icon="💡")
 
 with col2:
-    with st.spinner("Carregando mapa de exemplo..."):
-        mapa_exemplo = create_brazil_annual_map()
-        if mapa_exemplo:
-            mapa_exemplo.to_streamlit(height=400)
+    if mapa_inicial.versao() is None:
+        with st.spinner("Gerando o mapa de exemplo (apenas na primeira visita)..."):
+            try:
+                gerar_mapa_exemplo()
+            except Exception as e:
+                st.warning(f"Não foi possível gerar o mapa de exemplo. Erro no GEE: {e}")
+    versao_mapa = mapa_inicial.versao()
+    if versao_mapa is not None:
+        components.html(html_mapa_exemplo(versao_mapa), height=400)
 
 st.write("---")
 